@@ -1,16 +1,24 @@
 import ast
+import copy
+import os
 import re
 
-LOGGER_NAMES = ["log", "logger", "logging"]
-LOGGER_METHODS = ["trace", "debug", "info", "warn", "warning", "error", "critical", "exception"]
+from logfix.apis import LOGGER_METHODS, LOGGER_NAMES, PERCENT_SPEC, bind, log_api
+from logfix.instrument import PROFILER
+from logfix.verify import gate
 
 
 class Patch:
     """
     A Patch object contains the line and column information needed to replace a
     line of code.
+
+    Patches use ``__slots__`` so that millions of them can be held in memory
+    when reporting on an entire repository.
     """
 
+    __slots__ = ("line", "end_line", "offset", "statement")
+
     def __init__(self, line, end_line, offset, statement):
         self.line = line
         self.end_line = end_line
@@ -18,28 +26,26 @@ class Patch:
         self.statement = statement
 
     def render(self):
+        """
+        The replacement text, or None if the lines are to be removed.
+        """
+        if self.statement is None:
+            return None
         pad = " " * self.offset
         return pad + self.statement
 
 
-def is_log_method(node: ast.AST):
+def is_log_method(node: ast.AST, bindings: dict = None):
     """
     Check if the code tree rooted at ``node`` represents a call to the
     logging framework.
 
     :param node: the root node of the expression to check
+    :param bindings: names bound to loggers in the module, see
+                     ``logfix.apis.bind``
     :return: True if this ``node`` represents a logging call, False otherwise.
     """
-    if not isinstance(node, ast.Call):
-        return False
-    if hasattr(node, "func"):
-        if hasattr(node.func, "value"):
-            if hasattr(node.func.value, "id"):
-                return (
-                    node.func.value.id in LOGGER_NAMES
-                    and node.func.attr in LOGGER_METHODS
-                )
-    return False
+    return log_api(node, bindings) is not None
 
 
 def get_format_spec(v: ast.FormattedValue) -> str:
@@ -53,7 +59,11 @@ def get_format_spec(v: ast.FormattedValue) -> str:
     """
     if v.format_spec is None:
         return "%s"
-    spec = v.format_spec.values[0].value
+    values = v.format_spec.values
+    if len(values) != 1 or not isinstance(values[0], ast.Constant):
+        # Empty, e.g. f"{x:}", or computed, e.g. f"{x:{width}}".
+        return None
+    spec = values[0].value
     if "d" in spec or "f" in spec:
         return "%" + spec
     if spec.isdigit():
@@ -96,10 +106,11 @@ def is_str_format(node: ast.AST) -> bool:
 
 def skip(path: str, node: ast.AST) -> None:
     """Report that we are not patching this logging statement."""
+    PROFILER.count("skips")
     print(f"Skipping {path} {node.lineno} {ast.unparse(node)}")
 
 
-def get_patch(source: str, path: str) -> dict:
+def get_patch(source: str, path: str, originals: dict = None) -> dict:
     """
     Parses the source code into an abstract syntax tree and the walks the tree
     looking for calls to the logging framework. A ``Patch`` object will be
@@ -108,79 +119,441 @@ def get_patch(source: str, path: str) -> dict:
 
     :param source: a string containing Python source code.
     :param path: the name and path of the source file.  Used in messages only.
+    :param originals: see ``patches_from_tree``.
     :return: a dictionary of Patch objects, if any, that should be applied to
              the source file. Line numbers are used as keys into the dictionary.
     """
+    with PROFILER.phase("parse"):
+        tree = ast.parse(source, path)
+    return patches_from_tree(tree, path, list(iter_lines(source)), originals)
+
+
+def analyze_source(
+    source: str,
+    path: str,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    """
+    Finds the patches to apply to ``source``.  This is ``get_patch`` followed
+    by the optional checks and rewrites selected on the command line.  The
+    source is parsed once and the tree is shared with the rewrites that do
+    not need one of their own.
+
+    :param source: a string containing Python source code.
+    :param path: the name and path of the source file.  Used in messages only.
+    :param verify: drop patches that fail ``logfix.verify``.
+    :param throttle: rewrite logging calls in loops to use a
+                     ``logfix.throttle`` wrapper, see ``logfix.loops``.
+    :param hoist: move logger lookups out of functions, see
+                  ``logfix.hoist``.
+    :param defer: wrap expensive arguments of logging calls in
+                  ``logfix.lazy`` objects, see ``logfix.defer``.
+    :return: a dictionary of Patch objects keyed by line number.
+    """
+    with PROFILER.phase("parse"):
+        tree = ast.parse(source, path)
+    lines = list(iter_lines(source))
+    originals = {} if verify else None
+    patches = patches_from_tree(tree, path, lines, originals)
+    if verify:
+        patches = gate(originals, patches, path)
+    from logfix.tracebacks import traceback_patches
+    with PROFILER.phase("tracebacks"):
+        patches = traceback_patches(source, patches, path, tree, lines)
+    if hoist:
+        from logfix.hoist import hoist_patches
+        with PROFILER.phase("hoist"):
+            patches = hoist_patches(source, patches, path)
+    if defer:
+        from logfix.defer import defer_patches
+        with PROFILER.phase("defer"):
+            patches = defer_patches(source, patches, path)
+    if throttle is not None:
+        from logfix.loops import throttle_patches
+        with PROFILER.phase("loops"):
+            patches = throttle_patches(source, patches, path, throttle)
+    return patches
+
+
+def make_patch(node: ast.Call, kind: str) -> Patch:
+    """
+    Creates the Patch that replaces the logging call ``node`` after its
+    arguments have been rewritten.
+
+    :param node: the rewritten logging call.
+    :param kind: the kind of interpolation that was replaced.  Used to count
+                 patches when profiling.
+    """
+    PROFILER.count(f"patches.{kind}")
+    with PROFILER.phase("unparse"):
+        statement = ast.unparse(node)
+    return Patch(node.lineno, node.end_lineno, node.col_offset, statement)
+
+
+def patches_from_tree(tree: ast.AST, path: str, lines, originals: dict = None) -> dict:
+    """
+    Walks an already parsed syntax tree looking for calls to the logging
+    framework that do greedy string interpolation.  See ``get_patch``.  The
+    tree is not modified.
+
+    :param tree: the abstract syntax tree to scan.
+    :param path: the name and path of the source file.  Used in messages only.
+    :param lines: the lines of the source, indexed from 0.  A patch replaces
+                  whole lines, so calls that share their lines with other code
+                  are skipped.
+    :param originals: if not None, the original call and the formatting style
+                      of its library are stored here for each patch, keyed by
+                      line number, for ``logfix.verify.gate``.
+    :return: a dictionary of Patch objects keyed by line number.
+    """
+    with PROFILER.phase("analyze"):
+        return find_patches(tree, path, lines, originals)
+
+
+def find_patches(tree: ast.AST, path: str, lines, originals: dict = None) -> dict:
+    """The un-instrumented body of ``patches_from_tree``."""
     patches = {}
-    tree = ast.parse(source, path)
-    # Walk the source tree looking for logging calls.
+    bindings = {}
+    calls = []
+    # Walk the source tree looking for method calls and the statements that
+    # bind names to loggers.
     for node in ast.walk(tree):
-        if isinstance(node, ast.Call) and is_log_method(node):
-            if len(node.args) != 1:
-                # If the logging call has more than one arg then it is not
-                # one of the cases we handle.  That is, it (likely) already uses
-                # lazy string interpolation.
-                continue
-            method_call = f"{node.func.value.id}.{node.func.attr}"
-            arg = node.args[0]
-            if is_str_format(arg):
-                if isinstance(arg.func.value, ast.Constant) and len(arg.keywords) == 0:
-                    # We only handle cases where the LHS is a literal string
-                    # constant with no keyword substitutions.
-                    format_string = re.sub(
-                        r"{\s*}",
-                        "%s",
-                        arg.func.value.value,
-                    )
-                    if "{" in format_string:
-                        # There is some sort of funky formatting going on.
-                        skip(path, node)
-                    else:
-                        node.args = list()
-                        node.args.append(ast.Constant(format_string))
-                        node.args.extend(arg.args)
-                        patch = Patch(
-                            node.lineno,
-                            node.end_lineno,
-                            node.col_offset,
-                            ast.unparse(node)
-                        )
-                        patches[patch.line] = patch
-                else:
-                    skip(path, node)
-            elif isinstance(arg, ast.BinOp) and isinstance(arg.op, ast.Mod):
-                node.args = list()
-                node.args.append(arg.left)
-                if isinstance(arg.right, ast.Tuple):
-                    node.args.extend(arg.right.elts)
-                else:
-                    node.args.append(arg.right)
-                patch = Patch(
-                    node.lineno, node.end_lineno, node.col_offset, ast.unparse(node)
-                )
-                patches[patch.line] = patch
-            elif isinstance(arg, ast.JoinedStr):
-                args = []
-                format_string = ""
-                for v in arg.values:
-                    if isinstance(v, ast.FormattedValue):
-                        args.append(v.value)
-                        format_string += get_format_spec(v)
-                    elif isinstance(v, ast.Constant):
-                        format_string += v.value
-                    else:
-                        # TODO: Should skip() here?
-                        raise Exception(f"Unknown value: {v} type: {type(v)}")
-                node.args = list()
-                node.args.append(ast.Constant(format_string))
-                node.args.extend(args)
-                patch = Patch(
-                    node.lineno, node.end_lineno, node.col_offset, ast.unparse(node)
-                )
-                patches[patch.line] = patch
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                calls.append(node)
+        elif isinstance(node, (ast.ImportFrom, ast.Assign)):
+            bind(node, bindings)
+    for node in calls:
+        api = log_api(node, bindings)
+        if api is None:
+            continue
+        if len(node.args) != 1:
+            # If the logging call has more than one arg then it is not
+            # one of the cases we handle.  That is, it (likely) already uses
+            # lazy string interpolation.
+            continue
+        arg = node.args[0]
+        kind = interpolation_kind(arg)
+        if kind is None:
+            continue
+        PROFILER.count("candidates")
+        if not own_lines(lines, node):
+            print(f"Skipping {path} {node.lineno} not on a line of its own")
+            continue
+        # The rewriters replace the arguments of the call they are given.
+        lazy = copy.copy(node)
+        if REWRITERS[api.style](lazy, arg, kind):
+            patch = make_patch(lazy, kind)
+            patches[patch.line] = patch
+            if originals is not None:
+                originals[patch.line] = (node, api.style)
+        else:
+            skip(path, node)
     return patches
 
 
+def interpolation_kind(arg: ast.AST) -> str:
+    """
+    Determine how the message passed to a logging call is formatted.
+
+    :param arg: the message argument of a logging call.
+    :return: one of ``format``, ``modop`` or ``fstring``, or None if the
+             message is not formatted greedily.
+    """
+    if is_str_format(arg):
+        return "format"
+    if isinstance(arg, ast.BinOp) and isinstance(arg.op, ast.Mod):
+        return "modop"
+    if isinstance(arg, ast.JoinedStr):
+        return "fstring"
+    return None
+
+
+def rewrite_percent(node: ast.Call, arg: ast.AST, kind: str) -> bool:
+    """
+    Rewrites the arguments of ``node`` to use lazy ``%`` formatting as
+    expected by the standard library ``logging`` module.
+
+    :param node: the logging call to rewrite.
+    :param arg: the message argument of the logging call.
+    :param kind: the kind of interpolation, see ``interpolation_kind``.
+    :return: True if the call was rewritten, False if it should be skipped.
+    """
+    if kind == "format":
+        if isinstance(arg.func.value, ast.Constant) and len(arg.keywords) == 0:
+            # We only handle cases where the LHS is a literal string
+            # constant with no keyword substitutions.
+            format_string = re.sub(
+                r"{\s*}",
+                "%s",
+                arg.func.value.value,
+            )
+            if "{" in format_string:
+                # There is some sort of funky formatting going on.
+                return False
+            node.args = list()
+            node.args.append(ast.Constant(format_string))
+            node.args.extend(arg.args)
+            return True
+        return False
+    if kind == "modop":
+        node.args = list()
+        node.args.append(arg.left)
+        if isinstance(arg.right, ast.Tuple):
+            node.args.extend(arg.right.elts)
+        else:
+            node.args.append(arg.right)
+        return True
+    args = []
+    format_string = ""
+    for v in arg.values:
+        if isinstance(v, ast.FormattedValue):
+            spec = get_format_spec(v)
+            if spec is None:
+                return False
+            args.append(v.value)
+            format_string += spec
+        elif isinstance(v, ast.Constant):
+            format_string += v.value
+        else:
+            return False
+    node.args = list()
+    node.args.append(ast.Constant(format_string))
+    node.args.extend(args)
+    return True
+
+
+def get_brace_field(v: ast.FormattedValue) -> str:
+    """
+    Get the ``str.format`` replacement field equivalent to a value in an
+    f-string, or None if the format specifier is itself computed.
+    """
+    field = "{"
+    if v.conversion != -1:
+        field += "!" + chr(v.conversion)
+    if v.format_spec is not None:
+        if not all(isinstance(part, ast.Constant) for part in v.format_spec.values):
+            return None
+        field += ":" + "".join(part.value for part in v.format_spec.values)
+    return field + "}"
+
+
+def percent_to_brace(match: re.Match) -> str:
+    """
+    Converts a single printf style specifier to a ``str.format`` replacement
+    field, or returns None if there is no equivalent.
+
+    ``%`` converts with ``str()``, ``int()`` or ``float()`` first, while
+    ``format`` uses the type of the value, so ``{:>10}`` fails for None and
+    ``{:d}`` for a float.  String specifiers convert explicitly with ``!s``,
+    and the integer specifiers, which ``%`` also applies to floats, and
+    ``%c``, which also accepts a string, are not converted.
+    """
+    if match.group("key") is not None or "*" in (match.group("width") or ""):
+        return None
+    if match.group("precision") == "*":
+        return None
+    type = match.group("type")
+    if type == "%":
+        return "%"
+    if type in "diuc":
+        return None
+    flags = match.group("flags")
+    width = match.group("width") or ""
+    precision = match.group("precision")
+    spec = ""
+    if type in "rsa":
+        if "-" in flags:
+            spec += "<"
+        elif width:
+            # Strings are left aligned by str.format but right aligned by %.
+            spec += ">"
+        # The other flags are ignored by % for strings.
+        spec += width
+        if precision is not None:
+            spec += "." + precision
+        if type == "s" and spec == "":
+            return "{}"
+        return "{!" + type + (":" + spec if spec else "") + "}"
+    if "-" in flags:
+        spec += "<"
+    for flag in "+ #":
+        if flag in flags:
+            spec += flag
+    if "0" in flags and "-" not in flags:
+        spec += "0"
+    spec += width
+    if precision is not None:
+        spec += "." + precision
+    spec += type
+    return "{:" + spec + "}"
+
+
+def rewrite_brace(node: ast.Call, arg: ast.AST, kind: str) -> bool:
+    """
+    Rewrites the arguments of ``node`` to use lazy ``str.format`` style
+    formatting, e.g. ``logger.debug("hello {}", world)`` as expected by loguru.
+    See ``rewrite_percent``.
+    """
+    if kind == "format":
+        if not isinstance(arg.func.value, ast.Constant):
+            return False
+        if len(arg.args) == 0 and len(arg.keywords) == 0 and len(node.keywords) == 0:
+            # The template would be logged as it is, with its braces doubled.
+            return False
+        node.args = [arg.func.value] + list(arg.args)
+        node.keywords = list(arg.keywords) + list(node.keywords)
+        return True
+    if kind == "modop":
+        if not isinstance(arg.left, ast.Constant) or not isinstance(arg.left.value, str):
+            return False
+        if isinstance(arg.right, ast.Dict):
+            return False
+        values = arg.right.elts if isinstance(arg.right, ast.Tuple) else [arg.right]
+        template = arg.left.value
+        escape = brace_escape(len(values) > 0 or len(node.keywords) > 0)
+        format_string = ""
+        end = 0
+        count = 0
+        for match in PERCENT_SPEC.finditer(template):
+            field = percent_to_brace(match)
+            if field is None:
+                return False
+            format_string += escape(template[end:match.start()]) + field
+            if field != "%":
+                count += 1
+            end = match.end()
+        format_string += escape(template[end:])
+        if count != len(values):
+            return False
+        node.args = [ast.Constant(format_string)] + list(values)
+        return True
+    args = [v.value for v in arg.values if isinstance(v, ast.FormattedValue)]
+    escape = brace_escape(len(args) > 0 or len(node.keywords) > 0)
+    format_string = ""
+    for v in arg.values:
+        if isinstance(v, ast.FormattedValue):
+            field = get_brace_field(v)
+            if field is None:
+                return False
+            format_string += field
+        else:
+            format_string += escape(v.value)
+    node.args = [ast.Constant(format_string)] + args
+    return True
+
+
+def brace_escape(formatted: bool):
+    """
+    Returns the function that escapes literal text in a ``str.format``
+    template.  loguru only formats the message when the call has arguments,
+    so otherwise the text is used as it is.
+    """
+    if formatted:
+        return lambda text: text.replace("{", "{{").replace("}", "}}")
+    return lambda text: text
+
+
+def get_key(expr: ast.AST) -> str:
+    """
+    Derives a keyword argument name from a simple expression, e.g.
+    ``user.id`` becomes ``user_id``.  Returns None for anything other than a
+    name or chain of attributes.
+    """
+    parts = []
+    while isinstance(expr, ast.Attribute):
+        parts.append(expr.attr)
+        expr = expr.value
+    if not isinstance(expr, ast.Name):
+        return None
+    if expr.id != "self" or len(parts) == 0:
+        parts.append(expr.id)
+    return "_".join(reversed(parts)).lstrip("_") or None
+
+
+def rewrite_kv(node: ast.Call, arg: ast.AST, kind: str) -> bool:
+    """
+    Rewrites the arguments of ``node`` in the key-value style used by
+    structlog.  Interpolated values are moved into keyword arguments and the
+    event keeps a ``{key}`` marker where each value used to be, e.g.
+    ``log.info(f"user {user.id} logged in")`` becomes
+    ``log.info("user {user_id} logged in", user_id=user.id)``.
+    See ``rewrite_percent``.
+    """
+    fields = []  # a list of literal strings and value expressions
+    if kind == "fstring":
+        for v in arg.values:
+            if isinstance(v, ast.FormattedValue):
+                if v.conversion != -1 or v.format_spec is not None:
+                    return False
+                fields.append(v.value)
+            else:
+                fields.append(v.value)
+    elif kind == "modop":
+        if not isinstance(arg.left, ast.Constant) or not isinstance(arg.left.value, str):
+            return False
+        values = list(arg.right.elts) if isinstance(arg.right, ast.Tuple) else [arg.right]
+        template = arg.left.value
+        end = 0
+        for match in PERCENT_SPEC.finditer(template):
+            fields.append(template[end:match.start()])
+            end = match.end()
+            if match.group("type") == "%":
+                fields.append("%")
+            elif match.group(0) in ("%s", "%r", "%d", "%i") and len(values) > 0:
+                fields.append(values.pop(0))
+            else:
+                return False
+        fields.append(template[end:])
+        if len(values) > 0:
+            return False
+    else:
+        if not isinstance(arg.func.value, ast.Constant) or len(arg.keywords) > 0:
+            return False
+        parts = re.split(r"({\s*})", arg.func.value.value)
+        values = list(arg.args)
+        for part in parts:
+            if re.fullmatch(r"{\s*}", part):
+                if len(values) == 0:
+                    return False
+                fields.append(values.pop(0))
+            elif "{" in part or "}" in part:
+                return False
+            else:
+                fields.append(part)
+        if len(values) > 0:
+            return False
+    existing = {keyword.arg for keyword in node.keywords}
+    keys = {}
+    event = ""
+    for field in fields:
+        if isinstance(field, str):
+            event += field
+            continue
+        key = get_key(field)
+        if key is None or key == "event" or key in existing:
+            return False
+        if key in keys and ast.dump(keys[key]) != ast.dump(field):
+            return False
+        keys[key] = field
+        event += "{" + key + "}"
+    node.args = [ast.Constant(event)]
+    node.keywords = [ast.keyword(key, value) for key, value in keys.items()] + list(node.keywords)
+    return True
+
+
+# The functions used to rewrite a logging call for each style of lazy
+# formatting, see ``logfix.apis``.
+REWRITERS = {
+    "percent": rewrite_percent,
+    "brace": rewrite_brace,
+    "kv": rewrite_kv,
+}
+
+
 def write_patched_file(path: str, patches: dict, source: str) -> None:
     """
     Writes Python source code to a file applying patches as needed.
@@ -192,22 +565,72 @@ def write_patched_file(path: str, patches: dict, source: str) -> None:
     """
     if len(patches) == 0:
         return
-    lines = source.splitlines(keepends=False)
     with open(path, "w") as f:
-        index = 0
-        while index < len(lines):
-            lineno = index + 1
-            if lineno in patches:
-                patch = patches[lineno]
+        write_patched_lines(f, patches, iter_lines(source))
+
+
+def iter_lines(source: str):
+    """
+    Yields the lines in ``source`` one at a time without line endings.  Unlike
+    ``str.splitlines`` this does not build a second copy of the entire file.
+
+    :param source: the Python source code to split.
+    """
+    start = 0
+    end = len(source)
+    while start < end:
+        index = source.find("\n", start)
+        if index < 0:
+            yield source[start:].rstrip("\r")
+            return
+        yield source[start:index].rstrip("\r")
+        start = index + 1
+
+
+def own_lines(lines, node: ast.AST) -> bool:
+    """
+    True if nothing else shares the lines of ``node``, other than a trailing
+    comment.
+
+    :param lines: the lines of the source, indexed from 0.
+    """
+    # Column offsets count UTF-8 bytes.
+    before = lines[node.lineno - 1].encode()[:node.col_offset]
+    after = lines[node.end_lineno - 1].encode()[node.end_col_offset:].strip()
+    return before.strip() == b"" and (after == b"" or after.startswith(b"#"))
+
+
+def write_patched_lines(f, patches: dict, lines) -> None:
+    """
+    Writes ``lines`` to the file object ``f`` replacing the lines covered by
+    any of the ``patches``.
+
+    :param f:       a file like object opened for writing
+    :param patches: the patches to be applied, keyed by line number
+    :param lines:   an iterable of source lines without line endings
+    :return:        None
+    """
+    skip_until = 0
+    for lineno, line in enumerate(lines, start=1):
+        if lineno <= skip_until:
+            continue
+        if lineno in patches:
+            patch = patches[lineno]
+            if patch.statement is not None:
                 f.write(patch.render() + "\n")
-                patch_length = patch.end_line - patch.line
-                index += patch_length
-            else:
-                f.write(lines[index] + "\n")
-            index += 1
+            skip_until = patch.end_line
+        else:
+            f.write(line + "\n")
 
 
-def patch_file(path: str) -> None:
+def patch_file(
+    path: str,
+    max_size: int = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> int:
     """
     Parse the source code in the file ``path`` and replace any logging
     statements that do greedy string interpolation with an equivalent logging
@@ -217,15 +640,30 @@ def patch_file(path: str) -> None:
     string interpolation the file is left unmodified.  Otherwise, the existing
     file will be overwritten with the new content.
 
+    Files larger than ``max_size`` bytes are never read into memory in their
+    entirety; they are scanned one logical line at a time by
+    ``logfix.stream.patch_large_file`` instead.
+
     :param path: the path to the source file to be patched.
-    :return: None
+    :param max_size: the largest file, in bytes, that will be parsed in one
+                     piece.  ``None`` means there is no limit.
+    :param verify: only apply patches that ``logfix.verify`` can show log the
+                   same message as the original statement.
+    :param throttle: see ``analyze_source``.  Not used for large files.
+    :param hoist: see ``analyze_source``.  Not used for large files.
+    :param defer: see ``analyze_source``.  Not used for large files.
+    :return: the number of patches applied.
     """
-    # global n_patched_files, n_patched_lines
-    with open(path) as f:
-        source = f.read()
+    if max_size is not None and os.path.getsize(path) > max_size:
+        from logfix.stream import patch_large_file
+        return patch_large_file(path, verify)
+    with PROFILER.phase("read"):
+        with open(path) as f:
+            source = f.read()
     # Get the lines, if any, that need to be re-written
-    patches = get_patch(source, path)
+    patches = analyze_source(source, path, verify, throttle, hoist, defer)
     # Write new file if the current one needs patching.
     if len(patches) > 0:
-        write_patched_file(path, patches, source)
+        with PROFILER.phase("write"):
+            write_patched_file(path, patches, source)
     return len(patches)
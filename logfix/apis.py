@@ -0,0 +1,200 @@
+"""
+Profiles for the logging libraries that logfix understands.
+
+A profile describes how to recognize a logger object and which style of lazy
+formatting the library expects:
+
+``percent``
+    the standard library: ``log.debug("hello %s", world)``
+``brace``
+    loguru: ``logger.debug("hello {}", world)``
+``kv``
+    structlog: ``log.debug("hello {world}", world=world)``
+
+Loggers are recognized by name (``log``, ``logger`` and ``logging`` are
+assumed to be standard library loggers), by the imports and assignments in a
+module (e.g. ``from loguru import logger`` or
+``log = structlog.get_logger()``), or by a chained call to a logger factory
+such as ``logging.getLogger(__name__).debug(...)``.
+
+Additional profiles can be added with ``register``.
+"""
+
+import ast
+import re
+
+LOGGER_NAMES = ["log", "logger", "logging"]
+LOGGER_METHODS = ["trace", "debug", "info", "warn", "warning", "error", "critical", "exception"]
+
+# Matches a printf style conversion specifier as used by the percent style.
+PERCENT_SPEC = re.compile(
+    r"%(?:\((?P<key>[^)]*)\))?(?P<flags>[-+ #0]*)(?P<width>\*|\d+)?"
+    r"(?:\.(?P<precision>\*|\d+))?[hlL]?(?P<type>[diouxXeEfFgGcrsa%])"
+)
+
+
+class LoggerAPI:
+    """
+    Describes one logging library.
+
+    :param name: the name of the library, used in messages.
+    :param style: the lazy formatting style, one of ``percent``, ``brace`` or
+                  ``kv``.
+    :param methods: the names of the logging methods.
+    :param factories: dotted names of functions that return a logger.
+    :param objects: dotted names of importable logger objects.
+    :param derived: names of logger methods that return a new logger, e.g.
+                    ``bind``.
+    """
+
+    __slots__ = ("name", "style", "methods", "factories", "objects", "derived")
+
+    def __init__(
+        self,
+        name: str,
+        style: str,
+        methods,
+        factories=(),
+        objects=(),
+        derived=(),
+    ):
+        self.name = name
+        self.style = style
+        self.methods = frozenset(methods)
+        self.factories = frozenset(factories)
+        self.objects = frozenset(objects)
+        self.derived = frozenset(derived)
+
+
+STDLIB = LoggerAPI(
+    "logging",
+    "percent",
+    LOGGER_METHODS,
+    factories=["logging.getLogger", "getLogger"],
+    objects=["logging.root"],
+    derived=["getChild"],
+)
+
+LOGURU = LoggerAPI(
+    "loguru",
+    "brace",
+    ["trace", "debug", "info", "success", "warning", "error", "critical", "exception"],
+    objects=["loguru.logger"],
+    derived=["bind", "opt", "patch", "contextualize"],
+)
+
+STRUCTLOG = LoggerAPI(
+    "structlog",
+    "kv",
+    ["debug", "info", "msg", "warn", "warning", "error", "err", "critical", "fatal", "exception"],
+    factories=[
+        "structlog.get_logger",
+        "structlog.getLogger",
+        "structlog.stdlib.get_logger",
+        "structlog.wrap_logger",
+    ],
+    derived=["bind", "new", "unbind", "try_unbind"],
+)
+
+API_PROFILES = [STDLIB, LOGURU, STRUCTLOG]
+
+
+def register(api: LoggerAPI) -> None:
+    """Adds a profile.  Later profiles take precedence over earlier ones."""
+    API_PROFILES.append(api)
+
+
+def dotted_name(node: ast.AST) -> str:
+    """
+    Returns the dotted name for a chain of ``ast.Attribute`` nodes ending in
+    an ``ast.Name``, or None if ``node`` is not such a chain.
+    """
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def resolve(node: ast.AST, bindings: dict):
+    """
+    Determine which library, if any, the expression ``node`` is a logger for.
+
+    :param node: the receiver of a method call, e.g. the ``log`` in
+                 ``log.debug(...)``
+    :param bindings: the names bound to loggers in the module being scanned.
+    :return: a ``LoggerAPI`` or None.
+    """
+    if isinstance(node, ast.Name):
+        api = bindings.get(node.id)
+        if api is None and node.id in LOGGER_NAMES:
+            return STDLIB
+        return api
+    if isinstance(node, ast.Call):
+        func = node.func
+        name = dotted_name(func)
+        if name is not None:
+            for api in reversed(API_PROFILES):
+                if name in api.factories:
+                    return api
+            # A factory imported by name, e.g. ``from structlog import get_logger``.
+            api = bindings.get(("factory", name))
+            if api is not None:
+                return api
+        if isinstance(func, ast.Attribute):
+            api = resolve(func.value, bindings)
+            if api is not None and func.attr in api.derived:
+                return api
+        return None
+    name = dotted_name(node)
+    if name is not None:
+        for api in reversed(API_PROFILES):
+            if name in api.objects:
+                return api
+    return None
+
+
+def bind(node: ast.AST, bindings: dict) -> None:
+    """
+    Records the names bound to loggers by an import or assignment statement,
+    and the names logger factories are imported as.  Scopes are ignored; a
+    name bound to a logger anywhere in a module is assumed to be that logger
+    everywhere in the module.
+    """
+    if isinstance(node, ast.ImportFrom):
+        if node.module is None:
+            return
+        for alias in node.names:
+            dotted = f"{node.module}.{alias.name}"
+            for api in reversed(API_PROFILES):
+                if dotted in api.objects:
+                    bindings[alias.asname or alias.name] = api
+                    break
+                if dotted in api.factories:
+                    bindings[("factory", alias.asname or alias.name)] = api
+                    break
+    elif isinstance(node, ast.Assign):
+        if not isinstance(node.value, (ast.Call, ast.Attribute, ast.Name)):
+            return
+        api = resolve(node.value, bindings)
+        if api is None:
+            return
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                bindings[target.id] = api
+
+
+def log_api(node: ast.AST, bindings: dict = None):
+    """
+    Returns the ``LoggerAPI`` for a call to a logging method, or None if
+    ``node`` is not a logging call.
+    """
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return None
+    api = resolve(node.func.value, bindings or {})
+    if api is not None and node.func.attr in api.methods:
+        return api
+    return None
@@ -0,0 +1,146 @@
+"""
+Report only the greedy logging calls that are not in a stored baseline.
+
+A large code base can not be patched in one go, but new greedy calls can be
+stopped.  The first ``loglint --baseline FILE`` run stores a fingerprint of
+every finding; later runs report only findings that are not in the
+baseline, and remove fingerprints from it as the calls are fixed.  New
+findings are never added, so the baseline only shrinks.
+
+A fingerprint is the hash of the statement with all white space removed and
+the ``def`` and ``class`` blocks it is in, kept per file.  Line numbers are
+not used, so unrelated edits that move a call do not make it new.  The same
+statement repeated in one function is counted.  Logging calls in loops
+(``--loops``) and messages built by helpers (``--helpers``) are findings of
+their own kind, with the kind added to the fingerprint.  Scopes are found
+from the indentation of ``def`` and ``class`` lines, which avoids parsing the
+file a second time.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+BASELINE_VERSION = 1
+
+DEF = re.compile(r"(?:async\s+def|def|class)\s+(\w+)")
+
+
+def digest(text: str) -> str:
+    return hashlib.sha1("".join(text.split()).encode()).hexdigest()[:16]
+
+
+def fingerprints(findings: list, lines) -> list:
+    """
+    Computes the fingerprint of each finding.
+
+    :param findings: ``(kind, line, end_line)`` for each finding in one
+                     file, where ``kind`` is ``""`` for a patch.
+    :param lines: an iterable of the lines of the original file.
+    :return: a list of ``(finding, fingerprint)`` in line order.
+    """
+    if len(findings) == 0:
+        return []
+    pending = sorted(findings, key=lambda f: (f[1], f[2], f[0]))
+    stack = []  # (indent, name) of the enclosing blocks
+    found = []
+    i = 0
+    active = []  # [finding, scope, lines] of the findings being read
+    for lineno, line in enumerate(lines, start=1):
+        if i == len(pending) and not active:
+            break
+        code = line.lstrip()
+        if code and not code.startswith("#") and not active:
+            indent = len(line) - len(code)
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            match = DEF.match(code)
+            if match is not None:
+                stack.append((indent, match.group(1)))
+        while i < len(pending) and pending[i][1] <= lineno:
+            active.append((pending[i], ".".join(name for _, name in stack), []))
+            i += 1
+        for finding, scope, statement in active:
+            statement.append(line)
+            if finding[2] <= lineno:
+                fingerprint = f"{scope}:{digest(''.join(statement))}"
+                if finding[0]:
+                    fingerprint = f"{finding[0]}/{fingerprint}"
+                found.append((finding, fingerprint))
+        active = [a for a in active if a[0][2] > lineno]
+    found.sort(key=lambda f: (f[0][1], f[0][2], f[0][0]))
+    return found
+
+
+class Baseline:
+    """
+    The fingerprints of the findings in a tree, keyed by file relative to
+    the scanned directory.
+
+    :param path: the baseline file.  It is created by the first run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exists = os.path.exists(path)
+        self.files = {}
+        if self.exists:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") != BASELINE_VERSION:
+                raise ValueError(f"{path} is not a logfix baseline")
+            self.files = data["files"]
+        # The fingerprints matched by this run, which become the new baseline
+        # for the files that were checked.
+        self.seen = {}
+        self.new = 0
+        self.fixed = 0
+
+    def filter(self, relpath: str, findings: list, lines) -> list:
+        """
+        Records the findings in one file and returns the ones that are not in
+        the baseline.  When the baseline is being created nothing is new.
+
+        :param findings: every finding in the file, see ``fingerprints``.
+        """
+        relpath = relpath.replace(os.sep, "/")
+        known = dict(self.files.get(relpath, {}))
+        seen = self.seen.setdefault(relpath, {})
+        new = []
+        for finding, fingerprint in fingerprints(findings, lines):
+            if not self.exists or known.get(fingerprint, 0) > 0:
+                if self.exists:
+                    known[fingerprint] -= 1
+                seen[fingerprint] = seen.get(fingerprint, 0) + 1
+            else:
+                new.append(finding)
+        self.new += len(new)
+        self.fixed += sum(known.values())
+        return new
+
+    def save(self, directory: str) -> None:
+        """
+        Writes the baseline.  Files that were checked keep only the
+        fingerprints that were found again; files that were not checked, e.g.
+        in another shard, are kept unless they no longer exist.
+        """
+        files = {}
+        for relpath, counts in self.files.items():
+            if relpath not in self.seen and os.path.exists(os.path.join(directory, relpath)):
+                files[relpath] = counts
+        for relpath, counts in self.seen.items():
+            if len(counts) > 0:
+                files[relpath] = counts
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": BASELINE_VERSION, "files": files}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, self.path)
+
+    def print_summary(self, file=None) -> None:
+        if not self.exists:
+            total = sum(sum(c.values()) for c in self.seen.values())
+            print(f"Baseline {self.path} created with {total} findings", file=file)
+        else:
+            print(f"Baseline {self.new} new findings, {self.fixed} fixed since the baseline", file=file)
@@ -0,0 +1,284 @@
+"""
+Find greedy string interpolation in logging calls in compiled code.
+
+Third party packages are often installed without their sources, and even when
+the sources are available we can not patch them.  This module loads code
+objects from ``.pyc`` files, zip applications (``.pyz``) and wheels, and uses
+``dis`` to find logging calls whose only positional argument is the result of
+an f-string, the ``%`` operator, or a call to ``str.format``.  The results
+can be used to decide which upstream projects to file issues against.
+
+Only the bytecode of the running interpreter can be loaded; ``.pyc`` files
+compiled by other versions of Python are skipped.  The compiler rewrites simple
+``%`` formatting as f-string bytecode, so those calls are reported as f-strings.
+"""
+
+import dis
+import importlib.util
+import marshal
+import os
+import sys
+import types
+import zipfile
+
+from logfix import LOGGER_METHODS, LOGGER_NAMES
+
+# Offset of the code object in a .pyc file (PEP 552).
+PYC_HEADER_SIZE = 16
+ARCHIVE_SUFFIXES = (".pyz", ".whl", ".zip", ".egg")
+
+RECEIVER_OPS = {"LOAD_GLOBAL", "LOAD_NAME", "LOAD_FAST", "LOAD_DEREF"}
+METHOD_OPS = {"LOAD_METHOD", "LOAD_ATTR"}
+CALL_OPS = {"CALL", "CALL_KW", "CALL_METHOD", "CALL_FUNCTION", "CALL_FUNCTION_KW"}
+KEYWORD_CALL_OPS = {"CALL_KW", "CALL_FUNCTION_KW"}
+FSTRING_OPS = {"BUILD_STRING", "FORMAT_VALUE", "FORMAT_SIMPLE", "FORMAT_WITH_SPEC"}
+JUMP_OPS = set(dis.hasjrel) | set(dis.hasjabs)
+
+
+class Finding:
+    """A logging call in compiled code that formats its message eagerly."""
+
+    __slots__ = ("line", "qualname", "call", "kind")
+
+    def __init__(self, line: int, qualname: str, call: str, kind: str):
+        self.line = line
+        self.qualname = qualname
+        self.call = call
+        self.kind = kind
+
+    def render(self) -> str:
+        return f"{self.qualname}: {self.call}() eager {self.kind}"
+
+
+def line_table(code: types.CodeType) -> list:
+    """Returns the ``(start, end, line)`` ranges from ``co_lines``."""
+    if hasattr(code, "co_lines"):
+        return [entry for entry in code.co_lines() if entry[2] is not None]
+    return [(offset, offset + 1, line) for offset, line in dis.findlinestarts(code)]
+
+
+def line_for_offset(table: list, offset: int) -> int:
+    line = None
+    for start, end, lineno in table:
+        if start <= offset < end:
+            return lineno
+        if start <= offset:
+            line = lineno
+    return line
+
+
+def stack_effect(instr: dis.Instruction) -> int:
+    if instr.opcode < dis.HAVE_ARGUMENT:
+        return dis.stack_effect(instr.opcode)
+    return dis.stack_effect(instr.opcode, instr.arg, jump=False)
+
+
+def keyword_count(code: types.CodeType, instructions: list, index: int) -> int:
+    """
+    Count the keyword arguments passed by the call instruction at ``index``.
+    """
+    call = instructions[index]
+    if call.opname in KEYWORD_CALL_OPS:
+        names = instructions[index - 1].argval
+        return len(names) if isinstance(names, tuple) else 0
+    for instr in reversed(instructions[max(0, index - 3):index]):
+        if instr.opname == "KW_NAMES":
+            # dis does not always resolve the argument of KW_NAMES.
+            return len(code.co_consts[instr.arg])
+    return 0
+
+
+def classify(instructions: list, depths: list, index: int) -> str:
+    """
+    Determine how the value produced by the instruction at ``index`` was
+    built.  ``depths`` contains the stack depth before each instruction.
+
+    :return: one of ``f-string``, ``%`` or ``format``, or None if the value
+             was not produced by string formatting.
+    """
+    instr = instructions[index]
+    if instr.opname in FSTRING_OPS:
+        return "f-string"
+    if instr.opname == "BINARY_MODULO" or (
+        instr.opname == "BINARY_OP" and instr.argrepr.startswith("%")
+    ):
+        return "%"
+    if instr.opname in CALL_OPS:
+        # Find the instruction that loaded the method being called. It is
+        # the last one that pushed onto the slot just above the call result.
+        result = depths[index + 1]
+        for i in range(index - 1, -1, -1):
+            if depths[i] < result:
+                break
+            if depths[i] == result and depths[i + 1] == result + 1:
+                loader = instructions[i]
+                if loader.opname in METHOD_OPS and loader.argval == "format":
+                    return "format"
+                break
+    return None
+
+
+def scan_code(code: types.CodeType, qualname: str, findings: list) -> None:
+    """
+    Scans a code object, and all the code objects nested within it, for
+    logging calls that format their only positional argument eagerly.
+    """
+    instructions = list(dis.get_instructions(code))
+    table = line_table(code)
+    for i in range(len(instructions) - 1):
+        receiver = instructions[i]
+        method = instructions[i + 1]
+        if (
+            receiver.opname not in RECEIVER_OPS
+            or receiver.argval not in LOGGER_NAMES
+            or method.opname not in METHOD_OPS
+            or method.argval not in LOGGER_METHODS
+        ):
+            continue
+        # Simulate the stack, relative to the receiver, until the logging
+        # call consumes the receiver and leaves a single result.
+        depths = [0]
+        depth = 0
+        call = None
+        for j in range(i, len(instructions)):
+            instr = instructions[j]
+            if instr.opcode in JUMP_OPS:
+                break
+            try:
+                depth += stack_effect(instr)
+            except ValueError:
+                break
+            depths.append(depth)
+            if instr.opname in CALL_OPS and depth == 1:
+                call = j
+                break
+        if call is None:
+            continue
+        window = instructions[i:call + 1]
+        call_instr = instructions[call]
+        if call_instr.arg - keyword_count(code, instructions, call) != 1:
+            continue
+        # The depth after the method is loaded; the message is complete at
+        # the last instruction that leaves exactly one value above it.
+        base = depths[2]
+        producer = None
+        for k in range(2, len(window) - 1):
+            if depths[k + 1] == base + 1:
+                producer = k
+        if producer is None:
+            continue
+        kind = classify(window, depths, producer)
+        if kind is not None:
+            line = line_for_offset(table, call_instr.offset)
+            findings.append(
+                Finding(line, qualname, f"{receiver.argval}.{method.argval}", kind)
+            )
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            name = getattr(const, "co_qualname", const.co_name)
+            scan_code(const, f"{qualname.split(':')[0]}:{name}", findings)
+
+
+def module_name(path: str, root: str) -> str:
+    """Derives a dotted module name from the path of a .py or .pyc file."""
+    relpath = os.path.relpath(path, root) if root else path
+    parts = relpath.replace(os.sep, "/").split("/")
+    if len(parts) > 1 and parts[-2] == "__pycache__":
+        del parts[-2]
+    name = parts[-1].split(".")[0]
+    parts[-1] = name
+    if name == "__init__":
+        parts.pop()
+    return ".".join(p for p in parts if p and p != "..")
+
+
+def load_pyc(data: bytes):
+    """
+    Returns the code object stored in the contents of a .pyc file, or None if
+    it was compiled by a different version of Python.
+    """
+    if data[:4] != importlib.util.MAGIC_NUMBER:
+        return None
+    return marshal.loads(data[PYC_HEADER_SIZE:])
+
+
+def scan_pyc(path: str, module: str) -> list:
+    findings = []
+    with open(path, "rb") as f:
+        code = load_pyc(f.read())
+    if code is None:
+        print(f"Skipping {path} compiled by another version of Python", file=sys.stderr)
+        return findings
+    scan_code(code, f"{module}:<module>", findings)
+    return findings
+
+
+def scan_archive(path: str):
+    """
+    Yields ``(member, findings)`` for each module in a zip application, wheel
+    or egg.  Compiled members are loaded directly and source members are
+    compiled in memory.
+    """
+    with zipfile.ZipFile(path) as archive:
+        for member in sorted(archive.namelist()):
+            if member.endswith(".pyc"):
+                code = load_pyc(archive.read(member))
+                if code is None:
+                    continue
+            elif member.endswith(".py"):
+                try:
+                    code = compile(archive.read(member), member, "exec", dont_inherit=True)
+                except (SyntaxError, ValueError):
+                    print(f"Skipping {path}/{member} unable to compile", file=sys.stderr)
+                    continue
+            else:
+                continue
+            findings = []
+            scan_code(code, f"{module_name(member, '')}:<module>", findings)
+            yield f"{path}/{member}", findings
+
+
+def find_compiled(directory: str):
+    """Yields the compiled modules and archives below ``directory``."""
+    if os.path.isfile(directory):
+        yield directory
+        return
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".pyc") or file.endswith(ARCHIVE_SUFFIXES):
+                yield f"{root}/{file}"
+
+
+def print_findings(filepath: str, findings: list) -> None:
+    """Print findings in the same layout as ``linter.print_patches``."""
+    if len(findings) == 0:
+        return
+    print(filepath)
+    for finding in sorted(findings, key=lambda f: f.line or 0):
+        print(f"{finding.line or 0:04d}: ! {finding.render()}")
+    print()
+
+
+def run(directory: str) -> int:
+    """
+    Scans every compiled module and archive below ``directory`` and prints the
+    findings.
+
+    :return: the number of findings.
+    """
+    total = 0
+    for path in find_compiled(directory):
+        if path.endswith(ARCHIVE_SUFFIXES):
+            try:
+                results = list(scan_archive(path))
+            except zipfile.BadZipFile:
+                print(f"Skipping {path} not a zip archive", file=sys.stderr)
+                continue
+        else:
+            root = directory if os.path.isdir(directory) else os.path.dirname(directory)
+            results = [(path, scan_pyc(path, module_name(path, root)))]
+        for filepath, findings in results:
+            print_findings(filepath, findings)
+            total += len(findings)
+    return total
@@ -0,0 +1,173 @@
+"""
+Defer expensive arguments of logging calls with ``logfix.lazy``.
+
+Making a message lazy does not help when an argument is itself an expensive
+call; ``json.dumps`` below runs whether or not the record is emitted::
+
+    log.debug("payload %s", json.dumps(payload, indent=2))
+
+There is no conversion specifier that does the same work, so with
+``--defer`` the call is wrapped in one of the ``logfix.lazy`` classes, which
+only make it when a handler formats the record::
+
+    log.debug("payload %s", lazy.Json(payload, indent=2))
+
+``json.dumps``, ``pprint.pformat`` and ``str.join`` on a string literal are
+deferred when they are arguments of a logging call, or the whole message, in
+a statement on its own lines.  Calls to the ``structlog`` style of logger
+are left alone because its renderers do not convert values to strings.  A
+join is only deferred when its items are made by a call, a comprehension or
+a generator, e.g. ``", ".join(map(str, ids))``; joining a list that already
+exists is cheaper than creating the wrapper.
+
+The value is serialized when the record is formatted rather than when the
+call is made.  Handlers normally format the record during the call, but a
+buffering handler such as ``logging.handlers.MemoryHandler`` formats it
+later, and then shows a dict or list that was changed in the meantime, or
+the items an iterator yields then, as they are at that point.
+"""
+
+import ast
+
+from logfix import Patch, iter_lines, own_lines
+from logfix.apis import bind, dotted_name, log_api
+from logfix.helpers import PLACEHOLDERS
+from logfix.loops import add_logfix_import, logfix_name
+
+# The functions that are deferred and the logfix.lazy class that replaces
+# each.
+CLASSES = {
+    "json.dumps": "Json",
+    "pprint.pformat": "PFormat",
+}
+
+# The arguments of ``str.join`` that make the items, so deferring the join
+# saves more than the wrapper costs.
+JOIN_ITEMS = (ast.Call, ast.GeneratorExp, ast.ListComp, ast.SetComp)
+
+
+def import_names(tree: ast.AST) -> dict:
+    """Maps the names ``json``, ``pprint`` and their functions are imported as."""
+    names = {}
+    modules = {name.split(".")[0] for name in CLASSES}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in modules:
+                    names[alias.asname or alias.name] = alias.name
+        elif isinstance(node, ast.ImportFrom) and node.module in modules and node.level == 0:
+            for alias in node.names:
+                names[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return names
+
+
+def deferred(node: ast.AST, names: dict, module: str) -> ast.Call:
+    """
+    Returns the ``logfix.lazy`` call that replaces ``node``, or None if
+    ``node`` is not a call that is deferred.
+
+    :param module: the name ``logfix.lazy`` is imported as.
+    """
+    if not isinstance(node, ast.Call):
+        return None
+    func = node.func
+    if (
+        isinstance(func, ast.Attribute)
+        and func.attr == "join"
+        and isinstance(func.value, ast.Constant)
+        and isinstance(func.value.value, str)
+    ):
+        if len(node.args) != 1 or len(node.keywords) > 0 or not isinstance(node.args[0], JOIN_ITEMS):
+            return None
+        cls, args = "Join", [func.value] + node.args
+    else:
+        name = dotted_name(func)
+        if name is None:
+            return None
+        first, _, rest = name.partition(".")
+        if first not in names:
+            return None
+        name = names[first] + ("." + rest if rest else "")
+        if name not in CLASSES:
+            return None
+        cls, args = CLASSES[name], node.args
+    lazy = ast.Attribute(value=ast.Name(id=module, ctx=ast.Load()), attr=cls, ctx=ast.Load())
+    return ast.Call(func=lazy, args=args, keywords=node.keywords)
+
+
+def defer_call(call: ast.Call, api, names: dict, module: str) -> bool:
+    """
+    Wraps the deferred arguments of the logging call ``call`` in place.
+
+    :return: True if ``call`` was changed.
+    """
+    changed = False
+    for i, arg in enumerate(call.args):
+        wrapped = deferred(arg, names, module)
+        if wrapped is None:
+            continue
+        if i == 0:
+            if len(call.args) > 1:
+                # The result is the format string.
+                continue
+            call.args = [ast.Constant(ast.literal_eval(PLACEHOLDERS[api.style])), wrapped]
+            return True
+        call.args[i] = wrapped
+        changed = True
+    return changed
+
+
+def defer_patches(source: str, patches: dict, path: str) -> dict:
+    """
+    Adds patches that wrap the expensive arguments of logging calls in
+    ``logfix.lazy`` classes, combined with any existing patch for the same
+    statement, and a patch that imports the module.
+
+    :param source: the original source code.
+    :param patches: the patches already found for ``source``, keyed by line.
+    :param path: the name of the source file.  Used in messages only.
+    :return: ``patches`` with the new patches added.
+    """
+    if "dumps" not in source and "pformat" not in source and ".join" not in source:
+        return patches
+    tree = ast.parse(source, path)
+    names = import_names(tree)
+    bindings = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ImportFrom, ast.Assign)):
+            bind(node, bindings)
+    lines = list(iter_lines(source))
+    module, needs_import = logfix_name(tree, "lazy")
+    changed = 0
+    for stmt in ast.walk(tree):
+        if not isinstance(stmt, ast.Expr):
+            continue
+        api = log_api(stmt.value, bindings)
+        if api is None or api.style not in PLACEHOLDERS:
+            continue
+        patch = patches.get(stmt.lineno)
+        if patch is not None and patch.statement is not None:
+            call = ast.parse(patch.statement.strip(), mode="eval").body
+        else:
+            call = ast.parse(ast.unparse(stmt.value), mode="eval").body
+        if not defer_call(call, api, names, module):
+            continue
+        if not own_lines(lines, stmt):
+            print(f"Skipping {path} {stmt.lineno} not on a line of its own")
+            continue
+        patches[stmt.lineno] = Patch(stmt.lineno, stmt.end_lineno, stmt.col_offset, ast.unparse(call))
+        changed += 1
+    if changed > 0 and needs_import:
+        add_logfix_import(patches, tree, lines, "lazy", module)
+    return patches
+
+
+def add_arguments(parser) -> None:
+    """Add the command line option that defers expensive arguments."""
+    parser.add_argument(
+        "--defer",
+        action="store_true",
+        help="also wrap json.dumps(), pprint.pformat() and str.join() arguments "
+        "of logging calls in logfix.lazy objects",
+        default=False,
+    )
@@ -0,0 +1,206 @@
+"""
+Write the patches for a tree as a single unified diff instead of rewriting
+the files.
+
+Hunks are built directly from the line spans of each ``Patch``, so files are
+read once, line by line, and never compared as a whole.  Line endings of the
+original file are preserved and a missing newline at the end of a file is
+marked the way ``git diff`` does, so the output applies cleanly with
+``git apply`` or ``patch -p1``.
+"""
+
+import io
+import os
+import sys
+
+from logfix import PROFILER, analyze_source
+from logfix import discovery, shard
+from logfix.stream import get_large_file_patches
+
+CONTEXT = 3
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+
+def line_ending(line: str) -> str:
+    if line.endswith("\r\n"):
+        return "\r\n"
+    if line.endswith("\n") or line.endswith("\r"):
+        return line[-1]
+    return ""
+
+
+def diff_line(prefix: str, line: str) -> str:
+    if line_ending(line) == "":
+        return prefix + line + "\n" + NO_NEWLINE
+    return prefix + line
+
+
+def group_patches(patches: dict, context: int = CONTEXT) -> list:
+    """
+    Groups patches that are close enough together for their context lines to
+    overlap.  Each group becomes one hunk.
+    """
+    groups = []
+    for line in sorted(patches):
+        patch = patches[line]
+        if groups and patch.line - groups[-1][-1].end_line - 1 <= 2 * context:
+            groups[-1].append(patch)
+        else:
+            groups.append([patch])
+    return groups
+
+
+def format_hunk(window: list, group: list, offset: int) -> tuple:
+    """
+    Formats one hunk.
+
+    :param window: ``(lineno, line)`` pairs for the original lines covered by
+                   the hunk, including the context lines.
+    :param group: the patches applied in this hunk.
+    :param offset: the difference in length between the original and the
+                   patched file before this hunk.
+    :return: a tuple of the hunk text and the new offset.
+    """
+    starts = {patch.line: patch for patch in group}
+    body = []
+    old = new = 0
+    patch = None
+    removed = []
+    for lineno, line in window:
+        if patch is None and lineno in starts:
+            patch = starts[lineno]
+        if patch is None:
+            body.append(diff_line(" ", line))
+            old += 1
+            new += 1
+            continue
+        removed.append(line)
+        if lineno < patch.end_line:
+            continue
+        body.extend(diff_line("-", r) for r in removed)
+        # A patch may add lines, e.g. an import, or remove them.
+        rendered = patch.render()
+        added = [] if rendered is None else rendered.split("\n")
+        ending = line_ending(line)
+        for i, text in enumerate(added):
+            last = i == len(added) - 1
+            body.append(diff_line("+", text + (ending if last else ending or "\n")))
+        old += len(removed)
+        new += len(added)
+        patch = None
+        removed = []
+    start = window[0][0]
+    header = f"@@ -{start},{old} +{start + offset},{new} @@\n"
+    return header + "".join(body), offset + new - old
+
+
+def file_diff(relpath: str, patches: dict, lines, context: int = CONTEXT):
+    """
+    Yields the unified diff for one file.
+
+    :param relpath: the path written in the diff headers.
+    :param patches: the patches to apply, keyed by line number.
+    :param lines: an iterable of the original lines *with* their line
+                  endings, e.g. a file opened with ``newline=""``.
+    :param context: the number of unchanged lines around each change.
+    """
+    if len(patches) == 0:
+        return
+    relpath = relpath.replace(os.sep, "/")
+    yield f"diff --git a/{relpath} b/{relpath}\n--- a/{relpath}\n+++ b/{relpath}\n"
+    groups = iter(group_patches(patches, context))
+    group = next(groups)
+    offset = 0
+    window = []
+    for lineno, line in enumerate(lines, start=1):
+        if lineno < group[0].line - context:
+            continue
+        window.append((lineno, line))
+        if lineno < group[-1].end_line + context:
+            continue
+        hunk, offset = format_hunk(window, group, offset)
+        yield hunk
+        window = []
+        group = next(groups, None)
+        if group is None:
+            return
+    if window:
+        # The context of the last hunk runs past the end of the file.
+        hunk, offset = format_hunk(window, group, offset)
+        yield hunk
+
+
+def diff_file(
+    out,
+    filepath: str,
+    relpath: str,
+    max_size: int = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> int:
+    """
+    Writes the diff for one file to ``out``.
+
+    :return: the number of patches in the diff.
+    """
+    if max_size is not None and os.path.getsize(filepath) > max_size:
+        patches = get_large_file_patches(filepath, verify)
+        if len(patches) > 0:
+            with open(filepath, newline="") as f:
+                out.writelines(file_diff(relpath, patches, f))
+        return len(patches)
+    with PROFILER.phase("read"):
+        with open(filepath, newline="") as f:
+            source = f.read()
+    patches = analyze_source(source, filepath, verify, throttle, hoist, defer)
+    if len(patches) > 0:
+        with PROFILER.phase("write"):
+            out.writelines(file_diff(relpath, patches, io.StringIO(source, newline="")))
+    return len(patches)
+
+
+def run(
+    directory: str,
+    out,
+    max_size: int = None,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    """
+    Writes a unified diff of every patch under ``directory`` to the file
+    object ``out``.  Paths in the diff are relative to ``directory``.  No
+    source files are modified.
+    """
+    results = shard.new_results()
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder if part is None else shard.select(finder, directory, part)
+    for filepath in files:
+        results["files_checked"] += 1
+        with PROFILER.file(filepath):
+            relpath = os.path.relpath(filepath, directory)
+            n = diff_file(
+                out, filepath, relpath, max_size, verify, throttle, hoist, defer
+            )
+        if n > 0:
+            results["files_patched"] += 1
+            results["lines_patched"] += n
+    return results
+
+
+def open_output(path: str):
+    """
+    Opens the file the diff is written to, or stdout for ``-``.  ``None``
+    discards the diff, which is used by ``--check`` on its own.
+    """
+    if path is None:
+        return open(os.devnull, "w", newline="")
+    if path == "-":
+        return open(sys.stdout.fileno(), "w", newline="", closefd=False)
+    return open(path, "w", newline="")
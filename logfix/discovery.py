@@ -0,0 +1,290 @@
+"""
+Finds the Python source files to scan.
+
+Directories are walked with ``os.scandir`` and pruned as early as possible so
+we never descend into virtual environments, dependency directories, build
+outputs or anything listed in a ``.gitignore`` file.
+"""
+
+import fnmatch
+import os
+import re
+import sys
+import time
+
+DEFAULT_EXCLUDES = [
+    ".git",
+    ".hg",
+    ".logfix-cache",
+    ".logfix-journal",
+    ".svn",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    ".eggs",
+    "*.egg-info",
+    "node_modules",
+    "site-packages",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    "build",
+    "dist",
+]
+
+
+def translate_glob(pattern: str) -> str:
+    """
+    Translates a ``.gitignore`` style glob into a regular expression.  Unlike
+    ``fnmatch.translate`` a single ``*`` does not match a ``/``.
+
+    :param pattern: the glob to translate.
+    :return: a regular expression that matches the entire path.
+    """
+    i = 0
+    n = len(pattern)
+    regex = ""
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                regex += "\\["
+            else:
+                group = pattern[i + 1:end]
+                if group.startswith("!"):
+                    group = "^" + group[1:]
+                regex += f"[{group}]"
+                i = end
+        else:
+            regex += re.escape(c)
+        i += 1
+    return f"(?s:{regex})\\Z"
+
+
+class IgnoreRule:
+    """A single pattern from a ``.gitignore`` file."""
+
+    __slots__ = ("base", "regex", "negate", "dir_only", "anchored")
+
+    def __init__(self, base: str, pattern: str):
+        self.base = base
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        self.anchored = "/" in pattern
+        self.regex = re.compile(translate_glob(pattern.lstrip("/")))
+
+    def matches(self, relpath: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            if self.base:
+                if not relpath.startswith(self.base + "/"):
+                    return False
+                relpath = relpath[len(self.base) + 1:]
+            return self.regex.match(relpath) is not None
+        return self.regex.match(name) is not None
+
+
+def read_gitignore(path: str, base: str) -> list:
+    """
+    Reads the rules from a ``.gitignore`` file.
+
+    :param path: the path to the ``.gitignore`` file.
+    :param base: the directory containing the file relative to the scan root.
+    :return: a list of ``IgnoreRule`` objects, possibly empty.
+    """
+    rules = []
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.rstrip("\r\n").rstrip(" ")
+                if len(line) == 0 or line.startswith("#"):
+                    continue
+                if line.startswith("\\"):
+                    line = line[1:]
+                rules.append(IgnoreRule(base, line))
+    except OSError:
+        pass
+    return rules
+
+
+def is_ignored(rules: list, relpath: str, name: str, is_dir: bool) -> bool:
+    """The last matching rule wins, as it does in git."""
+    ignored = False
+    for rule in rules:
+        if rule.matches(relpath, name, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+def has_python_shebang(path: str) -> bool:
+    """Check if an extension-less file is a Python script."""
+    try:
+        with open(path, "rb") as f:
+            line = f.readline(256)
+    except OSError:
+        return False
+    return line.startswith(b"#!") and b"python" in line
+
+
+class Discovery:
+    """
+    Iterating over a Discovery yields the paths of the Python source files
+    below ``directory``.  Paths are yielded as soon as they are found so the
+    analysis can start before the walk is complete.  The time spent in the
+    walk itself, excluding the time spent by the consumer, is available in
+    ``elapsed`` (wall) and ``cpu`` once iteration is complete.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        excludes: list = None,
+        gitignore: bool = True,
+        default_excludes: bool = True,
+        shebangs: bool = True,
+    ):
+        self.directory = directory.rstrip("/") or "/"
+        self.excludes = list(excludes or [])
+        if default_excludes:
+            self.excludes.extend(DEFAULT_EXCLUDES)
+        self.gitignore = gitignore
+        self.shebangs = shebangs
+        self.elapsed = 0.0
+        self.cpu = 0.0
+        self.files = 0
+        self.pruned = 0
+        self.loops = []
+
+    def excluded(self, relpath: str, name: str) -> bool:
+        for pattern in self.excludes:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relpath, pattern):
+                return True
+        return False
+
+    def __iter__(self):
+        start = time.perf_counter()
+        cpu = time.process_time()
+        root = self.directory
+        st = os.stat(root)
+        visited = {(st.st_dev, st.st_ino)}
+        rules = []
+        if self.gitignore:
+            rules = read_gitignore(f"{root}/.gitignore", "")
+        # Each entry is a directory to scan, its path relative to the root and
+        # the ignore rules that apply to it.
+        stack = [(root, "", rules)]
+        while stack:
+            path, relpath, rules = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                print(f"Unable to scan {path}: {e.strerror}", file=sys.stderr)
+                continue
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                rel = f"{relpath}/{name}" if relpath else name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if self.excluded(rel, name) or is_ignored(rules, rel, name, is_dir):
+                    self.pruned += 1
+                    continue
+                if is_dir:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    key = (st.st_dev, st.st_ino)
+                    if key in visited:
+                        # A symbolic link to a directory that has already
+                        # been scanned, possibly one of our own ancestors.
+                        self.loops.append(entry.path)
+                        continue
+                    visited.add(key)
+                    subdirs.append((entry.path, rel))
+                elif name.endswith(".py") or (
+                    self.shebangs
+                    and "." not in name
+                    and entry.is_file()
+                    and has_python_shebang(entry.path)
+                ):
+                    self.files += 1
+                    self.elapsed += time.perf_counter() - start
+                    self.cpu += time.process_time() - cpu
+                    yield entry.path
+                    start = time.perf_counter()
+                    cpu = time.process_time()
+            for subdir, rel in reversed(subdirs):
+                child_rules = rules
+                if self.gitignore:
+                    local = read_gitignore(f"{subdir}/.gitignore", rel)
+                    if local:
+                        child_rules = rules + local
+                stack.append((subdir, rel, child_rules))
+        self.elapsed += time.perf_counter() - start
+        self.cpu += time.process_time() - cpu
+
+    def print_summary(self, file=None) -> None:
+        print(
+            f"Discovered {self.files} files in {self.elapsed:.3f} seconds "
+            f"({self.pruned} paths pruned)",
+            file=file,
+        )
+        for path in self.loops:
+            print(f"Skipped {path}, directory already scanned", file=file)
+
+
+def add_arguments(parser) -> None:
+    """Add the command line options that control file discovery."""
+    parser.add_argument(
+        "-x",
+        "--exclude",
+        action="append",
+        metavar="GLOB",
+        help="skip files and directories matching GLOB; may be repeated",
+        default=[],
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="do not skip paths listed in .gitignore files",
+        default=False,
+    )
+    parser.add_argument(
+        "--no-default-excludes",
+        action="store_true",
+        help="also scan virtual environments, node_modules, build outputs etc.",
+        default=False,
+    )
+
+
+def from_args(directory: str, args) -> Discovery:
+    """Create a Discovery from the parsed command line options."""
+    return Discovery(
+        directory,
+        excludes=args.exclude,
+        gitignore=not args.no_gitignore,
+        default_excludes=not args.no_default_excludes,
+    )
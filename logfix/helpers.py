@@ -0,0 +1,387 @@
+"""
+Find log messages built by helper functions.
+
+::
+
+    def _describe(self, job):
+        return f"job {job.id} in state {job.state}"
+
+    log.debug(self._describe(job))
+
+formats the message eagerly just like an f-string does, but the f-string is
+in another function, possibly in another module.  An index of the functions
+in a package whose return value is always a formatted string is built first,
+then logging calls whose only argument is a call to one of those functions
+are reported with a lazy alternative using ``logfix.lazy.Deferred``::
+
+    log.debug("%s", lazy.Deferred(self._describe, job))
+
+A function that returns the result of another helper is also a helper.
+Helpers are found in module level functions and in methods called through
+``self`` or ``cls``.  Calls through imports are resolved by module name; when
+the scanned directory is not the root of the import path the names are
+matched by their last components instead.
+
+Scanning the package means parsing every file, so the facts gathered from
+each file are cached, keyed by path, size and modification time.  Later runs
+only parse the files that changed.
+"""
+
+import ast
+import json
+import os
+import sys
+
+from logfix import PROFILER
+from logfix.apis import bind, log_api
+from logfix.bytecode import module_name
+
+CACHE_DIR = ".logfix-cache"
+CACHE_FILE = "helpers.json"
+# Changing what is recorded for a file must change the version so old
+# caches are discarded.
+CACHE_VERSION = 1
+
+# The argument placeholder for each formatting style, see logfix.apis.
+PLACEHOLDERS = {"percent": "'%s'", "brace": "'{}'"}
+
+
+def is_formatted(node: ast.AST) -> bool:
+    """True if ``node`` is an expression that formats a string."""
+    if isinstance(node, ast.JoinedStr):
+        return any(isinstance(v, ast.FormattedValue) for v in node.values)
+    if isinstance(node, ast.BinOp):
+        if isinstance(node.op, ast.Mod):
+            return isinstance(node.left, ast.Constant) and isinstance(node.left.value, str)
+        if isinstance(node.op, ast.Add):
+            return any(is_string(side) or is_formatted(side) for side in (node.left, node.right))
+        return False
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        return is_string(node.func.value) and node.func.attr in ("format", "join")
+    return False
+
+
+def is_string(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+class Scope:
+    """
+    The names needed to resolve calls in one module.
+
+    :param module: the dotted name of the module.
+    :param package: the package relative imports are resolved against.
+    """
+
+    def __init__(self, module: str, package: str):
+        self.module = module
+        self.package = package
+        self.functions = set()
+        self.imported = {}
+        self.modules = {}
+
+    def absolute(self, node: ast.ImportFrom) -> str:
+        if node.level == 0:
+            return node.module
+        parts = self.package.split(".") if self.package else []
+        if node.level > 1:
+            parts = parts[: len(parts) - node.level + 1]
+        if node.module:
+            parts.append(node.module)
+        return ".".join(parts)
+
+    def add_import(self, node: ast.AST) -> None:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    self.modules[alias.asname] = alias.name
+                else:
+                    top = alias.name.split(".")[0]
+                    self.modules[top] = top
+        else:
+            module = self.absolute(node)
+            for alias in node.names:
+                self.imported[alias.asname or alias.name] = f"{module}:{alias.name}"
+
+    def resolve(self, func: ast.AST, cls: str) -> str:
+        """
+        Returns the key, ``module:qualname``, of the function called by
+        ``func``, or None if it can not be determined.
+
+        :param cls: the name of the class the call is made in, if any.
+        """
+        if isinstance(func, ast.Name):
+            if func.id in self.functions:
+                return f"{self.module}:{func.id}"
+            return self.imported.get(func.id)
+        if not isinstance(func, ast.Attribute):
+            return None
+        value = func.value
+        if isinstance(value, ast.Name):
+            if value.id in ("self", "cls") and cls is not None:
+                return f"{self.module}:{cls}.{func.attr}"
+            if value.id in self.modules:
+                return f"{self.modules[value.id]}:{func.attr}"
+            if value.id in self.imported:
+                # from package import module; module.func()
+                return f"{self.imported[value.id].replace(':', '.')}:{func.attr}"
+        parts = []
+        while isinstance(value, ast.Attribute):
+            parts.append(value.attr)
+            value = value.value
+        if isinstance(value, ast.Name) and value.id in self.modules and parts:
+            # import a.b.c; a.b.c.func()
+            dotted = ".".join([value.id] + list(reversed(parts)))
+            return f"{dotted}:{func.attr}"
+        return None
+
+
+def scan_module(tree: ast.Module, module: str, package: str) -> dict:
+    """
+    Gathers the facts about one module that the index needs.
+
+    :return: a dictionary with:
+
+             ``functions``
+                 maps the qualified name of each function whose returns are
+                 all formatted strings or calls, to the keys of the functions
+                 called.  An empty list means the function is a helper.
+             ``sites``
+                 a list of ``[line, end_line, callee, statement, suggestion]``
+                 for each logging call whose only argument is a call.
+    """
+    scope = Scope(module, package)
+    bindings = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            scope.functions.add(node.name)
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            scope.add_import(node)
+        if isinstance(node, (ast.ImportFrom, ast.Assign)):
+            bind(node, bindings)
+    functions = {}
+    sites = []
+
+    def visit(node, qualname, cls):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.ClassDef):
+                visit(child, f"{qualname}{child.name}.", f"{qualname}{child.name}")
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                refs = returns(child, scope, cls)
+                if refs is not None:
+                    functions[f"{qualname}{child.name}"] = refs
+                visit(child, f"{qualname}{child.name}.<locals>.", cls)
+            else:
+                if isinstance(child, ast.Call):
+                    site = log_site(child, scope, cls, bindings)
+                    if site is not None:
+                        sites.append(site)
+                visit(child, qualname, cls)
+
+    visit(tree, "", None)
+    return {"functions": functions, "sites": sites}
+
+
+def returns(func: ast.AST, scope: Scope, cls: str) -> list:
+    """
+    Classifies the return statements of ``func``.
+
+    :return: None if some return is not a formatted string or a call that
+             can be resolved, otherwise the keys of the functions called.
+    """
+    refs = []
+    found = False
+    stack = list(func.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Return):
+            found = True
+            if node.value is not None and is_formatted(node.value):
+                continue
+            if isinstance(node.value, ast.Call):
+                key = scope.resolve(node.value.func, cls)
+                if key is not None:
+                    refs.append(key)
+                    continue
+            return None
+        stack.extend(ast.iter_child_nodes(node))
+    return refs if found else None
+
+
+def log_site(node: ast.Call, scope: Scope, cls: str, bindings: dict) -> list:
+    api = log_api(node, bindings)
+    if api is None or len(node.args) != 1 or len(node.keywords) > 0:
+        return None
+    arg = node.args[0]
+    if not isinstance(arg, ast.Call) or any(isinstance(a, ast.Starred) for a in arg.args):
+        return None
+    key = scope.resolve(arg.func, cls)
+    if key is None:
+        return None
+    deferred = ast.Call(
+        ast.Attribute(ast.Name("lazy", ast.Load()), "Deferred", ast.Load()),
+        [arg.func] + arg.args,
+        arg.keywords,
+    )
+    if api.style == "kv":
+        call = ast.Call(node.func, [ast.Constant("{message}")], [ast.keyword("message", deferred)])
+        suggestion = ast.unparse(call)
+    else:
+        suggestion = f"{ast.unparse(node.func)}({PLACEHOLDERS[api.style]}, {ast.unparse(deferred)})"
+    return [node.lineno, node.end_lineno, key, ast.unparse(node), suggestion]
+
+
+class HelperIndex:
+    """
+    The helper functions in a package and the logging calls that use them.
+
+    :param directory: the root of the package, module names are relative to
+                      it.
+    :param cache: the path of the cache file, or None for no cache.
+    """
+
+    def __init__(self, directory: str, cache: str = None):
+        self.directory = directory
+        self.cache = cache
+        self.files = {}
+        self.parsed = 0
+        self.names = {}
+        self.helpers = set()
+
+    def load(self) -> None:
+        if self.cache is None or not os.path.exists(self.cache):
+            return
+        try:
+            with open(self.cache) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.files = data["files"]
+
+    def save(self) -> None:
+        if self.cache is None:
+            return
+        os.makedirs(os.path.dirname(self.cache) or ".", exist_ok=True)
+        tmp = self.cache + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": CACHE_VERSION, "files": self.files}, f)
+        os.replace(tmp, self.cache)
+
+    def update(self, paths, max_size: int = None) -> None:
+        """
+        Brings the index up to date with ``paths``, parsing only the files
+        that are new or changed since the cache was written.
+
+        :param max_size: files larger than this are not indexed.
+        """
+        self.load()
+        files = {}
+        for path in paths:
+            relpath = os.path.relpath(path, self.directory)
+            st = os.stat(path)
+            if max_size is not None and st.st_size > max_size:
+                continue
+            stamp = [st.st_size, st.st_mtime_ns]
+            entry = self.files.get(relpath)
+            if entry is None or entry["stamp"] != stamp:
+                entry = self.scan(path, relpath, stamp)
+            files[relpath] = entry
+        self.files = files
+        self.save()
+        self.names = self.modules()
+        self.helpers = self.solve()
+
+    def scan(self, path: str, relpath: str, stamp: list) -> dict:
+        self.parsed += 1
+        module = module_name(relpath, None)
+        if os.path.basename(relpath) == "__init__.py":
+            package = module
+        else:
+            package = module.rpartition(".")[0]
+        with PROFILER.phase("parse"):
+            try:
+                with open(path) as f:
+                    tree = ast.parse(f.read(), path)
+            except (SyntaxError, UnicodeDecodeError, ValueError) as e:
+                print(f"Skipping {path} {e}", file=sys.stderr)
+                return {"stamp": stamp, "module": module, "functions": {}, "sites": []}
+        with PROFILER.phase("index"):
+            facts = scan_module(tree, module, package)
+        return {"stamp": stamp, "module": module, **facts}
+
+    def modules(self) -> dict:
+        """Maps every suffix of every module name to the full name."""
+        names = {}
+        for entry in self.files.values():
+            parts = entry["module"].split(".")
+            for i in range(len(parts)):
+                suffix = ".".join(parts[i:])
+                # An exact match, which is the shortest name, wins.
+                if suffix not in names or len(entry["module"]) < len(names[suffix]):
+                    names[suffix] = entry["module"]
+        return names
+
+    def canonical(self, key: str) -> str:
+        """
+        Maps the module in ``key`` to the name of a module in the index.  The
+        scanned directory may be above the root of the import path, e.g.
+        ``lib/galaxy/util.py`` is imported as ``galaxy.util``, or below it,
+        e.g. ``util.py`` when ``galaxy`` is scanned.
+        """
+        module, _, qualname = key.partition(":")
+        parts = module.split(".")
+        for i in range(len(parts)):
+            name = self.names.get(".".join(parts[i:]))
+            if name is not None:
+                return f"{name}:{qualname}"
+        return key
+
+    def solve(self) -> set:
+        """
+        Finds the helpers: functions that return formatted strings, or the
+        result of other helpers.
+        """
+        candidates = {}
+        for entry in self.files.values():
+            for qualname, refs in entry["functions"].items():
+                key = f"{entry['module']}:{qualname}"
+                candidates[key] = [self.canonical(r) for r in refs]
+        helpers = set()
+        changed = True
+        while changed:
+            changed = False
+            for key, refs in candidates.items():
+                if key not in helpers and all(r in helpers for r in refs):
+                    helpers.add(key)
+                    changed = True
+        return helpers
+
+    def sites(self, path: str) -> list:
+        """The logging calls in ``path`` whose message is built by a helper."""
+        entry = self.files.get(os.path.relpath(path, self.directory))
+        if entry is None:
+            return []
+        found = []
+        for site in entry["sites"]:
+            key = self.canonical(site[2])
+            if key in self.helpers:
+                found.append([site[0], site[1], key, site[3], site[4]])
+        return found
+
+
+def default_cache(directory: str) -> str:
+    return os.path.join(directory, CACHE_DIR, CACHE_FILE)
+
+
+def print_sites(filepath: str, sites: list) -> None:
+    if len(sites) == 0:
+        return
+    print(filepath)
+    for line, end_line, key, statement, suggestion in sites:
+        print(f"{line:04d}: - {statement}")
+        print(f"{line:04d}: ? {suggestion}  # message built by {key}")
+    print()
@@ -0,0 +1,325 @@
+"""
+Move logger lookups out of functions.
+
+::
+
+    def handle(self, job):
+        logging.getLogger(__name__).debug("handling %s", job)
+        logging.info("done")
+
+looks the logger up on every call: ``getLogger`` takes the lock of the
+logging module and searches the dictionary of loggers, and the module level
+``logging.info`` checks whether the root logger has to be configured before
+it can log.  With ``--hoist`` each logger is looked up once, when the module
+is imported, and the calls use the module level logger::
+
+    log = logging.getLogger(__name__)
+    root_log = logging.getLogger()
+
+    def handle(self, job):
+        log.debug("handling %s", job)
+        root_log.info("done")
+
+An existing module level logger with the same name is used if there is one
+and it exists before any module level code runs.
+Loggers whose name is not ``__name__`` or a string literal are reported but
+not rewritten, as are lookups in compound statements, e.g. the condition of
+an ``if``, and modules that do not import ``logging`` at the top level.
+
+The module level ``logging.info`` and friends call ``logging.basicConfig()``
+when the root logger has no handlers; the root logger itself does not, so a
+program that relies on that implicit configuration should configure logging
+itself.
+"""
+
+import ast
+import re
+
+from logfix import Patch, iter_lines, own_lines
+
+# The module level functions that log to the root logger.
+ROOT_METHODS = frozenset(["debug", "info", "warning", "warn", "error", "critical", "exception", "log"])
+
+# Statements that are unparsed and replaced as a whole.
+SIMPLE = (ast.Expr, ast.Assign, ast.AnnAssign, ast.AugAssign, ast.Return)
+
+FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+class Names:
+    """
+    The names ``logging`` and ``logging.getLogger`` are imported as in one
+    module, and the existing module level loggers.  A logger is only reused
+    if it is assigned before any module level code that could call a
+    function, which would otherwise run before the logger exists.
+    """
+
+    def __init__(self, tree: ast.Module):
+        self.modules = set()
+        self.getters = set()
+        # The statement a module level logger is added after, and the
+        # function it calls.
+        self.anchor = None
+        self.callee = None
+        self.loggers = {}
+        ran = False
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == "logging":
+                        self.modules.add(alias.asname or alias.name)
+            elif isinstance(node, ast.ImportFrom) and node.module == "logging" and node.level == 0:
+                for alias in node.names:
+                    if alias.name == "getLogger":
+                        self.getters.add(alias.asname or alias.name)
+        for stmt in tree.body:
+            if isinstance(stmt, ast.Import) and self.anchor is None:
+                for alias in stmt.names:
+                    if alias.name == "logging":
+                        self.anchor = stmt
+                        self.callee = f"{alias.asname or alias.name}.getLogger"
+            elif isinstance(stmt, ast.ImportFrom) and stmt.module == "logging" and self.anchor is None:
+                for alias in stmt.names:
+                    if alias.name == "getLogger" and stmt.level == 0:
+                        self.anchor = stmt
+                        self.callee = alias.asname or alias.name
+            elif isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+                target = stmt.targets[0]
+                key = self.logger_key(stmt.value)
+                if isinstance(target, ast.Name) and key is not None and key not in self.loggers and not ran:
+                    self.loggers[key] = target.id
+            ran = ran or self.runs_code(stmt)
+
+    def runs_code(self, stmt: ast.stmt) -> bool:
+        """
+        False for module level statements that can not call a function of
+        the module: imports, definitions, the docstring, logger lookups and
+        assignments without calls.
+        """
+        if isinstance(stmt, (ast.Import, ast.ImportFrom) + FUNCTIONS):
+            return False
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant):
+            return False
+        if isinstance(stmt, (ast.Assign, ast.AnnAssign)) and stmt.value is not None:
+            if self.logger_key(stmt.value) is not None:
+                return False
+            return any(isinstance(n, ast.Call) for n in ast.walk(stmt.value))
+        return True
+
+    def is_get_logger(self, node: ast.AST) -> bool:
+        if not isinstance(node, ast.Call):
+            return False
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id in self.getters
+        return (
+            isinstance(func, ast.Attribute)
+            and func.attr == "getLogger"
+            and isinstance(func.value, ast.Name)
+            and func.value.id in self.modules
+        )
+
+    def is_root_call(self, node: ast.AST) -> bool:
+        return (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ROOT_METHODS
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id in self.modules
+        )
+
+    def logger_key(self, node: ast.AST) -> str:
+        """
+        The source of the name passed to ``getLogger``, ``""`` for the root
+        logger, or None if ``node`` is not a call to ``getLogger`` with a
+        static name.
+        """
+        if not self.is_get_logger(node):
+            return None
+        args = list(node.args)
+        for keyword in node.keywords:
+            if keyword.arg != "name":
+                return None
+            args.append(keyword.value)
+        if len(args) == 0:
+            return ""
+        if len(args) > 1:
+            return None
+        arg = args[0]
+        if isinstance(arg, ast.Constant) and arg.value in (None, ""):
+            return ""
+        if isinstance(arg, ast.Name) and arg.id == "__name__":
+            return "__name__"
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            return repr(arg.value)
+        return None
+
+
+def bound_names(node: ast.AST) -> set:
+    """Every name bound anywhere in ``node``."""
+    names = set()
+    for n in ast.walk(node):
+        if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load):
+            names.add(n.id)
+        elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(n.name)
+        elif isinstance(n, ast.arg):
+            names.add(n.arg)
+        elif isinstance(n, ast.alias):
+            names.add(n.asname or n.name.split(".")[0])
+        elif isinstance(n, (ast.Global, ast.Nonlocal)):
+            names.update(n.names)
+    return names
+
+
+def fresh_name(key: str, used: set) -> str:
+    if key == "__name__":
+        bases = ["log", "logger", "_log"]
+    elif key == "":
+        bases = ["root_log", "_root_log"]
+    else:
+        bases = [re.sub(r"\W", "_", ast.literal_eval(key)).strip("_") + "_log"]
+    bases = [b if b[0].isalpha() or b[0] == "_" else "_" + b for b in bases]
+    for base in bases:
+        if base not in used:
+            return base
+    i = 2
+    while f"{bases[-1]}_{i}" in used:
+        i += 1
+    return f"{bases[-1]}_{i}"
+
+
+def find_lookups(tree: ast.Module, names: Names) -> list:
+    """
+    Finds the logger lookups made inside functions.
+
+    :return: a list of ``(statement, call, key, function)`` where ``key`` is
+             None for a ``getLogger`` call with a dynamic name and
+             ``function`` is the outermost function the call is in.
+    """
+    found = []
+
+    def visit(node, stmt, function):
+        if isinstance(node, ast.stmt):
+            stmt = node
+        if function is not None and isinstance(node, ast.Call):
+            if names.is_get_logger(node):
+                found.append((stmt, node, names.logger_key(node), function))
+            elif names.is_root_call(node):
+                found.append((stmt, node, "", function))
+        if isinstance(node, FUNCTIONS):
+            # Decorators and defaults are evaluated once, outside the function.
+            for child in node.decorator_list + [node.args]:
+                visit(child, stmt, function)
+            for child in node.body:
+                visit(child, stmt, function or node)
+            return
+        for child in ast.iter_child_nodes(node):
+            visit(child, stmt, function)
+
+    visit(tree, None, None)
+    return found
+
+
+class Replace(ast.NodeTransformer):
+    """Points logger lookups at module level loggers."""
+
+    def __init__(self, names: Names, loggers: dict):
+        self.names = names
+        self.loggers = loggers
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        key = self.names.logger_key(node)
+        if key is not None:
+            return ast.Name(self.loggers[key], ast.Load())
+        if self.names.is_root_call(node):
+            node.func.value = ast.Name(self.loggers[""], ast.Load())
+        return node
+
+
+def hoist_patches(source: str, patches: dict, path: str) -> dict:
+    """
+    Adds patches that replace logger lookups inside functions with module
+    level loggers, combined with any existing patch for the same statement,
+    and a patch that defines the loggers that do not exist yet.
+
+    :param source: the original source code.
+    :param patches: the patches already found for ``source``, keyed by line.
+    :param path: the name of the source file.  Used in messages only.
+    :return: ``patches`` with the new patches added.
+    """
+    if "logging" not in source:
+        return patches
+    tree = ast.parse(source, path)
+    names = Names(tree)
+    if len(names.modules) == 0 and len(names.getters) == 0:
+        return patches
+    found = find_lookups(tree, names)
+    if len(found) == 0:
+        return patches
+    lines = list(iter_lines(source))
+    if names.anchor is None:
+        for stmt, call, key, function in found:
+            print(f"Skipping {path} {call.lineno} logging is not imported at module level")
+        return patches
+    anchor = patches.get(names.anchor.lineno)
+    if anchor is not None and (anchor.end_line != names.anchor.end_lineno or anchor.statement is None):
+        print(f"Skipping {path} {names.anchor.lineno} the logging import is already patched")
+        return patches
+
+    used = bound_names(tree)
+    loggers = {}
+    new = []
+    statements = {}
+    for stmt, call, key, function in found:
+        if key is None:
+            print(f"Skipping {path} {call.lineno} dynamic logger name {ast.unparse(call)}")
+            continue
+        if not isinstance(stmt, SIMPLE) or not own_lines(lines, stmt):
+            print(f"Skipping {path} {call.lineno} not a simple statement on its own lines")
+            continue
+        if key not in loggers:
+            name = names.loggers.get(key)
+            local = set()
+            for _, _, k, f in found:
+                if k == key:
+                    local |= bound_names(f)
+            if name is None or name in local:
+                name = fresh_name(key, used)
+                used.add(name)
+                new.append(f"{name} = {names.callee}({key})")
+            loggers[key] = name
+        statements[stmt.lineno] = stmt
+    if len(statements) == 0:
+        return patches
+
+    replace = Replace(names, loggers)
+    for line, stmt in statements.items():
+        patch = patches.get(line)
+        if patch is not None and patch.statement is not None:
+            node = ast.parse(patch.statement.strip()).body[0]
+        else:
+            node = ast.parse(ast.unparse(stmt)).body[0]
+        node = replace.visit(node)
+        patches[line] = Patch(line, stmt.end_lineno, stmt.col_offset, ast.unparse(node))
+
+    if len(new) > 0:
+        start, end = names.anchor.lineno, names.anchor.end_lineno
+        if anchor is not None:
+            text = anchor.render()
+        else:
+            text = "\n".join(lines[start - 1:end])
+        patches[start] = Patch(start, end, 0, "\n".join([text] + new))
+    return patches
+
+
+def add_arguments(parser) -> None:
+    """Add the command line option that hoists logger lookups."""
+    parser.add_argument(
+        "--hoist",
+        action="store_true",
+        help="also move logging.getLogger() lookups and root logger calls out "
+        "of functions into module level loggers",
+        default=False,
+    )
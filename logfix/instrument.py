@@ -0,0 +1,260 @@
+"""
+Optional timing and counters for a scan.
+
+The hooks are always present in the code but do nothing until the profiler is
+enabled with ``--profile-run``.  Phase times are exclusive; when a phase is
+entered while another is running, for example ``unparse`` inside ``analyze``,
+the time is charged to the inner phase only.
+
+Modes that analyze files in worker processes run each file through
+``profiled``, which sends the profile of the file back with the result to be
+merged into the profile of the main process.
+"""
+
+import contextlib
+import heapq
+import json
+import time
+
+NULL_PHASE = contextlib.nullcontext()
+
+
+class Phase:
+    """Context manager that charges the time spent in a block to a phase."""
+
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.pop()
+        if exc[0] is not None and self.profiler.failed is None:
+            # The innermost phase is the first to see the exception.
+            self.profiler.failed = self.name
+        return False
+
+
+class FileTimer:
+    """Context manager that records the total time spent on one file."""
+
+    __slots__ = ("profiler", "path", "wall", "cpu")
+
+    def __init__(self, profiler, path: str):
+        self.profiler = profiler
+        self.path = path
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.profiler.files.append((wall, cpu, self.path))
+        self.profiler.count("files")
+        return False
+
+
+class Profiler:
+    """
+    Collects wall and CPU time per phase and per file, and named counters.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases = {}
+        self.counters = {}
+        self.files = []
+        self.stack = []
+        self.started = None
+        # The phase an exception was raised in, see logfix.isolate.
+        self.failed = None
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+        self.started = (time.perf_counter(), time.process_time())
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def phase(self, name: str):
+        """
+        Returns a context manager that times a block of code as part of the
+        named phase.
+        """
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def charge(self, name: str, wall: float, cpu: float, calls: int = 0) -> None:
+        totals = self.phases.get(name)
+        if totals is None:
+            totals = self.phases[name] = [0.0, 0.0, 0]
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += calls
+
+    def push(self, name: str) -> None:
+        now = (time.perf_counter(), time.process_time())
+        if self.stack:
+            # Pause the enclosing phase.
+            outer, wall, cpu = self.stack[-1]
+            self.charge(outer, now[0] - wall, now[1] - cpu)
+        self.stack.append((name, now[0], now[1]))
+
+    def pop(self) -> None:
+        now = (time.perf_counter(), time.process_time())
+        name, wall, cpu = self.stack.pop()
+        self.charge(name, now[0] - wall, now[1] - cpu, 1)
+        if self.stack:
+            # Resume the enclosing phase.
+            outer, _, _ = self.stack[-1]
+            self.stack[-1] = (outer, now[0], now[1])
+
+    def file(self, path: str):
+        """
+        Returns a context manager that times all the work done on a single
+        file.
+        """
+        if not self.enabled:
+            return NULL_PHASE
+        return FileTimer(self, path)
+
+    def take(self) -> tuple:
+        """
+        Returns the phases, counters and file times collected so far and
+        starts collecting them again.  See ``merge``.
+        """
+        data = (self.phases, self.counters, self.files)
+        self.phases = {}
+        self.counters = {}
+        self.files = []
+        return data
+
+    def merge(self, data: tuple) -> None:
+        """
+        Adds the data ``take`` returned in another process.  Does nothing if
+        ``data`` is None or the profiler is not enabled.
+        """
+        if data is None or not self.enabled:
+            return
+        phases, counters, files = data
+        for name, (wall, cpu, calls) in phases.items():
+            self.charge(name, wall, cpu, calls)
+        for name, n in counters.items():
+            self.count(name, n)
+        self.files.extend(files)
+
+    def summary(self, top: int = 10) -> dict:
+        wall = cpu = 0.0
+        if self.started is not None:
+            wall = time.perf_counter() - self.started[0]
+            cpu = time.process_time() - self.started[1]
+        phases = {}
+        for name, (phase_wall, phase_cpu, calls) in sorted(self.phases.items()):
+            phases[name] = {
+                "wall": round(phase_wall, 6),
+                "cpu": round(phase_cpu, 6),
+                "calls": calls,
+            }
+        slowest = [
+            {"path": path, "wall": round(file_wall, 6), "cpu": round(file_cpu, 6)}
+            for file_wall, file_cpu, path in heapq.nlargest(top, self.files)
+        ]
+        return {
+            "wall": round(wall, 6),
+            "cpu": round(cpu, 6),
+            "phases": phases,
+            "counters": dict(sorted(self.counters.items())),
+            "slowest": slowest,
+        }
+
+    def write(self, path: str = None, top: int = 10) -> None:
+        """
+        Writes the JSON summary to ``path``, or prints it if ``path`` is
+        ``None`` or ``-``.
+        """
+        text = json.dumps(self.summary(top), indent=2)
+        if path is None or path == "-":
+            print(text)
+        else:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+
+
+# The profiler used by all of logfix.
+PROFILER = Profiler()
+
+
+def start_worker(enabled: bool) -> None:
+    """
+    Runs once in each worker process.  Profiles the worker if the main
+    process is profiled; see ``profiled``.
+    """
+    PROFILER.disable()
+    if enabled:
+        PROFILER.enable()
+
+
+def profiled(func, path: str, *args) -> tuple:
+    """
+    Runs ``func(path, *args)`` in a worker process.
+
+    :return: a tuple of the result and the profile of the call, or None if
+             the worker is not profiled, for ``Profiler.merge``.
+    """
+    with PROFILER.file(path):
+        result = func(path, *args)
+    return result, PROFILER.take() if PROFILER.enabled else None
+
+
+def start(args) -> None:
+    """Enable the profiler if ``--profile-run`` was given."""
+    if args.profile_run is not None:
+        PROFILER.enable()
+
+
+def finish(args, finder) -> None:
+    """
+    Record the time spent finding files and write the profile if
+    ``--profile-run`` was given.
+    """
+    if args.profile_run is None:
+        return
+    PROFILER.charge("discover", finder.elapsed, finder.cpu, 1)
+    PROFILER.write(args.profile_run, args.profile_top)
+    PROFILER.disable()
+
+
+def add_arguments(parser) -> None:
+    """Add the command line options that control profiling."""
+    parser.add_argument(
+        "--profile-run",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="write per phase timings and counters as JSON to FILE (default stdout)",
+        default=None,
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        metavar="N",
+        help="number of slowest files to include in the profile (default 10)",
+        default=10,
+    )
@@ -0,0 +1,387 @@
+"""
+Analyze each file in a worker process with a time and memory limit.
+
+A generated or deeply nested file can make ``ast.parse`` or ``ast.unparse``
+raise ``RecursionError``, run out of memory, or take far longer than the rest
+of the tree together.  With ``--isolate`` every file is read, analyzed and
+patched in a worker process.  A file that raises, runs longer than
+``--timeout`` seconds or allocates more than ``--memory-limit`` is recorded in
+an error report, with the phase it failed in and how long it ran, and the run
+carries on with the next file.
+
+The timeout is raised inside the worker by ``SIGALRM``, so the phase is known
+and the worker is reused.  Each worker reports its process id when it starts
+on a file.  A worker stuck in C code that does not return to the interpreter
+is killed once the timeout and ``GRACE`` have passed since that report, and a
+worker that dies, e.g. from a crash in an extension, is noticed when its
+process is gone; the phase of either is reported as ``unknown``.  The pool
+replaces the worker and the files in the other workers carry on.
+"""
+
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import sys
+import time
+
+from logfix import PROFILER, analyze_source, iter_lines
+from logfix import linter, shard
+from logfix.instrument import profiled
+from logfix.memory import parse_size
+from logfix.stream import get_large_file_patches, replace_file, write_large_file
+
+# Seconds a worker is given to report a timeout before it is killed.
+GRACE = 5.0
+
+# Seconds between checks for workers that are overdue or gone.
+POLL = 0.1
+
+# Where a worker reports the file it starts on and its process id.
+STARTED = None
+
+
+class Timeout(Exception):
+    """Raised in a worker when a file takes longer than the timeout."""
+
+
+class WorkerDied(Exception):
+    """Recorded for a file whose worker process exited while working on it."""
+
+
+def on_alarm(signum, frame):
+    raise Timeout("timed out")
+
+
+def init_worker(memory_limit: int, started) -> None:
+    """Runs once in each worker process."""
+    global STARTED
+    STARTED = started
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    signal.signal(signal.SIGALRM, on_alarm)
+    # Phases are only tracked when the profiler is enabled.  The profile of
+    # each file is sent back by ``profiled`` and merged if the main process
+    # is profiled.
+    PROFILER.enable()
+
+
+def error(path: str, phase: str, e: BaseException, duration: float) -> dict:
+    """One entry in the error report."""
+    return {
+        "path": path,
+        "phase": phase,
+        "error": type(e).__name__,
+        "message": str(e),
+        "duration": round(duration, 6),
+    }
+
+
+def work(
+    path: str,
+    max_size: int,
+    timeout: float,
+    lint: bool,
+    verify: bool,
+    throttle: str,
+    hoist: bool,
+    defer: bool,
+) -> tuple:
+    """
+    Patches, or lints, one file.  Runs in a worker process.
+
+    The timeout covers reading and analyzing the file.  It is cancelled
+    before the file is written, and the file is replaced atomically, so a
+    failure never leaves a partially written file behind.
+
+    :return: a tuple of the number of patches and the lint output, or of
+             None and an error report entry.
+    """
+    if STARTED is not None:
+        STARTED.put((path, os.getpid()))
+    PROFILER.reset()
+    start = time.perf_counter()
+    if timeout is not None:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            if max_size is not None and os.path.getsize(path) > max_size:
+                source = None
+                with PROFILER.phase("analyze"):
+                    patches = get_large_file_patches(path, verify)
+            else:
+                with PROFILER.phase("read"):
+                    with open(path) as f:
+                        source = f.read()
+                patches = analyze_source(source, path, verify, throttle, hoist, defer)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        output = None
+        if lint:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                if source is None:
+                    linter.print_large_file_patches(path, patches)
+                else:
+                    linter.print_patches(path, patches, source)
+            output = output.getvalue()
+        elif len(patches) > 0:
+            with PROFILER.phase("write"):
+                if source is None:
+                    write_large_file(path, patches)
+                else:
+                    replace_file(path, patches, iter_lines(source))
+        return len(patches), output
+    except Exception as e:
+        # A failure outside of any phase is in the analysis proper.
+        phase = PROFILER.failed or "analyze"
+        return None, error(path, phase, e, time.perf_counter() - start)
+
+
+class Isolated:
+    """
+    Runs ``work`` for a stream of files in a pool of worker processes and
+    collects the files that failed.
+
+    :param workers: the number of worker processes, the CPU count by default.
+    :param timeout: seconds allowed for each file, or None for no limit.
+    :param memory_limit: the address space limit of each worker in bytes.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        timeout: float = None,
+        memory_limit: int = None,
+        max_size: int = None,
+        lint: bool = False,
+        verify: bool = True,
+        throttle: str = None,
+        hoist: bool = False,
+        defer: bool = False,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_size = max_size
+        self.lint = lint
+        self.verify = verify
+        self.throttle = throttle
+        self.hoist = hoist
+        self.defer = defer
+        self.errors = []
+
+    def new_pool(self):
+        return multiprocessing.Pool(
+            self.workers, initializer=init_worker, initargs=(self.memory_limit, self.started)
+        )
+
+    def submit(self, path: str) -> None:
+        args = (
+            path,
+            self.max_size,
+            self.timeout,
+            self.lint,
+            self.verify,
+            self.throttle,
+            self.hoist,
+            self.defer,
+        )
+        self.submitted[path] = time.perf_counter()
+        done = self.done
+        self.pool.apply_async(
+            profiled,
+            (work,) + args,
+            callback=lambda result: done.put((path, result, None)),
+            error_callback=lambda e: done.put((path, None, e)),
+        )
+
+    def fail(self, entry: dict) -> None:
+        print(
+            f"Error {entry['phase']} {entry['path']}: {entry['error']}: {entry['message']} "
+            f"after {entry['duration']:.2f} seconds",
+            file=sys.stderr,
+        )
+        self.errors.append(entry)
+
+    def run(self, paths) -> dict:
+        """
+        Processes every path, at most one per worker at a time.
+
+        :param paths: an iterable of paths, usually a ``Discovery``.
+        :return: the totals in the same form as ``main.run``.
+        """
+        results = shard.new_results()
+        paths = iter(paths)
+        # When a worker started each file in progress, or None until one
+        # does, when it was submitted, and the worker.
+        self.pending = {}
+        self.submitted = {}
+        self.pids = {}
+        self.started = multiprocessing.SimpleQueue()
+        self.done = queue.Queue()
+        self.pool = self.new_pool()
+        next_check = 0.0
+        try:
+            while True:
+                while len(self.pending) < self.workers:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    results["files_checked"] += 1
+                    self.pending[path] = None
+                    self.submit(path)
+                if len(self.pending) == 0:
+                    break
+                try:
+                    self.finish(*self.done.get(timeout=POLL), results)
+                except queue.Empty:
+                    pass
+                if time.perf_counter() >= next_check:
+                    self.check_workers()
+                    next_check = time.perf_counter() + POLL
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+        return results
+
+    def finish(self, path: str, result: tuple, e: BaseException, results: dict) -> None:
+        """Records the outcome of one file."""
+        if path not in self.pending:
+            # Given up on already.
+            return
+        start = self.pending.pop(path)
+        submitted = self.submitted.pop(path)
+        self.pids.pop(path, None)
+        if e is not None:
+            duration = time.perf_counter() - (submitted if start is None else start)
+            self.fail(error(path, "unknown", e, duration))
+            return
+        result, profile = result
+        PROFILER.merge(profile)
+        n, output = result
+        if n is None:
+            self.fail(output)
+            return
+        if output:
+            print(output, end="")
+        if n > 0:
+            results["files_patched"] += 1
+            results["lines_patched"] += n
+
+    def check_workers(self) -> None:
+        """
+        Records the files the workers have started, gives up on the files
+        whose worker is gone, and kills the workers of files that did not
+        finish in time.  The pool starts a new worker in place of each one.
+        The time allowed is measured from when a worker reports the file, so
+        a file that waited for a worker is not cut short.
+        """
+        now = time.perf_counter()
+        while not self.started.empty():
+            path, pid = self.started.get()
+            if path not in self.pending:
+                continue
+            for other in [p for p, other_pid in self.pids.items() if other_pid == pid]:
+                # The worker has finished with the file it had before.
+                del self.pids[other]
+            self.pids[path] = pid
+            self.pending[path] = now
+        for path, start in list(self.pending.items()):
+            if start is None:
+                if now - self.submitted[path] >= GRACE:
+                    # A worker that is killed just after it takes a file
+                    # loses the file.
+                    self.submit(path)
+                continue
+            pid = self.pids.get(path)
+            if pid is None:
+                # Finished; the result is on its way.
+                continue
+            if not alive(pid):
+                e = WorkerDied(f"worker {pid} exited")
+            elif self.timeout is not None and now - start >= self.timeout + GRACE:
+                os.kill(pid, signal.SIGKILL)
+                e = Timeout("timed out")
+            else:
+                continue
+            del self.pending[path]
+            del self.submitted[path]
+            del self.pids[path]
+            self.fail(error(path, "unknown", e, now - start))
+
+    def write_errors(self, path: str) -> None:
+        """Writes the error report as JSON to ``path``, or stdout for ``-``."""
+        report = json.dumps({"errors": self.errors}, indent=2)
+        if path == "-":
+            print(report)
+            return
+        with open(path, "w") as f:
+            f.write(report + "\n")
+
+    def print_summary(self) -> None:
+        if len(self.errors) > 0:
+            print(f"Errors  {len(self.errors)} files could not be processed", file=sys.stderr)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def enabled(args) -> bool:
+    """True if the command line asks for isolated workers."""
+    return args.isolate or args.timeout is not None or args.memory_limit is not None
+
+
+def add_arguments(parser) -> None:
+    """Add the command line options that control isolated workers."""
+    parser.add_argument(
+        "--isolate",
+        action="store_true",
+        help="process each file in a worker process; files that fail are "
+        "reported and skipped instead of stopping the run",
+        default=False,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="give up on a file after SECONDS (implies --isolate)",
+        default=None,
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=parse_size,
+        metavar="SIZE",
+        help="limit the address space of each worker to SIZE, e.g. 2G (implies --isolate)",
+        default=None,
+    )
+    parser.add_argument(
+        "--errors",
+        metavar="FILE",
+        help="write the files that failed with --isolate as JSON to FILE (- for stdout)",
+        default=None,
+    )
+
+
+def from_args(args) -> Isolated:
+    """Create an Isolated runner from the parsed command line options."""
+    return Isolated(
+        workers=args.workers,
+        timeout=args.timeout,
+        memory_limit=args.memory_limit,
+        max_size=args.max_file_size,
+        lint=args.lint,
+        verify=not args.no_verify,
+        throttle=args.throttle,
+        hoist=args.hoist,
+        defer=args.defer,
+    )
@@ -0,0 +1,82 @@
+"""
+Objects that defer building a log message until it is formatted.
+
+``logging`` only calls ``str()`` on its arguments when a record is emitted,
+so wrapping an expensive call in one of these objects makes it as cheap as a
+lazy format string when the record is discarded::
+
+    from logfix import lazy
+
+    log.debug("%s", lazy.Deferred(self._describe, job))
+    log.debug("payload %s", lazy.Json(payload, indent=2))
+    log.debug("state %s", lazy.PFormat(state))
+    log.debug("ids %s", lazy.Join(", ", map(str, ids)))
+
+The arguments are still evaluated at the call site; only the call itself is
+deferred.  A handler that buffers records, such as
+``logging.handlers.MemoryHandler``, formats them later, so a dict that is
+changed after the call, or the items an iterator yields, are shown as they
+are then.  ``Join`` only pays off when making or joining the items costs
+more than the object, e.g. for ``map(str, ids)`` of more than a few ids.
+
+The result is cached because each handler formats the record again.
+``str()``, ``repr()`` and ``format()`` give the same results as they would
+for the string the call returns, so any conversion in the message works as
+before.
+"""
+
+import json
+import pprint
+
+
+class Deferred:
+    """
+    Calls ``func(*args, **kwargs)`` the first time the object is converted to
+    a string.
+    """
+
+    __slots__ = ("func", "args", "kwargs", "value")
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+
+    def __str__(self) -> str:
+        if self.value is None:
+            self.value = str(self.func(*self.args, **self.kwargs))
+        return self.value
+
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+
+class Json(Deferred):
+    """``json.dumps(*args, **kwargs)``, when the record is formatted."""
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        Deferred.__init__(self, json.dumps, *args, **kwargs)
+
+
+class PFormat(Deferred):
+    """``pprint.pformat(*args, **kwargs)``, when the record is formatted."""
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        Deferred.__init__(self, pprint.pformat, *args, **kwargs)
+
+
+class Join(Deferred):
+    """``sep.join(items)``, when the record is formatted."""
+
+    __slots__ = ()
+
+    def __init__(self, sep: str, items):
+        Deferred.__init__(self, sep.join, items)
@@ -1,7 +1,13 @@
 import argparse
+import ast
 import os
+import sys
 
 from logfix import *
+from logfix import bytecode, defer, discovery, helpers, hoist, instrument, loops, shard
+from logfix.baseline import Baseline
+from logfix.memory import MemoryReport, parse_size
+from logfix.stream import get_large_file_patches, read_lines
 
 
 def print_patches(filepath: str, patches: dict, source: str):
@@ -13,19 +19,159 @@ def print_patches(filepath: str, patches: dict, source: str):
         patch = patches[line_no]
         for i in range(patch.line, patch.end_line + 1):
             print(f"{i:04d}: - {lines[i-1]}")
-        print(f"{patch.line:04d}: + {patch.render()}")
+        if patch.statement is not None:
+            print(f"{patch.line:04d}: + {patch.render()}")
     print()
 
 
-def run(directory: str):
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".py"):
-                filepath = f"{root}/{file}"
-                with open(filepath) as f:
-                    source = f.read()
-                patches = get_patch(source, filepath)
-                print_patches(filepath, patches, source)
+def print_large_file_patches(filepath: str, patches: dict):
+    """
+    Prints the patches for a file without reading the entire file into
+    memory.  Only the lines that will be replaced are read.
+    """
+    if len(patches) == 0:
+        return
+    wanted = set()
+    for patch in patches.values():
+        wanted.update(range(patch.line, patch.end_line + 1))
+    lines = read_lines(filepath, wanted)
+    print(filepath)
+    for line_no in sorted(patches):
+        patch = patches[line_no]
+        for i in range(patch.line, patch.end_line + 1):
+            print(f"{i:04d}: - {lines[i]}")
+        if patch.statement is not None:
+            print(f"{patch.line:04d}: + {patch.render()}")
+    print()
+
+
+def lint_file(
+    filepath: str,
+    max_size: int = None,
+    verify: bool = True,
+    throttle: str = None,
+    loop_report: bool = False,
+    baseline: Baseline = None,
+    relpath: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+    sites: list = (),
+) -> int:
+    """
+    Prints the patches, and the other findings asked for, for one file.
+
+    :param baseline: only print the findings that are not in this baseline.
+    :param relpath: the path of the file in the baseline.
+    :param sites: the logging calls whose message is built by a helper, see
+                  ``logfix.helpers``.
+    :return: the number of findings printed.
+    """
+    if max_size is not None and os.path.getsize(filepath) > max_size:
+        patches = get_large_file_patches(filepath, verify)
+        if baseline is not None:
+            with open(filepath) as f:
+                patches, _, sites = filter_findings(baseline, relpath, f, patches, [], sites)
+        print_large_file_patches(filepath, patches)
+        helpers.print_sites(filepath, sites)
+        return len(patches) + len(sites)
+    with PROFILER.phase("read"):
+        with open(filepath) as f:
+            source = f.read()
+    patches = analyze_source(source, filepath, verify, throttle, hoist, defer)
+    found = []
+    if loop_report:
+        with PROFILER.phase("loops"):
+            found = loops.find_loop_logs(ast.parse(source, filepath))
+    if baseline is not None:
+        with PROFILER.phase("baseline"):
+            patches, found, sites = filter_findings(
+                baseline, relpath, iter_lines(source), patches, found, sites
+            )
+    print_patches(filepath, patches, source)
+    loops.print_loop_logs(filepath, found)
+    helpers.print_sites(filepath, sites)
+    return len(patches) + len(found) + len(sites)
+
+
+def filter_findings(
+    baseline: Baseline, relpath: str, lines, patches: dict, found: list, sites: list
+) -> tuple:
+    """
+    Drops the patches, logging calls in loops and helper sites of one file
+    that are in the baseline.
+
+    :return: the new ``patches``, ``found`` and ``sites``.
+    """
+    findings = [("", p.line, p.end_line) for p in patches.values()]
+    findings += [("loops", f.line, f.node.end_lineno) for f in found]
+    findings += [("helpers", site[0], site[1]) for site in sites]
+    new = set(baseline.filter(relpath, findings, lines))
+    patches = {line: p for line, p in patches.items() if ("", p.line, p.end_line) in new}
+    found = [f for f in found if ("loops", f.line, f.node.end_lineno) in new]
+    sites = [site for site in sites if ("helpers", site[0], site[1]) in new]
+    return patches, found, sites
+
+
+def run(
+    directory: str,
+    max_size: int = None,
+    memory: bool = False,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+    verify: bool = True,
+    throttle: str = None,
+    loop_report: bool = False,
+    helper_cache: str = None,
+    baseline: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    """
+    :param helper_cache: also report messages built by helper functions,
+                         see ``logfix.helpers``, caching the index in this
+                         file.  An empty string disables the cache.
+    :param baseline: only report patches that are not in this baseline
+                     file, see ``logfix.baseline``, and update it.
+    """
+    results = shard.new_results()
+    if baseline is not None:
+        baseline = Baseline(baseline)
+    report = MemoryReport() if memory else None
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder
+    index = None
+    if helper_cache is not None:
+        # Helpers may be in any file, even in another shard, so the whole
+        # tree is indexed before the first file is reported.
+        files = list(finder)
+        index = helpers.HelperIndex(directory, helper_cache or None)
+        with PROFILER.phase("helpers"):
+            index.update(files, max_size)
+    if part is not None:
+        files = shard.select(files, directory, part)
+    for filepath in files:
+        results["files_checked"] += 1
+        if report is not None:
+            report.start()
+        with PROFILER.file(filepath):
+            relpath = os.path.relpath(filepath, directory)
+            sites = index.sites(filepath) if index is not None else ()
+            n = lint_file(
+                filepath, max_size, verify, throttle, loop_report, baseline, relpath, hoist, defer, sites
+            )
+        if report is not None:
+            report.stop(filepath)
+        if n > 0:
+            results["files_patched"] += 1
+            results["lines_patched"] += n
+    finder.print_summary(file=sys.stderr)
+    if baseline is not None:
+        baseline.save(directory)
+        baseline.print_summary(file=sys.stderr)
+    if report is not None:
+        report.print()
+    return results
 
 
 def main():
@@ -36,11 +182,93 @@ def main():
     )
 
     parser.add_argument("directory", help="the directory to scan", nargs="?")
+    parser.add_argument(
+        "--max-file-size",
+        type=parse_size,
+        metavar="SIZE",
+        help="scan files larger than SIZE (e.g. 512K, 4M) one statement at a time",
+        default=None,
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="report the peak memory used for each file",
+        default=False,
+    )
+    parser.add_argument(
+        "--bytecode",
+        action="store_true",
+        help="scan .pyc files, zip applications and wheels instead of sources",
+        default=False,
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="also show patches that can not be shown to log the same message",
+        default=False,
+    )
+    parser.add_argument(
+        "--loops",
+        action="store_true",
+        help="also report info and higher logging calls made inside loops",
+        default=False,
+    )
+    parser.add_argument(
+        "--helpers",
+        action="store_true",
+        help="also report logging calls whose message is built by a helper "
+        "function that returns a formatted string",
+        default=False,
+    )
+    parser.add_argument(
+        "--helper-cache",
+        metavar="FILE",
+        help="where --helpers caches its index (default: "
+        f"DIRECTORY/{helpers.CACHE_DIR}/{helpers.CACHE_FILE}); '' disables the cache",
+        default=None,
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="only report findings that are not in FILE, which is created by the "
+        "first run and shrinks as findings are fixed; exit with status 1 if "
+        "there are new findings",
+        default=None,
+    )
+    loops.add_arguments(parser)
+    hoist.add_arguments(parser)
+    defer.add_arguments(parser)
+    discovery.add_arguments(parser)
+    instrument.add_arguments(parser)
     args = parser.parse_args()
     if args.directory is None:
         parser.print_help()
+    elif args.bytecode:
+        bytecode.run(args.directory)
     else:
-        run(args.directory)
+        finder = discovery.from_args(args.directory, args)
+        instrument.start(args)
+        helper_cache = None
+        if args.helpers:
+            helper_cache = args.helper_cache
+            if helper_cache is None:
+                helper_cache = helpers.default_cache(args.directory)
+        results = run(
+            args.directory,
+            args.max_file_size,
+            args.memory,
+            finder,
+            verify=not args.no_verify,
+            throttle=args.throttle,
+            loop_report=args.loops,
+            helper_cache=helper_cache,
+            baseline=args.baseline,
+            hoist=args.hoist,
+            defer=args.defer,
+        )
+        instrument.finish(args, finder)
+        if args.baseline is not None and results["lines_patched"] > 0:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,238 @@
+"""
+Find logging calls at enabled levels inside loops.
+
+Lazy formatting only helps when a record is discarded.  A ``log.info`` in a
+loop over every row of a table is usually enabled, and then the cost is in
+creating and handling one record per iteration.  This module reports those
+calls, with the loop they are in, and can rewrite them to go through one of
+the wrappers in ``logfix.throttle``::
+
+    for row in rows:
+        throttle.limited(log).info("processing %s", row)
+
+Debug and trace calls are not reported; they are normally disabled, which is
+what making the formatting lazy is for.
+"""
+
+import ast
+
+from logfix import Patch, iter_lines
+from logfix.apis import bind, dotted_name, log_api
+
+# Logging methods that are usually disabled in production.
+DISABLED = frozenset(["trace", "debug"])
+
+LOOPS = (ast.For, ast.AsyncFor, ast.While)
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+# The wrapper used for each --throttle mode.
+WRAPPERS = {
+    "rate": "limited",
+    "sample": "sampled",
+}
+
+
+class LoopLog:
+    """
+    A logging call inside a loop.
+
+    :param node: the ``ast.Call`` node for the logging call.
+    :param statement: the call is a statement on its own and can be rewritten.
+    :param loop: the innermost loop the call is in.
+    :param depth: the number of loops the call is in.
+    """
+
+    __slots__ = ("node", "statement", "loop", "depth")
+
+    def __init__(self, node: ast.Call, statement: bool, loop: ast.AST, depth: int):
+        self.node = node
+        self.statement = statement
+        self.loop = loop
+        self.depth = depth
+
+    @property
+    def line(self) -> int:
+        return self.node.lineno
+
+    @property
+    def method(self) -> str:
+        return self.node.func.attr
+
+    @property
+    def loop_kind(self) -> str:
+        if isinstance(self.loop, COMPREHENSIONS):
+            return "comprehension"
+        if isinstance(self.loop, ast.While):
+            return "while"
+        return "for"
+
+
+def find_loop_logs(tree: ast.AST) -> list:
+    """
+    Finds the logging calls at enabled levels that are made on every
+    iteration of a loop.  Loops do not extend into functions or classes
+    defined in their body.
+
+    :return: a list of ``LoopLog`` sorted by line number.
+    """
+    bindings = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ImportFrom, ast.Assign)):
+            bind(node, bindings)
+    found = []
+    visit(tree, [], bindings, found, False)
+    found.sort(key=lambda f: (f.line, f.node.col_offset))
+    return found
+
+
+def visit(node: ast.AST, loops: list, bindings: dict, found: list, statement: bool) -> None:
+    if loops and isinstance(node, ast.Call):
+        api = log_api(node, bindings)
+        if api is not None and node.func.attr not in DISABLED:
+            found.append(LoopLog(node, statement, loops[-1], len(loops)))
+    if isinstance(node, SCOPES):
+        loops = []
+    if isinstance(node, LOOPS):
+        body = set(map(id, node.body))
+        for child in ast.iter_child_nodes(node):
+            inner = loops + [node] if id(child) in body else loops
+            visit(child, inner, bindings, found, False)
+        return
+    if isinstance(node, COMPREHENSIONS):
+        loops = loops + [node]
+    for child in ast.iter_child_nodes(node):
+        visit(child, loops, bindings, found, isinstance(node, ast.Expr))
+
+
+def print_loop_logs(filepath: str, found: list) -> None:
+    if len(found) == 0:
+        return
+    print(filepath)
+    for f in found:
+        print(
+            f"{f.line:04d}: {f.method}() in {f.loop_kind} loop at line "
+            f"{f.loop.lineno} (depth {f.depth}): {ast.unparse(f.node)}"
+        )
+    print()
+
+
+def logfix_name(tree: ast.AST, module: str) -> tuple:
+    """
+    Returns the name the ``logfix.<module>`` module is, or will be, imported
+    as and whether an import needs to be added.
+    """
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "logfix":
+            for alias in node.names:
+                if alias.name == module:
+                    return alias.asname or alias.name, False
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            used.add(node.name)
+        elif isinstance(node, ast.alias):
+            used.add(node.asname or node.name.split(".")[0])
+    if module in used:
+        return f"logfix_{module}", True
+    return module, True
+
+
+def import_line(tree: ast.Module) -> int:
+    """
+    The line where an import can be added: before the first statement that
+    is not the module docstring or a ``__future__`` import.
+    """
+    for i, stmt in enumerate(tree.body):
+        if i == 0 and isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant):
+            continue
+        if isinstance(stmt, ast.ImportFrom) and stmt.module == "__future__":
+            continue
+        decorators = getattr(stmt, "decorator_list", [])
+        return min([stmt.lineno] + [d.lineno for d in decorators])
+    return None
+
+
+def throttle_patches(source: str, patches: dict, path: str, mode: str) -> dict:
+    """
+    Adds patches that route the logging calls found by ``find_loop_logs``
+    through a ``logfix.throttle`` wrapper, combined with any existing patch
+    for the same statement, and a patch that imports the module.
+
+    :param source: the original source code.
+    :param patches: the patches already found for ``source``, keyed by line.
+    :param path: the name of the source file.  Used in messages only.
+    :param mode: a key of ``WRAPPERS``.
+    :return: ``patches`` with the new patches added.
+    """
+    tree = ast.parse(source, path)
+    found = find_loop_logs(tree)
+    if len(found) == 0:
+        return patches
+    lines = list(iter_lines(source))
+    name, needs_import = logfix_name(tree, "throttle")
+    wrapper = WRAPPERS[mode]
+    changed = 0
+    for f in found:
+        node = f.node
+        if not f.statement:
+            continue
+        if lines[node.lineno - 1][:node.col_offset].strip() != "":
+            # Shares a line with other code, e.g. ``for x in y: log.info(x)``
+            print(f"Skipping {path} {node.lineno} not on a line of its own")
+            continue
+        patch = patches.get(node.lineno)
+        if patch is not None:
+            call = ast.parse(patch.statement.strip(), mode="eval").body
+        else:
+            call = ast.parse(ast.unparse(node), mode="eval").body
+        if dotted_name(call.func.value) is None:
+            # e.g. ``log.bind(row=row).info(...)`` makes a new logger, and a
+            # new wrapper, every time.
+            print(f"Skipping {path} {node.lineno} the logger is not a plain name")
+            continue
+        message = call.args[0] if len(call.args) > 0 else None
+        if not isinstance(message, ast.Constant) or not isinstance(message.value, str):
+            # Calls are throttled per message, so each message would be new.
+            print(f"Skipping {path} {node.lineno} the message is not a string literal")
+            continue
+        call.func.value = ast.Call(
+            func=ast.Attribute(value=ast.Name(id=name, ctx=ast.Load()), attr=wrapper, ctx=ast.Load()),
+            args=[call.func.value],
+            keywords=[],
+        )
+        patches[node.lineno] = Patch(node.lineno, node.end_lineno, node.col_offset, ast.unparse(call))
+        changed += 1
+    if changed > 0 and needs_import:
+        add_logfix_import(patches, tree, lines, "throttle", name)
+    return patches
+
+
+def add_logfix_import(patches: dict, tree: ast.Module, lines: list, module: str, name: str) -> None:
+    """
+    Adds a patch that imports ``logfix.<module>`` as ``name`` at
+    ``import_line``, combined with any existing patch for that line.
+    """
+    statement = f"from logfix import {module}"
+    if name != module:
+        statement += f" as {name}"
+    line = import_line(tree)
+    patch = patches.get(line)
+    if patch is None:
+        patches[line] = Patch(line, line, 0, statement + "\n" + lines[line - 1])
+    elif patch.statement is None:
+        patches[line] = Patch(line, patch.end_line, 0, statement)
+    else:
+        patches[line] = Patch(line, patch.end_line, 0, statement + "\n" + patch.render())
+
+
+def add_arguments(parser) -> None:
+    """Add the command line option that rewrites logging calls in loops."""
+    parser.add_argument(
+        "--throttle",
+        choices=sorted(WRAPPERS),
+        help="also route info and higher logging calls in loops through a "
+        "rate limited or sampled logfix.throttle wrapper",
+        default=None,
+    )
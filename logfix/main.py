@@ -1,31 +1,163 @@
 import argparse
-import os
+import contextlib
+import sys
 
 from logfix import *
-from logfix import linter
+from logfix import defer, diff, discovery, hoist, instrument, isolate, linter, loops, pipeline
+from logfix import shard, transaction
+from logfix.memory import MemoryReport, parse_size
 
+COMMANDS = {
+    "merge": shard.main,
+    "rollback": transaction.main,
+}
 
-def run(directory: str):
-    files_checked = 0
-    lines_patched = 0
-    files_patched = 0
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".py"):
-                files_checked += 1
-                n = patch_file(f"{root}/{file}")
-                if n > 0:
-                    files_patched += 1
-                    lines_patched += n
 
-    print(f"Checked {files_checked} files.")
-    print(f"Files   {files_patched} files.")
-    print(f"Lines   {lines_patched} lines")
+def run(
+    directory: str,
+    max_size: int = None,
+    memory: bool = False,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    results = shard.new_results()
+    report = MemoryReport() if memory else None
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder if part is None else shard.select(finder, directory, part)
+    for filepath in files:
+        results["files_checked"] += 1
+        if report is not None:
+            report.start()
+        with PROFILER.file(filepath):
+            n = patch_file(filepath, max_size, verify, throttle, hoist, defer)
+        if report is not None:
+            report.stop(filepath)
+        if n > 0:
+            results["files_patched"] += 1
+            results["lines_patched"] += n
+
+    shard.print_totals(results)
+    finder.print_summary(file=sys.stderr)
+    if report is not None:
+        report.print()
+    return results
+
+
+def run_pipeline(
+    directory: str,
+    stages: pipeline.Pipeline,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+) -> dict:
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder if part is None else shard.select(finder, directory, part)
+    results = stages.run(files)
+    if not stages.lint:
+        shard.print_totals(results)
+    finder.print_summary(file=sys.stderr)
+    stages.print_utilization(file=sys.stderr)
+    return results
+
+
+def run_atomic(
+    directory: str,
+    txn: transaction.Transaction,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+) -> dict:
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder if part is None else shard.select(finder, directory, part)
+    try:
+        results = txn.run(files)
+    except transaction.TransactionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    shard.print_totals(results)
+    finder.print_summary(file=sys.stderr)
+    txn.print_summary(file=sys.stderr)
+    return results
+
+
+def run_isolated(
+    directory: str,
+    runner: isolate.Isolated,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+    errors: str = None,
+) -> dict:
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    files = finder if part is None else shard.select(finder, directory, part)
+    results = runner.run(files)
+    if not runner.lint:
+        shard.print_totals(results)
+    finder.print_summary(file=sys.stderr)
+    runner.print_summary()
+    if errors is not None:
+        runner.write_errors(errors)
+    return results
+
+
+def run_diff(
+    directory: str,
+    path: str,
+    max_size: int = None,
+    finder: discovery.Discovery = None,
+    part: tuple = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    if finder is None:
+        finder = discovery.Discovery(directory)
+    with diff.open_output(path) as out:
+        # Keep messages out of a diff written to stdout.
+        messages = sys.stderr if path == "-" else sys.stdout
+        with contextlib.redirect_stdout(messages):
+            results = diff.run(
+                directory, out, max_size, finder, part, verify, throttle, hoist, defer
+            )
+            shard.print_totals(results)
+            finder.print_summary(file=sys.stderr)
+    return results
+
+
+def check_modes(parser, args) -> None:
+    """Exits with an error if the options ask for more than one way to run."""
+    modes = []
+    if args.diff is not None:
+        modes.append("--diff")
+    elif args.check and not args.lint:
+        modes.append("--check")
+    if args.pipeline:
+        modes.append("--pipeline")
+    if args.atomic and not args.lint:
+        modes.append("--atomic")
+    if isolate.enabled(args):
+        modes.append("--isolate, --timeout or --memory-limit")
+    if len(modes) > 1:
+        parser.error(f"{modes[0]} can not be combined with {modes[1]}")
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
     parser = argparse.ArgumentParser(
         prog="logfix",
+        usage=(
+            "%(prog)s [options] [directory ...]\n"
+            "       %(prog)s merge FILE [FILE ...]\n"
+            "       %(prog)s rollback directory"
+        ),
         description="Patch greedy string interpolation in Galaxy.",
         epilog="Copyright 2023 The Galayx Project (https://galaxyproject.org)",
     )
@@ -38,15 +170,131 @@ def main():
         help="only print the patches that would be applied",
         default=False,
     )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="also apply patches that can not be shown to log the same message",
+        default=False,
+    )
+    parser.add_argument(
+        "--diff",
+        metavar="FILE",
+        help="write the patches as a unified diff to FILE (- for stdout) "
+        "instead of modifying any files",
+        default=None,
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="do not modify any files; exit with status 1 if any would be patched",
+        default=False,
+    )
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        help="stage every patched file and then replace them all at once; "
+        "undo with 'logfix rollback'",
+        default=False,
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=parse_size,
+        metavar="SIZE",
+        help="scan files larger than SIZE (e.g. 512K, 4M) one statement at a time",
+        default=None,
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="report the peak memory used for each file",
+        default=False,
+    )
+    parser.add_argument(
+        "--shard",
+        type=shard.parse_shard,
+        metavar="i/N",
+        help="only process the i-th of N deterministic subsets of the files",
+        default=None,
+    )
+    parser.add_argument(
+        "--partial",
+        metavar="FILE",
+        help="where to write the results of a --shard run for 'logfix merge'",
+        default=None,
+    )
+    loops.add_arguments(parser)
+    hoist.add_arguments(parser)
+    defer.add_arguments(parser)
+    discovery.add_arguments(parser)
+    instrument.add_arguments(parser)
+    pipeline.add_arguments(parser)
+    isolate.add_arguments(parser)
     args = parser.parse_args()
+    check_modes(parser, args)
     if len(args.directory) == 0:
         parser.print_help()
         return
     dir = args.directory[0]
-    if args.lint:
-        linter.run(dir)
+    finder = discovery.from_args(dir, args)
+    instrument.start(args)
+    verify = not args.no_verify
+    if args.diff is not None or (args.check and not args.lint):
+        results = run_diff(
+            dir,
+            args.diff,
+            args.max_file_size,
+            finder,
+            args.shard,
+            verify,
+            args.throttle,
+            args.hoist,
+            args.defer,
+        )
+    elif args.pipeline:
+        results = run_pipeline(dir, pipeline.from_args(args), finder, args.shard)
+    elif args.atomic and not args.lint:
+        txn = transaction.Transaction(
+            dir, args.workers, args.max_file_size, verify, args.throttle, args.hoist, args.defer
+        )
+        results = run_atomic(dir, txn, finder, args.shard)
+    elif isolate.enabled(args):
+        results = run_isolated(dir, isolate.from_args(args), finder, args.shard, args.errors)
+    elif args.lint:
+        results = linter.run(
+            dir,
+            args.max_file_size,
+            args.memory,
+            finder,
+            args.shard,
+            verify,
+            args.throttle,
+            hoist=args.hoist,
+            defer=args.defer,
+        )
+    else:
+        results = run(
+            dir,
+            args.max_file_size,
+            args.memory,
+            finder,
+            args.shard,
+            verify,
+            args.throttle,
+            args.hoist,
+            args.defer,
+        )
+    if args.diff == "-":
+        # Keep the profile out of a diff written to stdout.
+        with contextlib.redirect_stdout(sys.stderr):
+            instrument.finish(args, finder)
     else:
-        run(dir)
+        instrument.finish(args, finder)
+    if args.shard is not None:
+        index, count = args.shard
+        partial = args.partial or f"logfix-shard-{index}-of-{count}.json"
+        shard.write_partial(partial, args.shard, results)
+    if args.check and results["lines_patched"] > 0:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""
+Per file memory accounting used to size CI runners.
+"""
+
+import resource
+import sys
+import tracemalloc
+
+SIZE_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """
+    Converts a size such as ``512K`` or ``4M`` into a number of bytes.
+
+    :param value: a number of bytes with an optional K, M, or G suffix.
+    :return: the size in bytes.
+    """
+    value = value.strip().upper().rstrip("B")
+    multiplier = SIZE_SUFFIXES.get(value[-1:], 1)
+    if multiplier > 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def max_rss() -> int:
+    """Returns the peak resident set size of this process in bytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class MemoryReport:
+    """
+    Records the peak amount of memory allocated while each file is processed.
+    Python allocations are traced with ``tracemalloc`` so the numbers are not
+    affected by memory that has been freed but not returned to the operating
+    system.
+    """
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.peaks = []
+        tracemalloc.start()
+
+    def start(self) -> None:
+        tracemalloc.reset_peak()
+
+    def stop(self, path: str) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        self.peaks.append((peak, path))
+
+    def print(self) -> None:
+        tracemalloc.stop()
+        print(f"Peak RSS {max_rss() // 1024} KiB")
+        if len(self.peaks) == 0:
+            return
+        print(f"Largest per file peaks (of {len(self.peaks)} files)")
+        for peak, path in sorted(self.peaks, reverse=True)[:self.top]:
+            print(f"{peak // 1024:10d} KiB  {path}")
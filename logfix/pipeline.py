@@ -0,0 +1,283 @@
+"""
+Overlap file I/O with parsing and analysis.
+
+Files move through three stages connected by bounded queues:
+
+1. a thread pool reads each file,
+2. a process pool parses and analyzes the source, and
+3. a thread pool writes the patched files atomically.
+
+At most ``max_inflight`` files are between the first and last stage at any
+time, so memory use stays flat no matter how large the tree is; the walk of
+the tree simply blocks until a slot is free.
+
+With ``--profile-run`` the reads and writes are charged to the ``read`` and
+``write`` phases and the profile of each worker is merged into the main one.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from logfix import analyze_source, iter_lines
+from logfix import linter, shard
+from logfix.instrument import PROFILER, profiled, start_worker
+from logfix.stream import get_large_file_patches, replace_file, write_large_file
+
+
+def analyze(
+    path: str, source: str, verify: bool, throttle: str, hoist: bool, defer: bool
+) -> tuple:
+    """
+    Runs in a worker process.  ``source`` is None for files that are too large
+    to be read in one piece, in which case the file is scanned from disk.
+
+    :return: a tuple of the patches and the time spent finding them.
+    """
+    start = time.perf_counter()
+    if source is None:
+        patches = get_large_file_patches(path, verify)
+    else:
+        patches = analyze_source(source, path, verify, throttle, hoist, defer)
+    return patches, time.perf_counter() - start
+
+
+class Stage:
+    """Tracks how busy the workers of one stage are."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def charge(self, seconds: float) -> None:
+        with self.lock:
+            self.busy += seconds
+
+    def utilization(self, wall: float) -> float:
+        if wall <= 0:
+            return 0.0
+        return self.busy / (wall * self.workers)
+
+
+class Pipeline:
+    """
+    Patches, or lints, a stream of files using separate pools for reading,
+    analysis and writing.
+    """
+
+    def __init__(
+        self,
+        readers: int = 4,
+        workers: int = None,
+        writers: int = 4,
+        max_inflight: int = None,
+        max_size: int = None,
+        lint: bool = False,
+        verify: bool = True,
+        throttle: str = None,
+        hoist: bool = False,
+        defer: bool = False,
+    ):
+        workers = workers or os.cpu_count() or 1
+        self.read_stage = Stage("read", readers)
+        self.analyze_stage = Stage("analyze", workers)
+        self.write_stage = Stage("write", writers)
+        self.max_inflight = max_inflight or 4 * workers
+        self.max_size = max_size
+        self.lint = lint
+        self.verify = verify
+        self.throttle = throttle
+        self.hoist = hoist
+        self.defer = defer
+        self.results = shard.new_results()
+        self.errors = []
+        self.wall = 0.0
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.lock = threading.Condition()
+        self.pending = 0
+
+    def read(self, path: str) -> str:
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            if self.max_size is not None and os.path.getsize(path) > self.max_size:
+                return None
+            with open(path) as f:
+                return f.read()
+        finally:
+            self.charge(self.read_stage, start, cpu)
+
+    def write(self, path: str, patches: dict, source: str) -> None:
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            if source is None:
+                write_large_file(path, patches)
+            else:
+                replace_file(path, patches, iter_lines(source))
+        finally:
+            self.charge(self.write_stage, start, cpu)
+
+    def charge(self, stage: Stage, start: float, cpu: float) -> None:
+        """Charges the time since ``start`` to ``stage`` and its phase."""
+        wall = time.perf_counter() - start
+        stage.charge(wall)
+        if PROFILER.enabled:
+            with self.lock:
+                PROFILER.charge(stage.name, wall, time.thread_time() - cpu, 1)
+
+    def run(self, paths) -> dict:
+        """
+        Pushes every path through the pipeline and waits for the last file to
+        be written.
+
+        :param paths: an iterable of paths, usually a ``Discovery``.
+        :return: the totals in the same form as ``main.run``.
+        """
+        start = time.perf_counter()
+        workers = ProcessPoolExecutor(
+            self.analyze_stage.workers, initializer=start_worker, initargs=(PROFILER.enabled,)
+        )
+        with ThreadPoolExecutor(self.read_stage.workers) as readers, workers, \
+                ThreadPoolExecutor(self.write_stage.workers) as writers:
+            self.pools = (readers, workers, writers)
+            for path in paths:
+                # Blocks when max_inflight files are already in the pipeline.
+                self.slots.acquire()
+                with self.lock:
+                    self.pending += 1
+                    self.results["files_checked"] += 1
+                future = readers.submit(self.read, path)
+                future.add_done_callback(lambda f, path=path: self.after_read(path, f))
+            with self.lock:
+                self.lock.wait_for(lambda: self.pending == 0)
+        self.wall = time.perf_counter() - start
+        return self.results
+
+    def after_read(self, path: str, future) -> None:
+        try:
+            source = future.result()
+            analysis = self.pools[1].submit(
+                profiled, analyze, path, source, self.verify, self.throttle, self.hoist, self.defer
+            )
+        except Exception as e:
+            self.fail(path, "read", e)
+            return
+        analysis.add_done_callback(lambda f: self.after_analyze(path, source, f))
+
+    def after_analyze(self, path: str, source: str, future) -> None:
+        try:
+            (patches, elapsed), profile = future.result()
+        except Exception as e:
+            self.fail(path, "analyze", e)
+            return
+        self.analyze_stage.charge(elapsed)
+        with self.lock:
+            PROFILER.merge(profile)
+        if len(patches) == 0:
+            self.finish()
+            return
+        with self.lock:
+            self.results["files_patched"] += 1
+            self.results["lines_patched"] += len(patches)
+        if self.lint:
+            with self.lock:
+                if source is None:
+                    linter.print_large_file_patches(path, patches)
+                else:
+                    linter.print_patches(path, patches, source)
+            self.finish()
+            return
+        try:
+            write = self.pools[2].submit(self.write, path, patches, source)
+        except Exception as e:
+            self.fail(path, "write", e)
+            return
+        write.add_done_callback(lambda f: self.after_write(path, f))
+
+    def after_write(self, path: str, future) -> None:
+        try:
+            future.result()
+        except Exception as e:
+            self.fail(path, "write", e)
+            return
+        self.finish()
+
+    def fail(self, path: str, stage: str, e: Exception) -> None:
+        print(f"Error {stage} {path}: {e}", file=sys.stderr)
+        with self.lock:
+            self.errors.append((path, stage, str(e)))
+        self.finish()
+
+    def finish(self) -> None:
+        self.slots.release()
+        with self.lock:
+            self.pending -= 1
+            self.lock.notify_all()
+
+    def print_utilization(self, file=None) -> None:
+        for stage in (self.read_stage, self.analyze_stage, self.write_stage):
+            print(
+                f"Stage   {stage.name:8s} {stage.workers:3d} workers "
+                f"{100 * stage.utilization(self.wall):5.1f}% busy",
+                file=file,
+            )
+
+
+def add_arguments(parser) -> None:
+    """Add the command line options that control the pipeline."""
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap reading and writing files with parsing in worker processes",
+        default=False,
+    )
+    parser.add_argument(
+        "--readers",
+        type=int,
+        metavar="N",
+        help="threads used to read files with --pipeline (default 4)",
+        default=4,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="processes used to parse files with --pipeline, --atomic or --isolate "
+        "(default: CPU count)",
+        default=None,
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        metavar="N",
+        help="threads used to write files with --pipeline (default 4)",
+        default=4,
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        metavar="N",
+        help="most files held in memory at once with --pipeline (default 4 per worker)",
+        default=None,
+    )
+
+
+def from_args(args) -> Pipeline:
+    """Create a Pipeline from the parsed command line options."""
+    return Pipeline(
+        readers=args.readers,
+        workers=args.workers,
+        writers=args.writers,
+        max_inflight=args.max_inflight,
+        max_size=args.max_file_size,
+        lint=args.lint,
+        verify=not args.no_verify,
+        throttle=args.throttle,
+        hoist=args.hoist,
+        defer=args.defer,
+    )
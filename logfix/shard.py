@@ -0,0 +1,110 @@
+"""
+Split a scan across several CI jobs and merge the partial results.
+
+Files are assigned to shards by hashing their path relative to the scan root,
+so the assignment of a file never changes when other files are added or
+removed.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+
+def parse_shard(value: str) -> tuple:
+    """
+    Parses a shard specification of the form ``i/N`` where ``1 <= i <= N``.
+
+    :param value: the shard specification from the command line.
+    :return: a tuple ``(i, N)``
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {value}, expected i/N")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value}, expected 1 <= i <= N")
+    return index, count
+
+
+def shard_of(relpath: str, count: int) -> int:
+    """
+    Returns the shard, numbered from 1, that the file ``relpath`` belongs to.
+    """
+    digest = hashlib.sha1(relpath.replace(os.sep, "/").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def select(paths, directory: str, shard: tuple):
+    """
+    Yields the paths that belong to ``shard``.
+
+    :param paths: an iterable of paths, usually a ``Discovery``.
+    :param directory: the scan root that paths are made relative to.
+    :param shard: a tuple ``(i, N)`` as returned by ``parse_shard``.
+    """
+    index, count = shard
+    for path in paths:
+        if shard_of(os.path.relpath(path, directory), count) == index:
+            yield path
+
+
+def new_results() -> dict:
+    return {"files_checked": 0, "files_patched": 0, "lines_patched": 0}
+
+
+def print_totals(results: dict) -> None:
+    print(f"Checked {results['files_checked']} files.")
+    print(f"Files   {results['files_patched']} files.")
+    print(f"Lines   {results['lines_patched']} lines")
+
+
+def write_partial(path: str, shard: tuple, results: dict) -> None:
+    """Writes the results of one shard to a JSON file."""
+    partial = dict(results)
+    partial["shard"] = list(shard)
+    with open(path, "w") as f:
+        json.dump(partial, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def merge(paths: list) -> dict:
+    """
+    Combines the partial results written by each shard.  A warning is
+    printed if a shard is missing or appears more than once.
+
+    :param paths: the partial result files.
+    :return: the combined results.
+    """
+    results = new_results()
+    seen = set()
+    count = None
+    for path in paths:
+        with open(path) as f:
+            partial = json.load(f)
+        index, n = partial["shard"]
+        if count is not None and n != count:
+            print(f"Warning: {path} is shard {index}/{n}, expected N={count}", file=sys.stderr)
+        count = n
+        if index in seen:
+            print(f"Warning: shard {index}/{n} appears more than once", file=sys.stderr)
+        seen.add(index)
+        for key in results:
+            results[key] += partial[key]
+    if count is not None:
+        missing = sorted(set(range(1, count + 1)) - seen)
+        if missing:
+            print(f"Warning: missing shards {missing} of {count}", file=sys.stderr)
+    return results
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        prog="logfix merge",
+        description="Combine the partial results written with --shard.",
+    )
+    parser.add_argument("partials", help="the partial result files", nargs="+")
+    args = parser.parse_args(argv)
+    print_totals(merge(args.partials))
@@ -0,0 +1,194 @@
+"""
+Bounded memory scanning for very large (usually generated) source files.
+
+Rather than reading the entire file and parsing it into a single abstract
+syntax tree, the file is tokenized one physical line at a time and only the
+logical lines that look like they contain a logging call are parsed.  Memory
+use is therefore proportional to the longest logical line rather than the size
+of the file.
+"""
+
+import ast
+import os
+import shutil
+import tempfile
+import tokenize
+
+from logfix import (LOGGER_METHODS, LOGGER_NAMES, iter_lines, patches_from_tree,
+                    write_patched_lines)
+from logfix.instrument import PROFILER
+from logfix.verify import gate
+
+IGNORED_TOKENS = (
+    tokenize.NL,
+    tokenize.COMMENT,
+    tokenize.INDENT,
+    tokenize.DEDENT,
+    tokenize.ENCODING,
+    tokenize.ENDMARKER,
+)
+
+
+def candidate_statements(path: str):
+    """
+    Yields ``(line, indent, text)`` tuples for each logical line in the file
+    that may contain a call to the logging framework.  ``line`` is the number
+    of the first physical line and ``indent`` is the number of characters of
+    leading white space that were removed from ``text``.
+
+    :param path: the path to the source file to scan.
+    """
+    buffered = []  # physical lines read since the last logical line ended
+    base = 1  # the line number of buffered[0]
+
+    with tokenize.open(path) as f:
+        def readline():
+            line = f.readline()
+            buffered.append(line)
+            return line
+
+        start = None
+        previous = (None, None)
+        candidate = False
+        for token in tokenize.generate_tokens(readline):
+            if token.type == tokenize.NEWLINE:
+                end = token.end[0]
+                if candidate:
+                    lines = buffered[start - base:end - base + 1]
+                    first = lines[0]
+                    indent = len(first) - len(first.lstrip())
+                    lines[0] = first[indent:]
+                    yield start, indent, "".join(lines)
+                del buffered[:end - base + 1]
+                base = end + 1
+                start = None
+                previous = (None, None)
+                candidate = False
+                continue
+            if token.type in IGNORED_TOKENS:
+                continue
+            if start is None:
+                start = token.start[0]
+            if (
+                token.type == tokenize.NAME
+                and token.string in LOGGER_METHODS
+                and previous[1] is not None
+                and previous[1].string == "."
+                and previous[0].type == tokenize.NAME
+                and previous[0].string in LOGGER_NAMES
+            ):
+                candidate = True
+            previous = (previous[1], token)
+
+
+def parse_statement(text: str, path: str, line: int, indent: int) -> ast.AST:
+    """
+    Parses a single logical line and moves its nodes to the position the
+    statement has in the file.
+    """
+    with PROFILER.phase("parse"):
+        tree = ast.parse(text, path)
+    ast.increment_lineno(tree, line - 1)
+    for node in ast.walk(tree):
+        if getattr(node, "lineno", None) == line:
+            node.col_offset += indent
+        if getattr(node, "end_lineno", None) == line:
+            node.end_col_offset += indent
+    return tree
+
+
+def get_large_file_patches(path: str, verify: bool = False) -> dict:
+    """
+    Finds the patches for a file without holding the entire file, or its
+    syntax tree, in memory.
+
+    :param path: the path to the source file to scan.
+    :param verify: drop patches that fail ``logfix.verify``.
+    :return: a dictionary of Patch objects keyed by line number.
+    """
+    patches = {}
+    for line, indent, text in candidate_statements(path):
+        try:
+            tree = parse_statement(text, path, line, indent)
+        except SyntaxError:
+            # Usually an ``else:`` or ``except:`` clause that can not be
+            # parsed on its own.
+            print(f"Skipping {path} {line} unable to parse statement in isolation")
+            continue
+        # Only the lines of the statement are needed.
+        lines = dict(enumerate(iter_lines(" " * indent + text), start=line - 1))
+        originals = {} if verify else None
+        statement_patches = patches_from_tree(tree, path, lines, originals)
+        if verify and len(statement_patches) > 0:
+            statement_patches = gate(originals, statement_patches, path)
+        patches.update(statement_patches)
+    return patches
+
+
+def write_large_file(path: str, patches: dict) -> None:
+    """
+    Applies ``patches`` to the file at ``path`` one line at a time.
+
+    :param path:    the path to the file to be patched
+    :param patches: the patches to be applied
+    :return:        None
+    """
+    if len(patches) == 0:
+        return
+    with open(path) as src:
+        replace_file(path, patches, (line.rstrip("\r\n") for line in src))
+
+
+def replace_file(path: str, patches: dict, lines) -> None:
+    """
+    Atomically replaces the file at ``path`` with ``lines`` after applying
+    ``patches``.  The new content is written to a temporary file in the same
+    directory that is then renamed over the original, so readers never see a
+    partially written file.
+
+    :param path:    the path to the file to be replaced
+    :param patches: the patches to be applied
+    :param lines:   an iterable of the original lines without line endings
+    :return:        None
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".logfix-", suffix=".py")
+    try:
+        with os.fdopen(fd, "w") as dst:
+            write_patched_lines(dst, patches, lines)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def patch_large_file(path: str, verify: bool = True) -> int:
+    """
+    The bounded memory equivalent of ``logfix.patch_file``.
+
+    :param path: the path to the source file to be patched.
+    :param verify: only apply patches that pass ``logfix.verify``.
+    :return: the number of patches applied.
+    """
+    with PROFILER.phase("read"):
+        patches = get_large_file_patches(path, verify)
+    with PROFILER.phase("write"):
+        write_large_file(path, patches)
+    return len(patches)
+
+
+def read_lines(path: str, wanted) -> dict:
+    """
+    Reads only the physical lines whose numbers are in ``wanted``.
+
+    :param path: the path to the source file.
+    :param wanted: a collection of line numbers.
+    :return: a dictionary mapping line numbers to lines without line endings.
+    """
+    lines = {}
+    with open(path) as f:
+        for lineno, line in enumerate(f, start=1):
+            if lineno in wanted:
+                lines[lineno] = line.rstrip("\r\n")
+    return lines
@@ -0,0 +1,253 @@
+"""
+Runtime helpers that reduce the number of records logged from hot loops.
+
+Each helper wraps a logger, from any of the libraries in ``logfix.apis``, and
+exposes the same logging methods.  Calls are grouped by their message
+template, which is constant for a given call site once the formatting is
+lazy, so each call site is throttled independently.
+
+``limited(log)``
+    at most ``per_second`` records per template, with bursts of up to
+    ``burst`` records.
+``sampled(log)``
+    the first of every ``every`` records per template.
+``LoopSummary(log)``
+    nothing inside the loop; one record per template, with the number of
+    calls and the arguments of the last one, when the summary is flushed.
+
+``limited`` and ``sampled`` cache their wrappers so they can be called on
+every iteration::
+
+    from logfix import throttle
+
+    for row in rows:
+        throttle.limited(log).info("processing %s", row)
+
+At most ``MAX_WRAPPERS`` wrappers are cached and each wrapper tracks at most
+``MAX_TEMPLATES`` templates; the oldest are dropped first, which only resets
+their throttling.  Records are attributed to the line that called the
+wrapper, not to this module.
+"""
+
+import logging
+import threading
+import time
+
+METHODS = (
+    "trace", "debug", "info", "success", "msg", "warn", "warning",
+    "error", "err", "critical", "fatal", "exception",
+)
+
+# The shared wrappers, by kind, id of the logger and settings.
+WRAPPERS = {}
+WRAPPERS_LOCK = threading.Lock()
+MAX_WRAPPERS = 1000
+
+# The number of message templates a wrapper keeps state for.
+MAX_TEMPLATES = 1000
+
+# The frames between the logging call in ``Throttle.emit`` and its caller.
+DEPTH = 2
+
+
+def caller_logger(logger, kwargs: dict):
+    """
+    Returns the logger to call, and updates ``kwargs``, so that a record is
+    attributed to the caller of the wrapper.  Only ``logging`` and ``loguru``
+    loggers record where they were called from.
+    """
+    if isinstance(logger, (logging.Logger, logging.LoggerAdapter)):
+        kwargs["stacklevel"] = kwargs.pop("stacklevel", 1) + DEPTH
+    elif type(logger).__module__.startswith("loguru"):
+        logger = logger.opt(depth=DEPTH)
+    return logger
+
+
+def forget_oldest(table: dict) -> None:
+    """Drops the oldest entries of ``table`` once it is full."""
+    while len(table) >= MAX_TEMPLATES:
+        del table[next(iter(table))]
+
+
+class Throttle:
+    """
+    Base class for the wrappers.  Subclasses decide which calls are passed on
+    to the logger by implementing ``allow``.
+    """
+
+    __slots__ = ("logger", "suppressed", "lock")
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def allow(self, key) -> bool:
+        raise NotImplementedError()
+
+    def emit(self, method: str, msg, args, kwargs):
+        with self.lock:
+            allowed = self.allow(msg)
+            if not allowed:
+                self.suppressed += 1
+        if allowed:
+            logger = caller_logger(self.logger, kwargs)
+            return getattr(logger, method)(msg, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # Anything that is not a logging method goes to the logger itself.
+        if name in Throttle.__slots__:
+            raise AttributeError(name)
+        return getattr(self.logger, name)
+
+
+def make_method(name: str):
+    def method(self, msg, *args, **kwargs):
+        return self.emit(name, msg, args, kwargs)
+
+    method.__name__ = name
+    return method
+
+
+for name in METHODS:
+    setattr(Throttle, name, make_method(name))
+
+
+class RateLimited(Throttle):
+    """
+    Passes on at most ``per_second`` records per message template using a
+    token bucket that holds up to ``burst`` tokens.
+    """
+
+    __slots__ = ("per_second", "burst", "buckets")
+
+    def __init__(self, logger, per_second: float = 1.0, burst: int = 1):
+        super().__init__(logger)
+        self.per_second = per_second
+        self.burst = burst
+        self.buckets = {}
+
+    def allow(self, key) -> bool:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            forget_oldest(self.buckets)
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+
+class Sampled(Throttle):
+    """Passes on the first of every ``every`` records per message template."""
+
+    __slots__ = ("every", "counts")
+
+    def __init__(self, logger, every: int = 100):
+        super().__init__(logger)
+        self.every = every
+        self.counts = {}
+
+    def allow(self, key) -> bool:
+        n = self.counts.get(key)
+        if n is None:
+            forget_oldest(self.counts)
+            n = 0
+        self.counts[key] = n + 1
+        return n % self.every == 0
+
+
+def shared(key: tuple, logger, cls, *args) -> Throttle:
+    """
+    Returns the cached wrapper for ``key``, creating it if there is none.
+    An id can be reused once its logger is gone, so the cached wrapper must
+    wrap ``logger`` itself.
+    """
+    wrapper = WRAPPERS.get(key)
+    if wrapper is None or wrapper.logger is not logger:
+        with WRAPPERS_LOCK:
+            wrapper = WRAPPERS.get(key)
+            if wrapper is None or wrapper.logger is not logger:
+                WRAPPERS.pop(key, None)
+                while len(WRAPPERS) >= MAX_WRAPPERS:
+                    del WRAPPERS[next(iter(WRAPPERS))]
+                wrapper = WRAPPERS[key] = cls(logger, *args)
+    return wrapper
+
+
+def limited(logger, per_second: float = 1.0, burst: int = 1) -> RateLimited:
+    """Returns the shared ``RateLimited`` wrapper for ``logger``."""
+    return shared(("limited", id(logger), per_second, burst), logger, RateLimited, per_second, burst)
+
+
+def sampled(logger, every: int = 100) -> Sampled:
+    """Returns the shared ``Sampled`` wrapper for ``logger``."""
+    return shared(("sampled", id(logger), every), logger, Sampled, every)
+
+
+class LoopSummary:
+    """
+    Collects the records logged in a loop and logs one record per message
+    template when ``flush`` is called, or when the ``with`` block ends.  The
+    summary record uses the arguments of the last call and the number of
+    calls is added in the formatting style of the logger (see
+    ``logfix.apis``)::
+
+        with throttle.LoopSummary(log) as summary:
+            for row in rows:
+                summary.info("processing %s", row)
+    """
+
+    __slots__ = ("logger", "style", "calls")
+
+    def __init__(self, logger, style: str = "percent"):
+        self.logger = logger
+        self.style = style
+        self.calls = {}
+
+    def emit(self, method: str, msg, args, kwargs):
+        call = self.calls.get((method, msg))
+        if call is None:
+            self.calls[(method, msg)] = [1, args, kwargs]
+        else:
+            call[0] += 1
+            call[1] = args
+            call[2] = kwargs
+
+    def flush(self) -> None:
+        calls, self.calls = self.calls, {}
+        for (method, msg), (count, args, kwargs) in calls.items():
+            if self.style == "kv":
+                kwargs = dict(kwargs, count=count)
+            elif self.style == "brace":
+                if len(args) == 0 and len(kwargs) == 0:
+                    msg = msg.replace("{", "{{").replace("}", "}}")
+                msg = f"{msg} ({{}} times)"
+                args = args + (count,)
+            else:
+                if len(args) == 0:
+                    # logging only applies % when there are arguments.
+                    msg = msg.replace("%", "%%")
+                msg = f"{msg} (%d times)"
+                args = args + (count,)
+            getattr(self.logger, method)(msg, *args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def __getattr__(self, name):
+        if name in LoopSummary.__slots__:
+            raise AttributeError(name)
+        return getattr(self.logger, name)
+
+
+for name in METHODS:
+    setattr(LoopSummary, name, make_method(name))
@@ -0,0 +1,322 @@
+"""
+Replace tracebacks formatted into log messages with ``exc_info``.
+
+::
+
+    log.error(f"failed: {traceback.format_exc()}")
+
+formats the whole traceback before ``logging`` has decided whether the record
+will be emitted.  Passing ``exc_info`` leaves the formatting to the handler,
+so it only happens for records that are written::
+
+    log.error("failed", exc_info=True)
+
+Inside an ``except`` block an error becomes ``log.exception("failed")``.
+``traceback.format_exception(e)`` becomes ``exc_info=e`` unless ``e`` is the
+exception being handled.  The traceback must be the last thing in the
+message; any ``:`` and white space before it are dropped.  When the last use
+of the ``traceback`` module is removed so is the import.
+
+Only standard library loggers are rewritten.
+"""
+
+import ast
+
+from logfix import Patch, REWRITERS, interpolation_kind, own_lines
+from logfix.apis import STDLIB, bind, log_api
+from logfix.verify import verify_call
+
+TB_FUNCTIONS = frozenset(["format_exc", "format_exception", "print_exc"])
+
+# Nodes that start a new scope; an except block does not extend into them.
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+
+def traceback_names(tree: ast.AST) -> tuple:
+    """
+    Finds the names the ``traceback`` module, and the functions in
+    ``TB_FUNCTIONS``, are imported as.
+
+    :return: a tuple of the set of module names and a dictionary mapping
+             local function names to the name in ``traceback``.
+    """
+    modules = set()
+    functions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == "traceback":
+                    modules.add(alias.asname or alias.name)
+        elif isinstance(node, ast.ImportFrom) and node.module == "traceback":
+            for alias in node.names:
+                if alias.name in TB_FUNCTIONS:
+                    functions[alias.asname or alias.name] = alias.name
+    return modules, functions
+
+
+def tb_function(node: ast.AST, modules: set, functions: dict) -> str:
+    """Returns the ``traceback`` function called by ``node``, if any."""
+    if not isinstance(node, ast.Call):
+        return None
+    func = node.func
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+        if func.value.id in modules and func.attr in TB_FUNCTIONS:
+            return func.attr
+    elif isinstance(func, ast.Name):
+        return functions.get(func.id)
+    return None
+
+
+def exc_info_value(node: ast.Call, function: str, handler: str) -> ast.AST:
+    """
+    The value to pass as ``exc_info`` in place of the traceback call
+    ``node``, or None if the call can not be replaced.
+
+    :param handler: the name bound by the enclosing ``except`` clause.
+    """
+    if len(node.keywords) > 0:
+        return None
+    if function in ("format_exc", "print_exc"):
+        # A limit on the number of frames can not be passed to logging.
+        return ast.Constant(True) if len(node.args) == 0 else None
+    args = node.args
+    if len(args) == 1 and isinstance(args[0], ast.Starred):
+        # format_exception(*sys.exc_info())
+        return ast.Constant(True)
+    if len(args) == 1:
+        value = args[0]
+    elif len(args) == 3:
+        value = args[1]
+    else:
+        return None
+    if isinstance(value, ast.Name) and value.id == handler:
+        return ast.Constant(True)
+    return value
+
+
+def trim(text: str) -> str:
+    """Drops the separator that came before the traceback."""
+    return text.rstrip().rstrip(":").rstrip()
+
+
+def split_message(args: list, modules: set, functions: dict) -> tuple:
+    """
+    Separates the traceback from the message arguments of a logging call.
+
+    :return: a tuple of the message arguments without the traceback and the
+             traceback call, or None if the traceback is not the last part of
+             the message.
+    """
+    is_tb = lambda node: tb_function(node, modules, functions) is not None
+    if len(args) > 1:
+        # Already lazy: log.error("failed: %s", traceback.format_exc())
+        template = args[0]
+        if not is_tb(args[-1]) or not isinstance(template, ast.Constant):
+            return None
+        if not isinstance(template.value, str) or not template.value.rstrip().endswith("%s"):
+            return None
+        text = trim(template.value.rstrip()[:-2])
+        if len(args) == 2:
+            text = text.replace("%%", "%")
+        return [ast.Constant(text)] + args[1:-1], args[-1]
+    if len(args) != 1:
+        return None
+    arg = args[0]
+    if is_tb(arg):
+        return [ast.Constant("")], arg
+    if isinstance(arg, ast.JoinedStr):
+        values = list(arg.values)
+        if values and isinstance(values[-1], ast.Constant) and values[-1].value.strip() == "":
+            values.pop()
+        if not values or not isinstance(values[-1], ast.FormattedValue):
+            return None
+        last = values.pop()
+        if not is_tb(last.value) or last.conversion != -1 or last.format_spec is not None:
+            return None
+        if values and isinstance(values[-1], ast.Constant):
+            values[-1] = ast.Constant(trim(values[-1].value))
+        if not any(isinstance(v, ast.FormattedValue) for v in values):
+            return [ast.Constant("".join(v.value for v in values))], last.value
+        return [ast.JoinedStr(values)], last.value
+    if isinstance(arg, ast.BinOp) and isinstance(arg.left, ast.Constant) and isinstance(arg.left.value, str):
+        text = arg.left.value.rstrip()
+        if isinstance(arg.op, ast.Add) and is_tb(arg.right):
+            return [ast.Constant(trim(text))], arg.right
+        if not isinstance(arg.op, ast.Mod) or not text.endswith("%s"):
+            return None
+        values = arg.right.elts if isinstance(arg.right, ast.Tuple) else [arg.right]
+        if not is_tb(values[-1]):
+            return None
+        text = trim(text[:-2])
+        if len(values) == 1:
+            return [ast.Constant(text.replace("%%", "%"))], values[-1]
+        return [ast.BinOp(ast.Constant(text), ast.Mod(), ast.Tuple(values[:-1], ast.Load()))], values[-1]
+    if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Attribute) and arg.func.attr == "format":
+        template = arg.func.value
+        if not isinstance(template, ast.Constant) or not isinstance(template.value, str):
+            return None
+        text = template.value.rstrip()
+        if len(arg.keywords) > 0 or not arg.args or not is_tb(arg.args[-1]) or not text.endswith("{}"):
+            return None
+        text = trim(text[:-2])
+        if len(arg.args) == 1:
+            return [ast.Constant(text.replace("{{", "{").replace("}}", "}"))], arg.args[-1]
+        method = ast.Attribute(ast.Constant(text), "format", ast.Load())
+        return [ast.Call(method, arg.args[:-1], [])], arg.args[-1]
+    return None
+
+
+def rewrite_call(node: ast.Call, handler, modules: set, functions: dict) -> ast.Call:
+    """
+    Builds the replacement for the logging call ``node``, or returns None if
+    it can not be rewritten.
+
+    :param handler: the enclosing ``ast.ExceptHandler`` or None.
+    """
+    if any(k.arg in ("exc_info", None) for k in node.keywords):
+        return None
+    split = split_message(node.args, modules, functions)
+    if split is None:
+        return None
+    args, tb_call = split
+    value = exc_info_value(tb_call, tb_function(tb_call, modules, functions), handler and handler.name)
+    if value is None:
+        return None
+    method = node.func.attr
+    keywords = list(node.keywords)
+    in_handler = handler is not None and isinstance(value, ast.Constant)
+    if in_handler and method == "error":
+        method = "exception"
+    elif not (in_handler and method == "exception"):
+        keywords.append(ast.keyword("exc_info", value))
+    func = ast.Attribute(node.func.value, method, ast.Load())
+    call = ast.Call(func, args, keywords)
+    for n in ast.walk(call):
+        if isinstance(n, ast.Name) and (n.id in modules or n.id in functions):
+            # There is more than one traceback in the message.
+            return None
+    kind = interpolation_kind(args[0]) if len(args) == 1 else None
+    if kind is None:
+        return call
+    # Make the rest of the message lazy too, if that can be shown not to
+    # change it.
+    lazy = ast.Call(func, list(args), keywords)
+    if REWRITERS["percent"](lazy, args[0], kind) and verify_call(call, lazy, "percent") is None:
+        return lazy
+    return call
+
+
+def find_rewrites(tree: ast.AST, modules: set, functions: dict) -> list:
+    """
+    Finds the logging statements with a traceback in their message.
+
+    :return: a list of ``(statement, replacement call, traceback call)``.
+    """
+    bindings = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ImportFrom, ast.Assign)):
+            bind(node, bindings)
+    found = []
+
+    def visit(node, handler):
+        if isinstance(node, SCOPES):
+            handler = None
+        if isinstance(node, ast.Expr) and log_api(node.value, bindings) is STDLIB:
+            call = rewrite_call(node.value, handler, modules, functions)
+            if call is not None:
+                found.append((node, call))
+        for child in ast.iter_child_nodes(node):
+            visit(child, node if isinstance(node, ast.ExceptHandler) else handler)
+
+    visit(tree, None)
+    return found
+
+
+def dead_imports(tree: ast.AST, removed: list) -> list:
+    """
+    Finds the imports of ``traceback``, or functions from it, that are no
+    longer used once the nodes in ``removed`` are gone.
+
+    :return: a list of ``(statement, aliases still used)``.
+    """
+    skip = set()
+    was_used = set()
+    for node in removed:
+        for n in ast.walk(node):
+            skip.add(id(n))
+            if isinstance(n, ast.Name):
+                was_used.add(n.id)
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and id(node) not in skip:
+            used.add(node.id)
+    result = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [a for a in node.names if a.name == "traceback"]
+        elif isinstance(node, ast.ImportFrom) and node.module == "traceback":
+            names = node.names
+        else:
+            continue
+        # Imports that were already unused are left alone.
+        dead = [a for a in names if (a.asname or a.name) in was_used - used]
+        if dead:
+            result.append((node, [a for a in node.names if a not in dead]))
+    return result
+
+
+def parents(tree: ast.AST) -> dict:
+    """Maps the id of each statement to the list of statements it is in."""
+    result = {}
+    for node in ast.walk(tree):
+        for field in ("body", "orelse", "finalbody"):
+            body = getattr(node, field, None)
+            if isinstance(body, list):
+                for stmt in body:
+                    result[id(stmt)] = body
+    return result
+
+
+def traceback_patches(source: str, patches: dict, path: str, tree: ast.AST, lines: list) -> dict:
+    """
+    Adds the patches that replace tracebacks in log messages with
+    ``exc_info``, replacing any patch already found for the same statement,
+    and patches that remove imports of ``traceback`` that are no longer
+    needed.
+
+    :param source: the original source code.
+    :param patches: the patches already found for ``source``, keyed by line.
+    :param path: the name of the source file.  Used in messages only.
+    :param tree: the syntax tree of ``source``, unmodified.
+    :param lines: the lines of ``source``.
+    :return: ``patches`` with the new patches added.
+    """
+    if not any(name in source for name in TB_FUNCTIONS):
+        return patches
+    modules, functions = traceback_names(tree)
+    if len(modules) == 0 and len(functions) == 0:
+        return patches
+    removed = []
+    for stmt, call in find_rewrites(tree, modules, functions):
+        if not own_lines(lines, stmt):
+            print(f"Skipping {path} {stmt.lineno} not on a line of its own")
+            continue
+        patches[stmt.lineno] = Patch(stmt.lineno, stmt.end_lineno, stmt.col_offset, ast.unparse(call))
+        removed.append(stmt)
+    if len(removed) == 0:
+        return patches
+    bodies = parents(tree)
+    for stmt, keep in dead_imports(tree, removed):
+        if not own_lines(lines, stmt) or stmt.lineno in patches:
+            continue
+        if len(keep) > 0:
+            if isinstance(stmt, ast.Import):
+                statement = ast.unparse(ast.Import(keep))
+            else:
+                statement = ast.unparse(ast.ImportFrom(stmt.module, keep, stmt.level))
+        elif len(bodies.get(id(stmt), [])) == 1:
+            statement = "pass"
+        else:
+            statement = None
+        patches[stmt.lineno] = Patch(stmt.lineno, stmt.end_lineno, stmt.col_offset, statement)
+    return patches
@@ -0,0 +1,337 @@
+"""
+Apply the patches for a whole tree as a single transaction.
+
+Patching happens in two phases:
+
+1. every file is read, analyzed and its patched content written to a staging
+   area by a pool of worker processes, while the original files are left
+   untouched, and
+2. the staged files are renamed over the originals.  Before each rename the
+   original is hashed again and compared with the hash taken when it was
+   analyzed; if any file changed in the meantime the files already replaced
+   are restored and nothing else is written.
+
+A file that can not be staged, e.g. because it has a syntax error, is
+reported and left as it is; the other files are still committed.
+
+The journal, the staged files and a hard link to each original are kept in
+the ``.logfix-journal`` directory at the top of the tree.  ``logfix rollback``
+uses the journal to restore the originals, whether the run that wrote it
+finished or was interrupted.
+"""
+
+import argparse
+import errno
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from logfix import analyze_source, iter_lines, write_patched_lines
+from logfix import shard
+from logfix.instrument import PROFILER, profiled, start_worker
+from logfix.stream import get_large_file_patches
+
+JOURNAL_DIR = ".logfix-journal"
+JOURNAL_FILE = "journal.json"
+
+STAGING = "staging"
+COMMITTING = "committing"
+COMMITTED = "committed"
+
+
+class TransactionError(Exception):
+    """Raised when a transaction can not be started or committed."""
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_journal(journal_dir: str) -> dict:
+    path = os.path.join(journal_dir, JOURNAL_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_journal(journal_dir: str, journal: dict) -> None:
+    """Atomically replaces the journal and flushes it to disk."""
+    fd, tmp = tempfile.mkstemp(dir=journal_dir, prefix=".journal-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(journal, f, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(journal_dir, JOURNAL_FILE))
+
+
+def move(src: str, dst: str) -> None:
+    """
+    Renames ``src`` to ``dst``.  When they are on different file systems the
+    file is copied next to ``dst`` first so the final rename is still atomic.
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", prefix=".logfix-")
+        os.close(fd)
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+        os.unlink(src)
+
+
+def keep(src: str, dst: str) -> None:
+    """Preserves the original file ``src`` as ``dst``, by hard link if possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def stage(
+    path: str,
+    staged: str,
+    max_size: int = None,
+    verify: bool = True,
+    throttle: str = None,
+    hoist: bool = False,
+    defer: bool = False,
+) -> dict:
+    """
+    Runs in a worker process.  Writes the patched content of ``path`` to
+    ``staged`` without modifying ``path``.
+
+    :return: the journal entry for the file, or None if it needs no patches.
+    """
+    if max_size is not None and os.path.getsize(path) > max_size:
+        original = file_hash(path)
+        patches = get_large_file_patches(path, verify)
+        lines = None
+    else:
+        with PROFILER.phase("read"):
+            with open(path, "rb") as f:
+                data = f.read()
+        original = hashlib.sha256(data).hexdigest()
+        # Decode the same way ``open(path)`` would.
+        source = io.TextIOWrapper(io.BytesIO(data)).read()
+        patches = analyze_source(source, path, verify, throttle, hoist, defer)
+        lines = iter_lines(source)
+    if len(patches) == 0:
+        return None
+    path = os.path.abspath(path)
+    staged = os.path.abspath(staged)
+    with PROFILER.phase("write"), open(staged, "w") as dst:
+        if lines is None:
+            with open(path) as src:
+                write_patched_lines(dst, patches, (line.rstrip("\r\n") for line in src))
+        else:
+            write_patched_lines(dst, patches, lines)
+    shutil.copymode(path, staged)
+    return {
+        "path": path,
+        "original": original,
+        "patched": file_hash(staged),
+        "staged": staged,
+        "lines": len(patches),
+    }
+
+
+class Transaction:
+    """
+    Patches the files under ``directory`` as a single transaction.
+
+    :param directory: the top of the tree, where the journal is kept.
+    :param workers: the number of processes used to stage files.
+    :param max_size: see ``logfix.patch_file``.
+    :param verify: see ``logfix.patch_file``.
+    :param throttle: see ``logfix.analyze_source``.
+    :param hoist: see ``logfix.analyze_source``.
+    :param defer: see ``logfix.analyze_source``.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        workers: int = None,
+        max_size: int = None,
+        verify: bool = True,
+        throttle: str = None,
+        hoist: bool = False,
+        defer: bool = False,
+    ):
+        self.directory = directory
+        self.journal_dir = os.path.join(directory, JOURNAL_DIR)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_size = max_size
+        self.verify = verify
+        self.throttle = throttle
+        self.hoist = hoist
+        self.defer = defer
+        self.errors = []
+        self.stage_time = 0.0
+        self.commit_time = 0.0
+
+    def begin(self) -> dict:
+        journal = read_journal(self.journal_dir)
+        if journal is not None and journal["state"] != COMMITTED:
+            raise TransactionError(
+                f"an interrupted run left {self.journal_dir}, run 'logfix rollback {self.directory}' first"
+            )
+        # Only the most recent run can be rolled back.
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.journal_dir, "staged"))
+        os.makedirs(os.path.join(self.journal_dir, "originals"))
+        journal = {"root": os.path.abspath(self.directory), "state": STAGING, "files": []}
+        write_journal(self.journal_dir, journal)
+        return journal
+
+    def run(self, paths) -> dict:
+        """
+        Stages and then commits the patches for ``paths``.  Files that can not
+        be staged are recorded in ``errors`` and skipped.
+
+        :param paths: an iterable of paths, usually a ``Discovery``.
+        :return: the totals in the same form as ``main.run``.
+        """
+        journal = self.begin()
+        results = shard.new_results()
+        staged_dir = os.path.join(self.journal_dir, "staged")
+        paths = list(paths)
+        results["files_checked"] = len(paths)
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(self.workers, initializer=start_worker, initargs=(PROFILER.enabled,))
+        with pool:
+            futures = [
+                pool.submit(
+                    profiled,
+                    stage,
+                    path,
+                    os.path.join(staged_dir, f"{i}.py"),
+                    self.max_size,
+                    self.verify,
+                    self.throttle,
+                    self.hoist,
+                    self.defer,
+                )
+                for i, path in enumerate(paths)
+            ]
+            for path, future in zip(paths, futures):
+                try:
+                    entry, profile = future.result()
+                except Exception as e:
+                    print(f"Error stage {path}: {e}", file=sys.stderr)
+                    self.errors.append((path, "stage", str(e)))
+                    continue
+                PROFILER.merge(profile)
+                if entry is not None:
+                    journal["files"].append(entry)
+        self.stage_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with PROFILER.phase("commit"):
+            self.commit(journal)
+        self.commit_time = time.perf_counter() - start
+        for entry in journal["files"]:
+            results["files_patched"] += 1
+            results["lines_patched"] += entry["lines"]
+        return results
+
+    def commit(self, journal: dict) -> None:
+        """
+        Renames the staged files over the originals.  If an original changed
+        since it was analyzed the files already replaced are restored and
+        ``TransactionError`` is raised.
+        """
+        originals = os.path.abspath(os.path.join(self.journal_dir, "originals"))
+        for i, entry in enumerate(journal["files"]):
+            entry["backup"] = os.path.join(originals, f"{i}.py")
+        journal["state"] = COMMITTING
+        write_journal(self.journal_dir, journal)
+        for entry in journal["files"]:
+            path = entry["path"]
+            if file_hash(path) != entry["original"]:
+                if len(restore(journal)) == 0:
+                    shutil.rmtree(self.journal_dir)
+                raise TransactionError(f"{path} changed after it was analyzed, no files were patched")
+            keep(path, entry["backup"])
+            move(entry["staged"], path)
+        journal["state"] = COMMITTED
+        write_journal(self.journal_dir, journal)
+        shutil.rmtree(os.path.join(self.journal_dir, "staged"), ignore_errors=True)
+
+    def print_summary(self, file=None) -> None:
+        print(f"Staged  in {self.stage_time:.3f}s, committed in {self.commit_time:.3f}s", file=file)
+        if len(self.errors) > 0:
+            print(f"Errors  {len(self.errors)} files could not be staged", file=file)
+
+
+def restore(journal: dict) -> list:
+    """
+    Restores the original content of every file in the journal.  Files that
+    were modified after they were patched are left alone.
+
+    :return: the paths that could not be restored.
+    """
+    conflicts = []
+    for entry in journal["files"]:
+        backup = entry.get("backup")
+        if backup is None or not os.path.exists(backup):
+            # The file was never replaced.
+            continue
+        path = entry["path"]
+        current = file_hash(path) if os.path.exists(path) else None
+        if current == entry["original"]:
+            continue
+        if current != entry["patched"]:
+            conflicts.append(path)
+            continue
+        move(backup, path)
+    return conflicts
+
+
+def rollback(directory: str) -> list:
+    """
+    Undoes the last transactional run in ``directory``.
+
+    :return: the paths that were modified since they were patched and so
+             were not restored.  The journal is kept if there are any.
+    """
+    journal_dir = os.path.join(directory, JOURNAL_DIR)
+    journal = read_journal(journal_dir)
+    if journal is None:
+        raise TransactionError(f"no journal found in {directory}")
+    conflicts = restore(journal)
+    if len(conflicts) == 0:
+        shutil.rmtree(journal_dir)
+    return conflicts
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        prog="logfix rollback",
+        description="Restore the files patched by the last --atomic run.",
+    )
+    parser.add_argument("directory", help="the directory that was patched")
+    args = parser.parse_args(argv)
+    try:
+        conflicts = rollback(args.directory)
+    except TransactionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for path in conflicts:
+        print(f"Not restored {path} was modified after it was patched", file=sys.stderr)
+    if len(conflicts) > 0:
+        sys.exit(1)
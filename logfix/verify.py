@@ -0,0 +1,386 @@
+"""
+Static verification that a patch does not change the logged message.
+
+The original and rewritten logging calls are both reduced to a *template*: a
+sequence of literal strings and replacement fields.  Each field records the
+expression being formatted and how it is formatted.  Two calls are equivalent
+when the literals are identical, the fields format the same expressions in the
+same order, and each pair of fields formats values the same way.  Fields that
+use different but possibly equivalent specifiers (e.g. ``{pi:2.3f}`` and
+``%2.3f``) are compared by formatting a few sample values of the types the
+specifiers accept, and of the types ``%`` converts but ``format`` may not
+accept: ``None``, an object without format specifiers of its own, and floats
+for integer specifiers or integers for float ones.  A sample that fails with
+both fields counts as the same result.
+
+structlog does not format the event, so a rewrite that moves the values into
+key-value pairs always changes the logged message and is rejected.
+
+Nothing is executed other than ``format`` and ``%`` on the sample values, and
+the calls are the ones already found in the syntax tree, so the check is fast
+enough to run on every patch before a file is written.
+"""
+
+import ast
+import string
+
+from logfix.apis import PERCENT_SPEC
+from logfix.instrument import PROFILER
+
+INT_SAMPLES = [0, 7, -42, 123456]
+FLOAT_SAMPLES = [0.0, 3.14159, -2.5, 1234.5678, 1e10]
+STR_SAMPLES = ["", "ab", "hello world"]
+
+
+class Plain:
+    """An object that only has ``object.__format__``."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "<plain>"
+
+
+# Values that ``%`` converts with ``str()``, ``int()`` or ``float()``, but that
+# ``format`` rejects for some specifiers.
+OTHER_SAMPLES = [None, True, Plain()]
+
+FORMATTER = string.Formatter()
+
+
+class Unverifiable(Exception):
+    """Raised when a call can not be reduced to a template."""
+
+
+class Field:
+    """
+    A replacement field in a template.
+
+    :param expr: the ``ast.dump`` of the expression being formatted.
+    :param percent: the printf style specifier, e.g. ``%-5d``, or None.
+    :param conversion: the ``str.format`` conversion, one of ``s``, ``r`` or
+                       ``a``, or ``""`` for none, used when ``percent`` is
+                       None.
+    :param spec: the ``str.format`` format specifier, used when ``percent`` is
+                 None.
+    """
+
+    __slots__ = ("expr", "percent", "conversion", "spec")
+
+    def __init__(self, expr: str, percent: str = None, conversion: str = "", spec: str = ""):
+        self.expr = expr
+        self.percent = percent
+        self.conversion = conversion
+        self.spec = spec
+
+    def key(self) -> tuple:
+        """A normalized description of how the value is formatted."""
+        if self.percent in ("%s", "%r", "%a"):
+            return ("str", self.percent[1])
+        if self.percent is None and self.spec == "":
+            return ("str", self.conversion or "s")
+        if self.percent is not None:
+            return ("percent", self.percent)
+        return ("format", self.conversion, self.spec)
+
+    def types(self) -> str:
+        if self.percent is not None:
+            return self.percent[-1]
+        return self.spec[-1:] if self.spec[-1:].isalpha() else ""
+
+    def describe(self) -> str:
+        if self.percent is not None:
+            return self.percent
+        conversion = f"!{self.conversion}" if self.conversion else ""
+        spec = f":{self.spec}" if self.spec else ""
+        return f"{{{conversion}{spec}}}"
+
+    def render(self, value) -> str:
+        if self.percent is not None:
+            return self.percent % (value,)
+        if self.conversion == "s":
+            value = str(value)
+        elif self.conversion == "r":
+            value = repr(value)
+        elif self.conversion == "a":
+            value = ascii(value)
+        return format(value, self.spec)
+
+
+def samples(a: Field, b: Field) -> list:
+    """Choose sample values that are valid for the specifiers of both fields."""
+    types = a.types() + b.types()
+    if any(t in types for t in "eEfFgG%bdiouxXn"):
+        return FLOAT_SAMPLES + INT_SAMPLES + OTHER_SAMPLES
+    if "c" in types:
+        return [65, 97, "a"] + OTHER_SAMPLES
+    # A string specifier, or no type, so the value could be anything.
+    return STR_SAMPLES + INT_SAMPLES + FLOAT_SAMPLES + OTHER_SAMPLES
+
+
+def render_sample(field: Field, value) -> str:
+    try:
+        return field.render(value)
+    except (TypeError, ValueError, OverflowError):
+        # logging reports the error instead of the message either way.
+        return None
+
+
+def same_format(a: Field, b: Field) -> bool:
+    if a.key() == b.key():
+        return True
+    for value in samples(a, b):
+        if render_sample(a, value) != render_sample(b, value):
+            return False
+    return True
+
+
+def percent_template(template: str, values: list) -> list:
+    """
+    Reduce a printf style template and its values to a template.  Only the
+    ``%`` specifiers accepted by ``PERCENT_SPEC`` are understood.
+    """
+    parts = []
+    end = 0
+    values = list(values)
+    for match in PERCENT_SPEC.finditer(template):
+        parts.append(template[end:match.start()])
+        end = match.end()
+        spec = match.group(0)
+        if match.group("type") == "%":
+            parts.append("%")
+            continue
+        if match.group("key") is not None or "*" in spec:
+            raise Unverifiable(f"unsupported specifier {spec}")
+        if len(values) == 0:
+            raise Unverifiable(f"not enough arguments for '{template}'")
+        parts.append(Field(ast.dump(values.pop(0)), percent=spec))
+    rest = template[end:]
+    if "%" in rest:
+        raise Unverifiable(f"invalid % specifier in '{template}'")
+    parts.append(rest)
+    if len(values) > 0:
+        raise Unverifiable(f"too many arguments for '{template}'")
+    return parts
+
+
+def brace_template(template: str, args: list, keywords: dict) -> list:
+    """Reduce a ``str.format`` template and its arguments to a template."""
+    parts = []
+    index = 0
+    try:
+        parsed = list(FORMATTER.parse(template))
+    except ValueError as e:
+        raise Unverifiable(str(e))
+    for literal, name, spec, conversion in parsed:
+        parts.append(literal)
+        if name is None:
+            continue
+        if "{" in spec:
+            raise Unverifiable("computed format specifier")
+        if name == "":
+            name = str(index)
+            index += 1
+        if name.isdigit():
+            if int(name) >= len(args):
+                raise Unverifiable(f"not enough arguments for '{template}'")
+            value = args[int(name)]
+        elif name in keywords:
+            value = keywords[name]
+        else:
+            raise Unverifiable(f"unsupported field {{{name}}}")
+        parts.append(Field(ast.dump(value), conversion=conversion or "", spec=spec))
+    return parts
+
+
+def fstring_template(node: ast.JoinedStr) -> list:
+    parts = []
+    for v in node.values:
+        if isinstance(v, ast.Constant):
+            parts.append(v.value)
+            continue
+        spec = ""
+        if v.format_spec is not None:
+            if not all(isinstance(p, ast.Constant) for p in v.format_spec.values):
+                raise Unverifiable("computed format specifier")
+            spec = "".join(p.value for p in v.format_spec.values)
+        conversion = "" if v.conversion == -1 else chr(v.conversion)
+        parts.append(Field(ast.dump(v.value), conversion=conversion, spec=spec))
+    return parts
+
+
+def opaque(node: ast.AST) -> Field:
+    """
+    A field for a template, or value, whose formatting is not known.  Opaque
+    fields only match other opaque fields for the same expression.
+    """
+    return Field(ast.dump(node), conversion="?")
+
+
+def is_string(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def original_template(arg: ast.AST) -> list:
+    """Reduce the greedy message passed to a logging call to a template."""
+    if isinstance(arg, ast.JoinedStr):
+        return fstring_template(arg)
+    if isinstance(arg, ast.BinOp) and isinstance(arg.op, ast.Mod):
+        if not is_string(arg.left):
+            # The template is not known, so the best we can do is check that
+            # the rewrite passes the same template and values.
+            values = arg.right.elts if isinstance(arg.right, ast.Tuple) else [arg.right]
+            return [opaque(arg.left)] + [opaque(v) for v in values]
+        values = arg.right.elts if isinstance(arg.right, ast.Tuple) else [arg.right]
+        return percent_template(arg.left.value, values)
+    if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Attribute) and is_string(arg.func.value):
+        keywords = {k.arg: k.value for k in arg.keywords if k.arg is not None}
+        if len(keywords) != len(arg.keywords):
+            raise Unverifiable("**kwargs in str.format")
+        return brace_template(arg.func.value.value, arg.args, keywords)
+    raise Unverifiable("unsupported message")
+
+
+def rewritten_template(node: ast.Call, style: str, keywords: set) -> list:
+    """
+    Reduce a lazy logging call to the template the logging library will
+    format.  ``keywords`` are the keyword arguments of the original call,
+    which are not part of the message.
+    """
+    if len(node.args) == 0 or any(isinstance(a, ast.Starred) for a in node.args):
+        raise Unverifiable("unsupported arguments")
+    message = node.args[0]
+    args = node.args[1:]
+    added = {k.arg: k.value for k in node.keywords if k.arg not in keywords}
+    if style == "percent":
+        if not is_string(message):
+            return [opaque(message)] + [opaque(v) for v in args]
+        if len(args) == 0:
+            # logging does not apply % when there are no arguments.
+            return [message.value]
+        return percent_template(message.value, args)
+    if not is_string(message):
+        raise Unverifiable("message is not a string constant")
+    if style == "brace":
+        if len(args) == 0 and len(added) == 0:
+            return [message.value]
+        return brace_template(message.value, args, added)
+    if style == "kv":
+        raise Unverifiable("structlog does not format the event")
+    raise Unverifiable(f"unknown style {style}")
+
+
+def normalize(parts: list) -> list:
+    """Merge adjacent literals and drop empty ones."""
+    result = []
+    for part in parts:
+        if isinstance(part, str):
+            if part == "":
+                continue
+            if result and isinstance(result[-1], str):
+                result[-1] += part
+                continue
+        result.append(part)
+    return result
+
+
+def compare(original: list, rewritten: list) -> str:
+    """
+    Compare two templates.
+
+    :return: None if they are equivalent, otherwise the reason they differ.
+    """
+    original = normalize(original)
+    rewritten = normalize(rewritten)
+    if len(original) != len(rewritten):
+        return "different number of fields"
+    for a, b in zip(original, rewritten):
+        if isinstance(a, str) or isinstance(b, str):
+            if a != b:
+                return f"literal text differs: {a!r} != {b!r}"
+        elif a.expr != b.expr:
+            return "arguments differ or are out of order"
+        elif not same_format(a, b):
+            return f"format differs: {a.describe()} != {b.describe()}"
+    return None
+
+
+def verify_call(original: ast.Call, rewritten: ast.Call, style: str) -> str:
+    """
+    Check that the rewritten logging call logs the same message as the
+    original.
+
+    :param original: the original, greedy, logging call.
+    :param rewritten: the lazy logging call that will replace it.
+    :param style: the formatting style of the logging library, see
+                  ``logfix.apis``.
+    :return: None if the calls are equivalent, otherwise the reason they are
+             not, or could not be shown to be, equivalent.
+    """
+    if len(original.args) != 1:
+        return "unsupported original call"
+    if ast.dump(original.func) != ast.dump(rewritten.func):
+        return "logging method differs"
+    keywords = {k.arg for k in original.keywords}
+    for keyword in original.keywords:
+        match = [k for k in rewritten.keywords if k.arg == keyword.arg]
+        if len(match) != 1 or ast.dump(match[0].value) != ast.dump(keyword.value):
+            return f"keyword argument {keyword.arg} differs"
+    try:
+        return compare(
+            original_template(original.args[0]),
+            rewritten_template(rewritten, style, keywords),
+        )
+    except Unverifiable as e:
+        return str(e)
+
+
+def verify_patches(originals: dict, patches: dict) -> dict:
+    """
+    Verifies each patch against the logging call it replaces.
+
+    :param originals: the original logging call and the formatting style of
+                      its library for each patch, keyed by line number, as
+                      found by ``logfix.patches_from_tree``.
+    :param patches: the patches, keyed by line number.
+    :return: a dictionary mapping the line numbers of patches that failed
+             verification to the reason.
+    """
+    failures = {}
+    for line, patch in patches.items():
+        if line not in originals:
+            failures[line] = "original logging call not found"
+            continue
+        original, style = originals[line]
+        try:
+            rewritten = ast.parse(patch.statement.strip(), mode="eval").body
+        except SyntaxError:
+            failures[line] = "patch is not valid Python"
+            continue
+        if not isinstance(rewritten, ast.Call):
+            failures[line] = "patch is not a call"
+            continue
+        reason = verify_call(original, rewritten, style)
+        if reason is not None:
+            failures[line] = reason
+    return failures
+
+
+def gate(originals: dict, patches: dict, path: str) -> dict:
+    """
+    Removes the patches that fail verification and reports them.
+
+    :param originals: see ``verify_patches``.
+    :param patches: the patches, keyed by line number.
+    :param path: the name of the source file.  Used in messages only.
+    :return: the patches that passed verification.
+    """
+    if len(patches) == 0:
+        return patches
+    with PROFILER.phase("verify"):
+        failures = verify_patches(originals, patches)
+    for line in sorted(failures):
+        PROFILER.count("rejected")
+        print(f"Rejected {path} {line} {failures[line]}")
+        del patches[line]
+    return patches
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from logfix import get_patch, iter_lines
+from logfix.baseline import Baseline, fingerprints
+
+SOURCE = '''import logging
+log = logging.getLogger()
+
+def f(x):
+    log.info("a %s" % x)
+    log.info("a %s" % x)
+
+class C:
+    def f(self, x):
+        log.info("a %s" % x)
+'''
+
+
+def patch_findings(source: str) -> list:
+    return [("", p.line, p.end_line) for p in get_patch(source, "test.py").values()]
+
+
+def findings(source: str) -> list:
+    found = fingerprints(patch_findings(source), iter_lines(source))
+    return [(finding[1], fingerprint) for finding, fingerprint in found]
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_scopes(self):
+        found = findings(SOURCE)
+        self.assertEqual([5, 6, 10], [line for line, _ in found])
+        self.assertEqual(found[0][1], found[1][1])
+        self.assertTrue(found[0][1].startswith("f:"))
+        self.assertTrue(found[2][1].startswith("C.f:"))
+        self.assertEqual(found[0][1][2:], found[2][1][4:])
+
+    def test_moved_and_reformatted(self):
+        moved = "# comment\n\n" + SOURCE.replace('log.info("a %s" % x)', 'log.info(\n        "a %s"  %  x\n    )', 1)
+        self.assertEqual([f for _, f in findings(SOURCE)], [f for _, f in findings(moved)])
+
+    def test_kinds_and_overlapping_findings(self):
+        found = patch_findings(SOURCE) + [("loops", 5, 5), ("helpers", 10, 10)]
+        result = fingerprints(found, iter_lines(SOURCE))
+        self.assertEqual([5, 5, 6, 10, 10], [f[1] for f, _ in result])
+        by_kind = {f: fingerprint for f, fingerprint in result}
+        self.assertEqual("loops/" + by_kind[("", 5, 5)], by_kind[("loops", 5, 5)])
+        self.assertTrue(by_kind[("helpers", 10, 10)].startswith("helpers/C.f:"))
+
+
+class BaselineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "baseline.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, source: str) -> tuple:
+        baseline = Baseline(self.path)
+        new = baseline.filter("a.py", patch_findings(source), iter_lines(source))
+        baseline.save(self.tmp.name)
+        return sorted(line for _, line, _ in new), baseline
+
+    def test_ratchet(self):
+        self.assertEqual([], self.check(SOURCE)[0])
+        # One of the two identical calls in f is fixed, and a new one added.
+        source = SOURCE.replace('log.info("a %s" % x)', 'log.info("a %s", x)', 1)
+        source += 'log.error(f"{x}")\n'
+        new, baseline = self.check(source)
+        self.assertEqual([11], new)
+        self.assertEqual((1, 1), (baseline.new, baseline.fixed))
+        # The fixed call can not come back, the new one is still new.
+        new, baseline = self.check(SOURCE + 'log.error(f"{x}")\n')
+        self.assertEqual([6, 11], new)
+        self.assertEqual(2, sum(Baseline(self.path).files["a.py"].values()))
@@ -0,0 +1,90 @@
+"""
+Cost per call of looking a logger up inside a function, before and after
+moving the lookup to module level with ``logfix --hoist``.
+
+    python test/bench_hoist.py -n 1000000
+
+Each variant logs a debug record that is discarded, which is the common case
+the lookup is paid for.  The ``enabled`` rows log an info record to a handler
+that writes to memory.
+"""
+
+import argparse
+import io
+import logging
+import time
+
+log = logging.getLogger("bench.hoist")
+root_log = logging.getLogger()
+
+
+def lookup(n):
+    for i in range(n):
+        logging.getLogger("bench.hoist").debug("row %d", i)
+
+
+def hoisted(n):
+    for i in range(n):
+        log.debug("row %d", i)
+
+
+def root_function(n):
+    for i in range(n):
+        logging.debug("row %d", i)
+
+
+def root_hoisted(n):
+    for i in range(n):
+        root_log.debug("row %d", i)
+
+
+def lookup_enabled(n):
+    for i in range(n):
+        logging.getLogger("bench.hoist").info("row %d", i)
+
+
+def hoisted_enabled(n):
+    for i in range(n):
+        log.info("row %d", i)
+
+
+# Pairs of (before, after).
+VARIANTS = [
+    ("getLogger", lookup, hoisted),
+    ("root", root_function, root_hoisted),
+    ("enabled", lookup_enabled, hoisted_enabled),
+]
+
+
+def configure() -> None:
+    root_log.setLevel(logging.WARNING)
+    root_log.addHandler(logging.NullHandler())
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.StreamHandler(io.StringIO()))
+
+
+def timed(func, n: int) -> float:
+    start = time.perf_counter()
+    func(n)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hoisting logger lookups.")
+    parser.add_argument("-n", type=int, help="calls per run (default 1000000)", default=1000000)
+    parser.add_argument("-r", "--repeat", type=int, help="runs per variant (default 3)", default=3)
+    args = parser.parse_args()
+    configure()
+    for name, before, after in VARIANTS:
+        n = args.n // 10 if name == "enabled" else args.n
+        slow = min(timed(before, n) for _ in range(args.repeat)) / n * 1e9
+        fast = min(timed(after, n) for _ in range(args.repeat)) / n * 1e9
+        print(
+            f"{name:10s} {slow:8.1f} ns/call before {fast:8.1f} ns/call after "
+            f"{slow - fast:8.1f} ns saved {slow / fast:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
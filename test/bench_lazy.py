@@ -0,0 +1,124 @@
+"""
+Cost per call of a discarded debug record whose argument is an expensive
+call, made eagerly and deferred with ``logfix --defer``.
+
+    python -m test.bench_lazy -n 200000
+
+The ``alloc`` rows create the ``logfix.lazy`` object on its own, which is
+all a deferred argument costs when the record is discarded.  The ``join 3``
+row shows why ``--defer`` leaves the join of a list that already exists
+alone: a short join costs less than the object.
+"""
+
+import argparse
+import json
+import logging
+import pprint
+import time
+
+from logfix import lazy
+
+log = logging.getLogger("bench.lazy")
+
+PAYLOAD = {"id": 1234, "name": "job", "tags": ["a", "b", "c"], "meta": {"retries": 3, "owner": None}}
+IDS = list(range(20))
+SHORT = ["a", "b", "c"]
+
+
+def json_eager(n):
+    for i in range(n):
+        log.debug("payload %s", json.dumps(PAYLOAD, indent=2))
+
+
+def json_deferred(n):
+    for i in range(n):
+        log.debug("payload %s", lazy.Json(PAYLOAD, indent=2))
+
+
+def pformat_eager(n):
+    for i in range(n):
+        log.debug("state %s", pprint.pformat(PAYLOAD))
+
+
+def pformat_deferred(n):
+    for i in range(n):
+        log.debug("state %s", lazy.PFormat(PAYLOAD))
+
+
+def join_eager(n):
+    for i in range(n):
+        log.debug("ids %s", ", ".join(map(str, IDS)))
+
+
+def join_deferred(n):
+    for i in range(n):
+        log.debug("ids %s", lazy.Join(", ", map(str, IDS)))
+
+
+def short_join_eager(n):
+    for i in range(n):
+        log.debug("ids %s", ", ".join(SHORT))
+
+
+def short_join_deferred(n):
+    for i in range(n):
+        log.debug("ids %s", lazy.Join(", ", SHORT))
+
+
+def baseline(n):
+    for i in range(n):
+        log.debug("payload %s", PAYLOAD)
+
+
+def alloc_json(n):
+    for i in range(n):
+        lazy.Json(PAYLOAD, indent=2)
+
+
+def alloc_join(n):
+    for i in range(n):
+        lazy.Join(", ", IDS)
+
+
+# Pairs of (before, after).
+VARIANTS = [
+    ("json", json_eager, json_deferred),
+    ("pformat", pformat_eager, pformat_deferred),
+    ("join", join_eager, join_deferred),
+    ("join 3", short_join_eager, short_join_deferred),
+]
+
+# Costs that are reported on their own.
+SINGLES = [
+    ("no arg", baseline),
+    ("alloc json", alloc_json),
+    ("alloc join", alloc_join),
+]
+
+
+def timed(func, n: int) -> float:
+    start = time.perf_counter()
+    func(n)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deferred log arguments.")
+    parser.add_argument("-n", type=int, help="calls per run (default 200000)", default=200000)
+    parser.add_argument("-r", "--repeat", type=int, help="runs per variant (default 3)", default=3)
+    args = parser.parse_args()
+    log.setLevel(logging.INFO)
+    for name, before, after in VARIANTS:
+        slow = min(timed(before, args.n) for _ in range(args.repeat)) / args.n * 1e9
+        fast = min(timed(after, args.n) for _ in range(args.repeat)) / args.n * 1e9
+        print(
+            f"{name:10s} {slow:8.1f} ns/call eager {fast:8.1f} ns/call deferred "
+            f"{slow - fast:8.1f} ns saved {slow / fast:5.2f}x"
+        )
+    for name, func in SINGLES:
+        cost = min(timed(func, args.n) for _ in range(args.repeat)) / args.n * 1e9
+        print(f"{name:10s} {cost:8.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Throughput of a loop that logs one enabled record per iteration, before and
+after routing the call through the ``logfix.throttle`` wrappers.
+
+    python -m test.bench_loops -n 200000
+"""
+
+import argparse
+import io
+import logging
+import time
+
+from logfix import throttle
+
+
+def make_logger() -> logging.Logger:
+    log = logging.getLogger("bench.loops")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    log.addHandler(handler)
+    return log
+
+
+def plain(log, rows):
+    for row in rows:
+        log.info("processing row %d", row)
+
+
+def limited(log, rows):
+    for row in rows:
+        throttle.limited(log).info("processing row %d", row)
+
+
+def sampled(log, rows):
+    for row in rows:
+        throttle.sampled(log).info("processing row %d", row)
+
+
+def summary(log, rows):
+    with throttle.LoopSummary(log) as s:
+        for row in rows:
+            s.info("processing row %d", row)
+
+
+def timed(loop, log, rows) -> float:
+    start = time.perf_counter()
+    loop(log, rows)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logging in a loop.")
+    parser.add_argument("-n", type=int, help="iterations per run (default 200000)", default=200000)
+    parser.add_argument("-r", "--repeat", type=int, help="runs per variant (default 3)", default=3)
+    args = parser.parse_args()
+    log = make_logger()
+    rows = range(args.n)
+    baseline = None
+    for name, loop in [("plain", plain), ("limited", limited), ("sampled", sampled), ("summary", summary)]:
+        best = min(timed(loop, log, rows) for _ in range(args.repeat))
+        rate = args.n / best
+        baseline = baseline or rate
+        print(f"{name:8s} {best:8.3f}s {rate:12,.0f} rows/s {rate / baseline:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import unittest
+
+from logfix.bytecode import scan_code
+
+SOURCE = '''
+def f(x):
+    log.debug(f"a {x}")
+    log.info("a %s" % x)
+    log.warning("{} b".format(x))
+    log.debug("ok %s", x)
+    log.error(f"{x:>10}", exc_info=True)
+    log.info(str(x))
+    log.info("x %s", "{}".format(x))
+
+class C:
+    def m(self, y):
+        logger.info(y % 2)
+'''
+
+
+class BytecodeTests(unittest.TestCase):
+    def scan(self, source):
+        findings = []
+        scan_code(compile(source, "mod.py", "exec"), "mod:<module>", findings)
+        return sorted((f.line, f.qualname, f.call, f.kind) for f in findings)
+
+    def test_findings(self):
+        assert self.scan(SOURCE) == [
+            (3, "mod:f", "log.debug", "f-string"),
+            (4, "mod:f", "log.info", "%"),
+            (5, "mod:f", "log.warning", "format"),
+            (7, "mod:f", "log.error", "f-string"),
+            (13, "mod:C.m", "logger.info", "%"),
+        ]
+
+    def test_lazy_calls_are_ignored(self):
+        assert self.scan("log.debug('%s', x)\nlog.info(str(x))\nfoo.info(f'{x}')") == []
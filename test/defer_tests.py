@@ -0,0 +1,95 @@
+import io
+import json
+import logging
+import pprint
+import unittest
+
+from logfix import analyze_source, lazy
+from test.patch_tests import AnalyzeTestBase
+
+SOURCE = '''"""Docstring."""
+import json
+import logging
+from pprint import pformat as pf
+
+log = logging.getLogger(__name__)
+
+
+def f(payload, state, ids, sep):
+    log.debug("payload %s", json.dumps(payload, indent=2))
+    log.debug(pf(state))
+    log.info(f"ids {', '.join(map(str, ids))}")
+    log.debug("size %d", len(json.dumps(payload)))
+    log.debug(sep.join(ids))
+    log.debug("ids %s", ", ".join(ids))
+    if ids: log.debug("%s", json.dumps(ids))
+'''
+
+
+class DeferTests(AnalyzeTestBase):
+    options = {"defer": True}
+
+    def test_defer(self):
+        result, messages = self.patched(SOURCE)
+        lines = result.splitlines()
+        self.assertEqual(["from logfix import lazy", "import json"], lines[1:3])
+        self.assertIn("    log.debug('payload %s', lazy.Json(payload, indent=2))", lines)
+        self.assertIn("    log.debug('%s', lazy.PFormat(state))", lines)
+        self.assertIn("    log.info('ids %s', lazy.Join(', ', map(str, ids)))", lines)
+        # Not the argument itself, not a literal separator, or a join of a
+        # list that already exists.
+        self.assertIn('    log.debug("size %d", len(json.dumps(payload)))', lines)
+        self.assertIn("    log.debug(sep.join(ids))", lines)
+        self.assertIn('    log.debug("ids %s", ", ".join(ids))', lines)
+        self.assertIn("Skipping test.py 16 not on a line of its own", messages)
+
+    def test_existing_import(self):
+        source = "from logfix import lazy as lz\nimport json\nlog.debug(json.dumps(x))\n"
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual(["from logfix import lazy as lz", "import json", "log.debug('%s', lz.Json(x))"], lines)
+
+    def test_brace_style(self):
+        source = "import json\nfrom loguru import logger\nlogger.debug('{}', json.dumps(x))\n"
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual("logger.debug('{}', lazy.Json(x))", lines[3])
+
+    def test_join_items(self):
+        source = "log.debug('%s', ','.join(str(i) for i in ids))\nlog.debug('%s', ','.join([a, b]))\n"
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual("log.debug('%s', lazy.Join(',', (str(i) for i in ids)))", lines[1])
+        self.assertEqual("log.debug('%s', ','.join([a, b]))", lines[2])
+
+    def test_not_enabled(self):
+        source = "import json\nlog.debug(json.dumps(x))\n"
+        self.assertEqual({}, analyze_source(source, "test.py"))
+
+
+class LazyTests(unittest.TestCase):
+    def test_same_as_eager(self):
+        payload = {"b": [1, 2], "a": "x"}
+        for value, eager in [
+            (lazy.Json(payload, indent=2, sort_keys=True), json.dumps(payload, indent=2, sort_keys=True)),
+            (lazy.PFormat(payload, width=10), pprint.pformat(payload, width=10)),
+            (lazy.Join(", ", map(str, [1, 2])), "1, 2"),
+        ]:
+            self.assertEqual(eager, str(value))
+            self.assertEqual(repr(eager), repr(value))
+            self.assertEqual(f"{eager:>40}", f"{value:>40}")
+            self.assertEqual("%r" % eager, "%r" % (value,))
+
+    def test_not_formatted_when_discarded(self):
+        log = logging.getLogger("logfix.test.defer")
+        log.setLevel(logging.INFO)
+        value = lazy.Join(", ", iter(["a", "b"]))
+        log.debug("%s", value)
+        self.assertIsNone(value.value)
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        log.addHandler(handler)
+        try:
+            log.info("%s", value)
+            log.info("%s", value)
+        finally:
+            log.removeHandler(handler)
+        # The iterator is only consumed once.
+        self.assertEqual("a, b\na, b\n", stream.getvalue())
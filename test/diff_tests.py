@@ -0,0 +1,72 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from logfix import get_patch
+from logfix.diff import diff_file, file_diff
+
+
+def make_diff(source: str, context: int = 3) -> str:
+    patches = get_patch(source, "mod.py")
+    return "".join(file_diff("mod.py", patches, io.StringIO(source, newline=""), context))
+
+
+class DiffTests(unittest.TestCase):
+    def test_single_hunk(self):
+        source = "a = 1\nlog.debug(f'a is {a}')\nb = 2\n"
+        assert make_diff(source) == (
+            "diff --git a/mod.py b/mod.py\n"
+            "--- a/mod.py\n"
+            "+++ b/mod.py\n"
+            "@@ -1,3 +1,3 @@\n"
+            " a = 1\n"
+            "-log.debug(f'a is {a}')\n"
+            "+log.debug('a is %s', a)\n"
+            " b = 2\n"
+        )
+
+    def test_multi_line_statement_shifts_later_hunks(self):
+        source = "log.info('%s %s' %\n         (a, b))\n" + "x = 1\n" * 10 + "log.info(f'{c}')\n"
+        diff = make_diff(source, context=1)
+        assert "@@ -1,3 +1,2 @@\n" in diff
+        assert "@@ -12,2 +11,2 @@\n" in diff
+
+    def test_preserves_line_endings(self):
+        diff = make_diff("x = 1\r\nlog.debug(f'{x}')\r\n")
+        assert "-log.debug(f'{x}')\r\n+log.debug('%s', x)\r\n" in diff
+
+    def test_no_newline_at_end_of_file(self):
+        diff = make_diff("x = 1\nlog.debug(f'{x}')")
+        assert diff.endswith(
+            "-log.debug(f'{x}')\n"
+            "\\ No newline at end of file\n"
+            "+log.debug('%s', x)\n"
+            "\\ No newline at end of file\n"
+        )
+
+    def test_no_patches(self):
+        assert make_diff("log.debug('%s', x)\n") == ""
+
+    @unittest.skipIf(shutil.which("git") is None, "git is not installed")
+    def test_git_apply(self):
+        sources = {
+            "a.py": "import logging\n" + "x = 1\n" * 8 + "logging.info('{}'.format(x))\n" * 3,
+            "b.py": "log.debug(f'{a}')\r\ny = 1\r\nlog.info('%d' % y)",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            out = io.StringIO()
+            for name, source in sources.items():
+                with open(os.path.join(tmp, name), "w", newline="") as f:
+                    f.write(source)
+                diff_file(out, os.path.join(tmp, name), name)
+            subprocess.run(["git", "init", "-q", tmp], check=True)
+            subprocess.run(
+                ["git", "apply", "-"], cwd=tmp, input=out.getvalue().encode(), check=True
+            )
+            with open(os.path.join(tmp, "b.py"), newline="") as f:
+                assert f.read() == "log.debug('%s', a)\r\ny = 1\r\nlog.info('%d', y)"
+            with open(os.path.join(tmp, "a.py")) as f:
+                assert f.read().count("logging.info('%s', x)\n") == 3
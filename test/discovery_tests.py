@@ -0,0 +1,53 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from logfix.discovery import Discovery, translate_glob
+
+
+class DiscoveryTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in ["pkg/a.py", "pkg/sub/b.py", "pkg/notes.txt", ".venv/lib/c.py",
+                     "node_modules/d.py", "gen/e.py"]:
+            self.write(path, "")
+        self.write("bin/tool", "#!/usr/bin/env python3\nprint(1)\n")
+        self.write("bin/script", "#!/bin/sh\necho 1\n")
+        self.write(".gitignore", "gen/\n*.pyc\n")
+        self.write("pkg/sub/.gitignore", "b.py\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def found(self, finder):
+        return sorted(os.path.relpath(p, self.root) for p in finder)
+
+    def test_defaults(self):
+        assert ["bin/tool", "pkg/a.py"] == self.found(Discovery(self.root))
+
+    def test_no_pruning(self):
+        finder = Discovery(self.root, gitignore=False, default_excludes=False)
+        assert 6 == len(self.found(finder))
+
+    def test_exclude_glob(self):
+        finder = Discovery(self.root, excludes=["pkg"])
+        assert ["bin/tool"] == self.found(finder)
+
+    def test_symlink_loop(self):
+        os.symlink("..", os.path.join(self.root, "pkg", "loop"))
+        finder = Discovery(self.root)
+        assert ["bin/tool", "pkg/a.py"] == self.found(finder)
+        assert 1 == len(finder.loops)
+
+    def test_translate_glob(self):
+        assert re.match(translate_glob("a/*.py"), "a/b.py")
+        assert not re.match(translate_glob("a/*.py"), "a/b/c.py")
+        assert re.match(translate_glob("a/**/*.py"), "a/b/c.py")
@@ -0,0 +1,116 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from logfix import lazy
+from logfix.helpers import HelperIndex
+
+FILES = {
+    "pkg/__init__.py": "",
+    "pkg/fmt.py": '''
+def status(x, y):
+    return f"{x} is {y}"
+
+def wrapped(x):
+    if x:
+        return status(x, 1)
+    return "none: %s" % x
+
+def plain(x):
+    return x.name
+
+def loop(x):
+    return loop(x)
+''',
+    "pkg/sub/jobs.py": '''
+import logging
+from ..fmt import status, wrapped, plain, loop
+from pkg import fmt
+
+log = logging.getLogger(__name__)
+
+class Job:
+    def _describe(self, job):
+        return "job {}".format(job)
+
+    def run(self, job):
+        log.debug(self._describe(job))
+        log.info(status(job, 2))
+        log.info(wrapped(job))
+        log.info(plain(job))
+        log.info(loop(job))
+        log.info(fmt.status(job, 3))
+        log.info("%s", status(job, 4))
+''',
+}
+
+
+class HelperIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.paths = []
+        for relpath, source in FILES.items():
+            path = os.path.join(self.dir, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(source)
+            self.paths.append(path)
+        self.cache = os.path.join(self.dir, "cache.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def index(self) -> HelperIndex:
+        index = HelperIndex(self.dir, self.cache)
+        index.update(self.paths)
+        return index
+
+    def test_helpers(self):
+        index = self.index()
+        self.assertEqual(
+            {"pkg.fmt:status", "pkg.fmt:wrapped", "pkg.sub.jobs:Job._describe"},
+            index.helpers,
+        )
+
+    def test_sites(self):
+        sites = self.index().sites(self.paths[2])
+        self.assertEqual([13, 14, 15, 18], [s[0] for s in sites])
+        self.assertEqual("log.debug('%s', lazy.Deferred(self._describe, job))", sites[0][4])
+        self.assertEqual("pkg.fmt:status", sites[3][2])
+
+    def test_cache(self):
+        self.assertEqual(3, self.index().parsed)
+        self.assertEqual(0, self.index().parsed)
+        with open(self.paths[1], "a") as f:
+            f.write("\ndef extra():\n    return 'x' + str(1)\n")
+        index = self.index()
+        self.assertEqual(1, index.parsed)
+        self.assertIn("pkg.fmt:extra", index.helpers)
+
+    def test_scan_root_below_import_root(self):
+        # Modules are named relative to the scanned directory, pkg.sub.jobs
+        # becomes sub.jobs, but imports of pkg.fmt still resolve.
+        index = HelperIndex(os.path.join(self.dir, "pkg"))
+        index.update(self.paths)
+        self.assertIn("fmt:wrapped", index.helpers)
+        self.assertEqual(4, len(index.sites(self.paths[2])))
+
+
+class DeferredTests(unittest.TestCase):
+    def test_deferred(self):
+        calls = []
+
+        def describe(x, suffix=""):
+            calls.append(x)
+            return f"job {x}{suffix}"
+
+        log = logging.getLogger("logfix.test.helpers")
+        log.setLevel(logging.INFO)
+        log.debug("%s", lazy.Deferred(describe, 1))
+        self.assertEqual([], calls)
+        value = lazy.Deferred(describe, 2, suffix="!")
+        self.assertEqual("job 2!", "%s" % value)
+        self.assertEqual("job 2!", f"{value}")
+        self.assertEqual([2], calls)
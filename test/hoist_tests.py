@@ -0,0 +1,94 @@
+from test.patch_tests import AnalyzeTestBase
+
+SOURCE = '''"""Docstring."""
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+def f(x, name):
+    logging.getLogger(__name__).info(f"x={x}")
+    logging.info("done %s", x)
+    logging.getLogger(name).debug("dynamic")
+    other = logging.getLogger("app.jobs")
+    if logging.getLogger(__name__).isEnabledFor(10):
+        pass
+    return other
+
+
+def g(log=logging.getLogger("default")):
+    return log
+'''
+
+
+class HoistTests(AnalyzeTestBase):
+    options = {"hoist": True}
+
+    def test_hoist(self):
+        result, messages = self.patched(SOURCE)
+        lines = result.splitlines()
+        self.assertEqual(
+            ["import logging", "root_log = logging.getLogger()", "app_jobs_log = logging.getLogger('app.jobs')"],
+            lines[1:4],
+        )
+        self.assertIn("    LOG.info('x=%s', x)", lines)
+        self.assertIn("    root_log.info('done %s', x)", lines)
+        self.assertIn("    other = app_jobs_log", lines)
+        # Reported, not rewritten.
+        self.assertIn('    logging.getLogger(name).debug("dynamic")', lines)
+        self.assertIn("    if logging.getLogger(__name__).isEnabledFor(10):", lines)
+        self.assertIn("dynamic logger name logging.getLogger(name)", messages)
+        # Default values are evaluated once.
+        self.assertIn('def g(log=logging.getLogger("default")):', lines)
+        namespace = {"__name__": "app.module"}
+        exec(compile(result, "test.py", "exec"), namespace)
+        self.assertIs(namespace["f"](1, "x"), namespace["app_jobs_log"])
+
+    def test_local_name_is_not_reused(self):
+        source = (
+            "import logging\n"
+            "log = logging.getLogger(__name__)\n"
+            "def f():\n"
+            "    log = logging.getLogger(__name__)\n"
+            "    log.debug('x')\n"
+        )
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual(["import logging", "logger = logging.getLogger(__name__)"], lines[:2])
+        self.assertEqual("    log = logger", lines[4])
+
+    def test_name_bound_in_enclosing_function(self):
+        source = (
+            "import logging\n"
+            "log = logging.getLogger(__name__)\n"
+            "def outer():\n"
+            "    log = []\n"
+            "    def inner():\n"
+            "        logging.getLogger(__name__).info('x')\n"
+        )
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual("logger = logging.getLogger(__name__)", lines[1])
+        self.assertEqual("        logger.info('x')", lines[6])
+
+    def test_logger_assigned_after_code(self):
+        source = (
+            "import logging\n"
+            "def setup():\n"
+            "    logging.getLogger(__name__).info('x')\n"
+            "setup()\n"
+            "log = logging.getLogger(__name__)\n"
+        )
+        result = self.patched(source)[0]
+        self.assertEqual("logger = logging.getLogger(__name__)", result.splitlines()[1])
+        exec(compile(result, "test.py", "exec"), {"__name__": "app.module"})
+
+    def test_from_import(self):
+        source = "from logging import getLogger\ndef f():\n    getLogger(__name__).debug('x')\n"
+        lines = self.patched(source)[0].splitlines()
+        self.assertEqual(["from logging import getLogger", "log = getLogger(__name__)"], lines[:2])
+        self.assertEqual("    log.debug('x')", lines[3])
+
+    def test_not_imported_at_module_level(self):
+        source = "def f():\n    import logging\n    logging.getLogger(__name__).debug('x')\n"
+        result, messages = self.patched(source)
+        self.assertEqual(source, result)
+        self.assertIn("not imported at module level", messages)
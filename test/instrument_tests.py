@@ -0,0 +1,42 @@
+import unittest
+
+from logfix import *
+from logfix.instrument import NULL_PHASE, PROFILER, Profiler
+
+
+class ProfilerTests(unittest.TestCase):
+    def tearDown(self):
+        PROFILER.disable()
+        PROFILER.reset()
+
+    def test_disabled_profiler_does_nothing(self):
+        profiler = Profiler()
+        assert profiler.phase("parse") is NULL_PHASE
+        assert profiler.file("a.py") is NULL_PHASE
+        profiler.count("files")
+        assert profiler.counters == {}
+
+    def test_nested_phases_are_exclusive(self):
+        profiler = Profiler()
+        profiler.enable()
+        with profiler.phase("outer"):
+            with profiler.phase("inner"):
+                pass
+        summary = profiler.summary()
+        assert summary["phases"]["outer"]["calls"] == 1
+        assert summary["phases"]["inner"]["calls"] == 1
+        assert profiler.stack == []
+
+    def test_get_patch_counters(self):
+        PROFILER.enable()
+        source = "log.debug(f'{a}')\nlog.info('%s' % a)\nlog.info('{}'.format(a))\nlog.info(x.format(a))\nlog.info('%s', a)"
+        get_patch(source, "__fake__.py")
+        counters = PROFILER.summary()["counters"]
+        assert counters == {
+            "candidates": 4,
+            "patches.format": 1,
+            "patches.fstring": 1,
+            "patches.modop": 1,
+            "skips": 1,
+        }
+        assert {"parse", "analyze", "unparse"} <= set(PROFILER.summary()["phases"])
@@ -0,0 +1,120 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from logfix import isolate
+from logfix.instrument import PROFILER
+
+FILES = {
+    "ok.py": 'import logging\nlog = logging.getLogger()\nlog.info("%s" % x)\n',
+    "bad.py": "def (:\n",
+    "deep.py": "y = " + "+".join(["1"] * 200000) + "\n",
+    "slow.py": "x = [1, 2, 3]\n" * 50000,
+}
+
+
+class IsolatedTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name, source in FILES.items():
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "w") as f:
+                f.write(source)
+            self.paths[name] = path
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_files(self, runner, names):
+        with contextlib.redirect_stdout(io.StringIO()) as out, \
+                contextlib.redirect_stderr(io.StringIO()):
+            results = runner.run(self.paths[name] for name in names)
+        return results, out.getvalue()
+
+    def test_failures_do_not_stop_the_run(self):
+        runner = isolate.Isolated(workers=2)
+        results, _ = self.run_files(runner, ["bad.py", "deep.py", "ok.py"])
+        self.assertEqual({"files_checked": 3, "files_patched": 1, "lines_patched": 1}, results)
+        with open(self.paths["ok.py"]) as f:
+            self.assertIn("log.info('%s', x)", f.read())
+        errors = {os.path.basename(e["path"]): e for e in runner.errors}
+        self.assertEqual(["bad.py", "deep.py"], sorted(errors))
+        self.assertEqual(("parse", "SyntaxError"), (errors["bad.py"]["phase"], errors["bad.py"]["error"]))
+        self.assertEqual("RecursionError", errors["deep.py"]["error"])
+        self.assertGreaterEqual(errors["deep.py"]["duration"], 0)
+
+    def test_profile_includes_workers(self):
+        PROFILER.enable()
+        try:
+            runner = isolate.Isolated(workers=2)
+            self.run_files(runner, ["bad.py", "ok.py"])
+            summary = PROFILER.summary()
+        finally:
+            PROFILER.disable()
+            PROFILER.reset()
+        self.assertLessEqual({"read", "parse", "analyze", "write"}, set(summary["phases"]))
+        self.assertEqual(2, summary["counters"]["files"])
+        self.assertEqual(1, sum(n for name, n in summary["counters"].items() if name.startswith("patches.")))
+
+    def test_lint(self):
+        runner = isolate.Isolated(workers=1, lint=True)
+        results, out = self.run_files(runner, ["ok.py"])
+        self.assertEqual(1, results["lines_patched"])
+        self.assertIn("0003: + log.info('%s', x)", out)
+        with open(self.paths["ok.py"]) as f:
+            self.assertEqual(FILES["ok.py"], f.read())
+
+    def test_stuck_worker_is_killed(self):
+        # Parsing slow.py is a single C call that SIGALRM can not interrupt.
+        runner = isolate.Isolated(workers=1, timeout=0.2)
+        with mock.patch.object(isolate, "GRACE", 0.3):
+            results, _ = self.run_files(runner, ["slow.py", "ok.py"])
+        self.assertEqual(1, results["lines_patched"])
+        self.assertEqual(["Timeout"], [e["error"] for e in runner.errors])
+
+    def test_timeout_counts_from_start(self):
+        # A file that waited for a worker is not overdue when it starts.
+        worker = subprocess.Popen(["sleep", "10"])
+        self.addCleanup(worker.wait)
+        self.addCleanup(worker.kill)
+        runner = isolate.Isolated(workers=1, timeout=0.2)
+        runner.pending = {"ok.py": None}
+        runner.submitted = {"ok.py": time.perf_counter() - 60}
+        runner.pids = {}
+        runner.started = multiprocessing.SimpleQueue()
+        runner.started.put(("ok.py", worker.pid))
+        runner.check_workers()
+        self.assertIsNone(worker.poll())
+        self.assertEqual([], runner.errors)
+        self.assertEqual({"ok.py": worker.pid}, runner.pids)
+
+    def test_dead_worker_loses_only_its_file(self):
+        analyze_source = isolate.analyze_source
+
+        def crash(source, path, *args):
+            if path.endswith("bad.py"):
+                os._exit(1)
+            return analyze_source(source, path, *args)
+
+        runner = isolate.Isolated(workers=2)
+        with mock.patch.object(isolate, "analyze_source", crash):
+            results, _ = self.run_files(runner, ["bad.py", "ok.py"])
+        self.assertEqual({"files_checked": 2, "files_patched": 1, "lines_patched": 1}, results)
+        self.assertEqual([("unknown", "WorkerDied")], [(e["phase"], e["error"]) for e in runner.errors])
+
+    def test_error_report(self):
+        runner = isolate.Isolated(workers=1)
+        self.run_files(runner, ["bad.py"])
+        report = os.path.join(self.tmp.name, "errors.json")
+        runner.write_errors(report)
+        with open(report) as f:
+            errors = json.load(f)["errors"]
+        self.assertEqual(["path", "phase", "error", "message", "duration"], list(errors[0]))
@@ -0,0 +1,129 @@
+import ast
+import logging
+import unittest
+
+from logfix import throttle
+from logfix.loops import find_loop_logs
+from test.patch_tests import AnalyzeTestBase
+
+SOURCE = '''"""Docstring."""
+import logging
+log = logging.getLogger(__name__)
+
+def f(rows):
+    for r in rows:
+        log.info(f"row {r}")
+        log.debug("row %s", r)
+        def g():
+            log.info("not in a loop")
+    while rows:
+        for c in rows:
+            log.error("%s", c)
+    log.info("done")
+    return [log.warning(r) for r in rows]
+'''
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class FindLoopLogsTests(AnalyzeTestBase):
+    def test_finds_enabled_calls_in_loops(self):
+        found = find_loop_logs(ast.parse(SOURCE))
+        assert [(f.line, f.method, f.loop_kind, f.depth) for f in found] == [
+            (7, "info", "for", 1),
+            (13, "error", "for", 2),
+            (15, "warning", "comprehension", 1),
+        ]
+        assert [f.statement for f in found] == [True, True, False]
+
+    def test_rewrite_rate(self):
+        result = self.patched(SOURCE, throttle="rate")[0]
+        lines = result.splitlines()
+        assert lines[1] == "from logfix import throttle"
+        assert lines[2] == "import logging"
+        assert "        throttle.limited(log).info('row %s', r)" in lines
+        assert "            throttle.limited(log).error('%s', c)" in lines
+        assert '        log.debug("row %s", r)' in lines
+        assert '    log.info("done")' in lines
+        ast.parse(result)
+        # Running again changes nothing.
+        assert self.patched(result, throttle="rate")[0] == result
+
+    def test_rewrite_sample_with_existing_name(self):
+        source = "throttle = 1\nfor r in rows:\n    log.info('%s', r)\n"
+        assert self.patched(source, throttle="sample")[0] == (
+            "from logfix import throttle as logfix_throttle\n"
+            "throttle = 1\n"
+            "for r in rows:\n"
+            "    logfix_throttle.sampled(log).info('%s', r)\n"
+        )
+
+    def test_shared_line_is_not_rewritten(self):
+        source = "for r in rows: log.info('%s', r)\n"
+        assert self.patched(source, throttle="rate")[0] == source
+
+    def test_dynamic_logger_or_message_is_not_rewritten(self):
+        source = "for r in rows:\n    log.bind(row=r).info('row')\n    log.info(r.message)\n"
+        assert self.patched(source, throttle="rate")[0] == source
+
+
+class ThrottleTests(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("logfix.test.throttle")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_sampled(self):
+        wrapper = throttle.Sampled(self.logger, every=10)
+        for i in range(25):
+            wrapper.info("row %d", i)
+            wrapper.warning("other")
+        assert self.handler.messages.count("other") == 3
+        assert [m for m in self.handler.messages if m != "other"] == ["row 0", "row 10", "row 20"]
+        assert wrapper.suppressed == 44
+
+    def test_rate_limited(self):
+        wrapper = throttle.RateLimited(self.logger, per_second=0.001, burst=2)
+        for i in range(100):
+            wrapper.info("row %d", i)
+        assert self.handler.messages == ["row 0", "row 1"]
+        assert wrapper.isEnabledFor(logging.INFO)
+
+    def test_wrappers_are_cached(self):
+        assert throttle.limited(self.logger) is throttle.limited(self.logger)
+        assert throttle.sampled(self.logger, 5) is not throttle.sampled(self.logger, 6)
+
+    def test_tables_are_bounded(self):
+        for i in range(throttle.MAX_WRAPPERS + 10):
+            throttle.sampled(logging.LoggerAdapter(self.logger, {"i": i}))
+        assert len(throttle.WRAPPERS) <= throttle.MAX_WRAPPERS
+        wrapper = throttle.Sampled(self.logger, every=2)
+        for i in range(throttle.MAX_TEMPLATES + 10):
+            wrapper.info(f"row {i}")
+        assert len(wrapper.counts) <= throttle.MAX_TEMPLATES
+
+    def test_caller_is_recorded(self):
+        records = []
+        self.handler.emit = records.append
+        throttle.Sampled(self.logger).info("row")
+        throttle.RateLimited(self.logger).info("row", stacklevel=1)
+        assert [(r.filename, r.funcName) for r in records] == [("loops_tests.py", "test_caller_is_recorded")] * 2
+
+    def test_loop_summary(self):
+        with throttle.LoopSummary(self.logger) as summary:
+            for i in range(5):
+                summary.info("row %d", i)
+                summary.info("100% done")
+        assert self.handler.messages == ["row 4 (5 times)", "100% done (5 times)"]
@@ -1,3 +1,6 @@
+import ast
+import contextlib
+import io
 import unittest
 
 from logfix import *
@@ -14,11 +17,34 @@ class PatchTestBase(unittest.TestCase):
         actual = patches[1].render()
         assert actual == expected, f'{actual} != {expected}'
 
+    def assert_patched_at(self, source, line, expected):
+        patches = get_patch(source, "__fake__.py")
+        assert line in patches, f'no patch for line {line}'
+        actual = patches[line].render()
+        assert actual == expected, f'{actual} != {expected}'
+
     def assert_unchanged(self, source):
         patches = get_patch(source, "__fake__.py")
         assert 0 == len(patches)
 
 
+class AnalyzeTestBase(unittest.TestCase):
+    # Keyword arguments for ``analyze_source`` used by every test.
+    options = {}
+
+    def patched(self, source, **options):
+        """
+        Returns the source as ``analyze_source`` patches it, and what it
+        printed.
+        """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            patches = analyze_source(source, "test.py", **{**self.options, **options})
+        result = io.StringIO()
+        write_patched_lines(result, patches, iter_lines(source))
+        return result.getvalue(), out.getvalue()
+
+
 class MethodTests(PatchTestBase):
     """Test functions other than the ``patch`` functions."""
 
@@ -119,6 +145,12 @@ class PatchFStringTest(PatchTestBase):
         expected = "log.debug('hello %20s', world)"
         self.assert_patched(source, expected)
 
+    def test_fstring_unsupported_spec(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assert_unchanged("log.debug(f'hello {world:^20}')")
+            self.assert_unchanged("log.debug(f'hello {world:>{width}}')")
+            self.assert_unchanged("log.debug(f'hello {world:}')")
+
 
 class PatchIgnoreLazyTest(PatchTestBase):
     """Logging statements that should not be patched"""
@@ -190,3 +222,120 @@ class IsLogTest(PatchTestBase):
     def test_not_a_logger_method(self):
         node = self.parse("log.greet(msg)")
         assert not is_log_method(node)
+
+
+class ChainedLoggerTests(PatchTestBase):
+    def test_get_logger_chain(self):
+        source = "logging.getLogger(__name__).debug(f'hello {world}')"
+        expected = "logging.getLogger(__name__).debug('hello %s', world)"
+        self.assert_patched(source, expected)
+
+    def test_assigned_logger_name(self):
+        source = "LOG = logging.getLogger(__name__)\nLOG.info(f'hello {world}')"
+        self.assert_patched_at(source, 2, "LOG.info('hello %s', world)")
+
+    def test_not_a_logger_factory(self):
+        self.assert_unchanged("foo.getLogger(__name__).debug(f'hello {world}')")
+
+
+class LoguruTests(PatchTestBase):
+    IMPORT = "from loguru import logger\n"
+
+    def assert_loguru(self, source, expected):
+        self.assert_patched_at(self.IMPORT + source, 2, expected)
+
+    def test_fstring(self):
+        self.assert_loguru("logger.info(f'hello {world}')", "logger.info('hello {}', world)")
+
+    def test_fstring_spec_and_conversion(self):
+        self.assert_loguru(
+            "logger.info(f'{x!r} {y:>10} {{z}}')",
+            "logger.info('{!r} {:>10} {{z}}', x, y)",
+        )
+
+    def test_modop(self):
+        self.assert_loguru(
+            "logger.info('%s %-5x %10s %.3r %%' % (a, b, c, d))",
+            "logger.info('{} {:<5x} {!s:>10} {!r:.3} %', a, b, c, d)",
+        )
+
+    def test_modop_same_for_any_value(self):
+        for template, value in [("%10s", None), ("%.3s", 12345), ("%-6r", None), ("%5.1f", 2)]:
+            source = self.IMPORT + f"logger.info('{template}' % x)"
+            call = ast.parse(get_patch(source, "__fake__.py")[2].statement, mode="eval").body
+            assert call.args[0].value.format(value) == template % value
+
+    def test_ignore_integer_specifiers(self):
+        for template in ["%d", "%5i", "%u", "%c"]:
+            patches = get_patch(self.IMPORT + f"logger.info('{template}' % x)", "__fake__.py")
+            assert 0 == len(patches)
+
+    def test_no_arguments_keeps_braces(self):
+        self.assert_loguru("logger.info(f'{{x}}')", "logger.info('{x}')")
+        self.assert_loguru("logger.info('{x} %s' % y)", "logger.info('{{x}} {}', y)")
+
+    def test_str_format_keeps_fields(self):
+        self.assert_loguru(
+            "logger.info('{} and {name}'.format(a, name=b))",
+            "logger.info('{} and {name}', a, name=b)",
+        )
+
+    def test_bound_logger(self):
+        self.assert_loguru(
+            "logger.bind(user=u).debug(f'{x}')",
+            "logger.bind(user=u).debug('{}', x)",
+        )
+
+    def test_ignore_named_modop(self):
+        patches = get_patch(self.IMPORT + "logger.info('%(a)s' % d)", "__fake__.py")
+        assert 0 == len(patches)
+
+
+class SharedLineTests(PatchTestBase):
+    """A patch replaces whole lines, so the call must be the only code on them."""
+
+    def test_skip_calls_that_share_their_lines(self):
+        for source in [
+            "if a: log.info(f'{a}')",
+            "x = log.info('%s' % a)",
+            "def f(a):\n    return log.info('{}'.format(a))",
+            "log.info(f'{a}'); b = 1",
+            "log.info(f'é {a}'); b = 1",
+        ]:
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assert_unchanged(source)
+            assert "not on a line of its own" in out.getvalue(), source
+
+    def test_trailing_comment(self):
+        self.assert_patched("log.info(f'é {a}')  # note", "log.info('é %s', a)")
+
+
+class StructlogTests(PatchTestBase):
+    IMPORT = "import structlog\nlog = structlog.get_logger()\n"
+
+    def assert_structlog(self, source, expected):
+        self.assert_patched_at(self.IMPORT + source, 3, expected)
+
+    def test_fstring(self):
+        self.assert_structlog(
+            "log.info(f'user {user.id} logged in')",
+            "log.info('user {user_id} logged in', user_id=user.id)",
+        )
+
+    def test_modop(self):
+        self.assert_structlog("log.info('a %s b %d' % (x, y))", "log.info('a {x} b {y}', x=x, y=y)")
+
+    def test_str_format(self):
+        self.assert_structlog("log.info('a {} b'.format(x))", "log.info('a {x} b', x=x)")
+
+    def test_imported_factory(self):
+        source = "from structlog import get_logger\nlog = get_logger()\nlog.info(f'{x}')"
+        self.assert_patched_at(source, 3, "log.info('{x}', x=x)")
+
+    def test_factory_chain(self):
+        source = "structlog.get_logger().bind(a=1).info(f'{self.name}')"
+        self.assert_patched(source, "structlog.get_logger().bind(a=1).info('{name}', name=self.name)")
+
+    def test_ignore_computed_values(self):
+        patches = get_patch(self.IMPORT + "log.info(f'{len(x)}')", "__fake__.py")
+        assert 0 == len(patches)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from logfix import *
+from logfix.discovery import Discovery
+from logfix.instrument import PROFILER
+from logfix.pipeline import Pipeline
+
+SOURCE = """import logging
+log = logging.getLogger(__name__)
+
+def f(x):
+    log.debug(f"hello {x}")
+    log.info("a %s" % x)
+    log.warning("ok %s", x)
+"""
+
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for i in range(10):
+            with open(os.path.join(self.root, f"mod{i}.py"), "w") as f:
+                f.write(SOURCE if i % 2 == 0 else "x = 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_pipeline_matches_patch_file(self):
+        expected_path = os.path.join(self.root, "expected.py")
+        with open(expected_path, "w") as f:
+            f.write(SOURCE)
+        patch_file(expected_path)
+        with open(expected_path) as f:
+            expected = f.read()
+        os.unlink(expected_path)
+
+        stages = Pipeline(readers=2, workers=2, writers=2, max_inflight=3)
+        results = stages.run(Discovery(self.root))
+        assert results == {"files_checked": 10, "files_patched": 5, "lines_patched": 10}
+        assert stages.errors == []
+        for i in range(0, 10, 2):
+            with open(os.path.join(self.root, f"mod{i}.py")) as f:
+                assert f.read() == expected
+
+    def test_profile_includes_workers(self):
+        PROFILER.enable()
+        try:
+            Pipeline(readers=2, workers=2, writers=2).run(Discovery(self.root))
+            summary = PROFILER.summary()
+        finally:
+            PROFILER.disable()
+            PROFILER.reset()
+        assert {"read", "parse", "analyze", "unparse", "write"} <= set(summary["phases"])
+        assert summary["phases"]["write"]["calls"] == 5
+        assert summary["counters"]["files"] == 10
+        assert summary["counters"]["candidates"] == 10
+
+    def test_errors_do_not_stop_the_pipeline(self):
+        with open(os.path.join(self.root, "broken.py"), "w") as f:
+            f.write("def (\n")
+        stages = Pipeline(readers=1, workers=1, writers=1)
+        results = stages.run(Discovery(self.root))
+        assert 11 == results["files_checked"]
+        assert 1 == len(stages.errors)
+        assert "analyze" == stages.errors[0][1]
@@ -0,0 +1,35 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+from logfix.shard import merge, parse_shard, select, shard_of, write_partial
+
+
+class ShardTests(unittest.TestCase):
+    def test_parse_shard(self):
+        assert (2, 4) == parse_shard("2/4")
+        for value in ["0/4", "5/4", "x", "1/0"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+    def test_every_file_in_exactly_one_shard(self):
+        paths = [f"/root/pkg/mod{i}.py" for i in range(100)]
+        selected = []
+        for i in range(1, 5):
+            selected.extend(select(paths, "/root", (i, 4)))
+        assert sorted(selected) == sorted(paths)
+
+    def test_assignment_is_stable(self):
+        assert shard_of("pkg/mod.py", 8) == shard_of("pkg/mod.py", 8)
+        assert shard_of(os.path.join("pkg", "mod.py"), 8) == shard_of("pkg/mod.py", 8)
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in (1, 2):
+                path = os.path.join(tmp, f"{i}.json")
+                results = {"files_checked": 10, "files_patched": i, "lines_patched": 2 * i}
+                write_partial(path, (i, 2), results)
+                paths.append(path)
+            assert merge(paths) == {"files_checked": 20, "files_patched": 3, "lines_patched": 6}
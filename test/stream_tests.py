@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from logfix import *
+from logfix.memory import parse_size
+from logfix.stream import get_large_file_patches, patch_large_file
+
+SOURCE = '''import logging
+log = logging.getLogger(__name__)
+
+# comment
+def f(x):
+    """doc"""
+    log.debug(f"hello {x}")
+    if x:
+        log.info("a %s" %
+                 (x,))
+    else:
+        log.warning("{} b".format(x))
+    y = 1 + \\
+        2
+    log.debug("ok %s", y)
+    return y
+log.error(f"end {f(1)}")
+'''
+
+
+class StreamTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(fd, "w") as f:
+            f.write(SOURCE)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_same_patches_as_get_patch(self):
+        expected = get_patch(SOURCE, self.path)
+        actual = get_large_file_patches(self.path)
+        assert sorted(expected) == sorted(actual)
+        for line in expected:
+            e = expected[line]
+            a = actual[line]
+            assert (e.line, e.end_line, e.offset, e.statement) == (a.line, a.end_line, a.offset, a.statement)
+
+    def test_patch_large_file(self):
+        patch_file(self.path)
+        with open(self.path) as f:
+            expected = f.read()
+        with open(self.path, "w") as f:
+            f.write(SOURCE)
+        assert 4 == patch_large_file(self.path)
+        with open(self.path) as f:
+            actual = f.read()
+        assert actual == expected
+
+    def test_parse_size(self):
+        assert 512 == parse_size("512")
+        assert 2048 == parse_size("2K")
+        assert 4 * 1024 * 1024 == parse_size("4M")
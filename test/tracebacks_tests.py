@@ -0,0 +1,103 @@
+import contextlib
+import io
+
+from logfix import analyze_source
+from logfix.diff import file_diff
+from test.patch_tests import AnalyzeTestBase
+
+
+class ExcInfoTests(AnalyzeTestBase):
+    def assert_rewritten(self, statement: str, expected: str, in_except: bool = False):
+        if in_except:
+            source = f"import traceback\ntry:\n    f()\nexcept ValueError as e:\n    {statement}\n"
+            result = self.patched(source)[0].splitlines()[-1].strip()
+        else:
+            source = f"import traceback\n{statement}\n"
+            result = self.patched(source)[0].splitlines()[-1]
+        assert result == expected, result
+
+    def test_fstring(self):
+        self.assert_rewritten(
+            "log.warning(f'failed {x}: {traceback.format_exc()}')",
+            "log.warning('failed %s', x, exc_info=True)",
+        )
+
+    def test_modop(self):
+        self.assert_rewritten(
+            "log.warning('%s' % traceback.format_exc())",
+            "log.warning('', exc_info=True)",
+        )
+        self.assert_rewritten(
+            "log.info('100%% %s: %s' % (x, traceback.format_exc()))",
+            "log.info('100%% %s', x, exc_info=True)",
+        )
+
+    def test_lazy_and_concatenated(self):
+        self.assert_rewritten(
+            "log.info('done: %s', traceback.format_exc())",
+            "log.info('done', exc_info=True)",
+        )
+        self.assert_rewritten(
+            "log.info('done: ' + traceback.format_exc())",
+            "log.info('done', exc_info=True)",
+        )
+
+    def test_str_format(self):
+        self.assert_rewritten(
+            "log.info('{} at {}'.format(x, traceback.format_exc()))",
+            "log.info('%s at', x, exc_info=True)",
+        )
+
+    def test_exception_in_except_block(self):
+        self.assert_rewritten(
+            "log.error(f'failed: {traceback.format_exc()}')",
+            "log.exception('failed')",
+            in_except=True,
+        )
+        self.assert_rewritten(
+            "log.exception(f'failed: {traceback.format_exc()}')",
+            "log.exception('failed')",
+            in_except=True,
+        )
+        self.assert_rewritten(
+            "log.warning('%s', ''.join(traceback.format_exception(e)))",
+            "log.warning('%s', ''.join(traceback.format_exception(e)))",
+            in_except=True,
+        )
+        self.assert_rewritten(
+            "log.warning('%s', traceback.format_exception(e))",
+            "log.warning('', exc_info=True)",
+            in_except=True,
+        )
+
+    def test_format_exception_of_other_exception(self):
+        self.assert_rewritten(
+            "log.error('%s', traceback.format_exception(err))",
+            "log.error('', exc_info=err)",
+        )
+
+    def test_unsupported_left_alone(self):
+        for statement in [
+            "log.error(traceback.format_exc(5))",
+            "log.error(f'{traceback.format_exc()} happened')",
+            "log.error('x %s', traceback.format_exc(), exc_info=False)",
+        ]:
+            result = self.patched(f"import traceback\n{statement}\n")[0]
+            assert result.startswith("import traceback\n")
+            assert "traceback.format_exc(" in result
+
+    def test_removes_dead_import(self):
+        source = "import logging, traceback\nimport traceback as tb\nlog.error(f'x {tb.format_exc()}')\n"
+        assert self.patched(source)[0] == "import logging, traceback\nlog.error('x', exc_info=True)\n"
+        source = "from traceback import format_exc\nif x:\n    import traceback\n" \
+            "def f():\n    log.error('x %s', traceback.print_exc())\n    g(format_exc)\n"
+        assert self.patched(source)[0] == "from traceback import format_exc\nif x:\n    pass\n" \
+            "def f():\n    log.error('x', exc_info=True)\n    g(format_exc)\n"
+
+    def test_diff_with_removed_line(self):
+        source = "import traceback\nlog.error(traceback.format_exc())\n"
+        with contextlib.redirect_stdout(io.StringIO()):
+            patches = analyze_source(source, "test.py")
+        diff = "".join(file_diff("m.py", patches, io.StringIO(source, newline="")))
+        assert "@@ -1,2 +1,1 @@\n-import traceback\n-log.error(traceback.format_exc())\n" \
+            "+log.error('', exc_info=True)\n" in diff
@@ -0,0 +1,123 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from logfix import transaction
+from logfix.discovery import Discovery
+from logfix.instrument import PROFILER
+from logfix.transaction import JOURNAL_DIR, Transaction, TransactionError, rollback
+
+SOURCE = "log.debug(f'hello {x}')\n"
+PATCHED = "log.debug('hello %s', x)\n"
+
+
+class TransactionTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.root, f"mod{i}.py")
+            with open(path, "w") as f:
+                f.write(SOURCE if i % 2 == 0 else "x = 1\n")
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, i: int) -> str:
+        with open(self.paths[i]) as f:
+            return f.read()
+
+    def test_profile_includes_workers(self):
+        PROFILER.enable()
+        try:
+            Transaction(self.root, workers=2).run(Discovery(self.root))
+            summary = PROFILER.summary()
+        finally:
+            PROFILER.disable()
+            PROFILER.reset()
+        assert {"read", "parse", "analyze", "write", "commit"} <= set(summary["phases"])
+        assert summary["counters"]["files"] == 6
+        assert summary["counters"]["patches.fstring"] == 3
+
+    def test_apply_and_rollback(self):
+        results = Transaction(self.root, workers=2).run(Discovery(self.root))
+        assert results == {"files_checked": 6, "files_patched": 3, "lines_patched": 3}
+        assert self.read(0) == PATCHED
+        assert self.read(1) == "x = 1\n"
+        assert os.listdir(os.path.join(self.root, JOURNAL_DIR, "originals")) != []
+
+        assert rollback(self.root) == []
+        assert self.read(0) == SOURCE
+        assert not os.path.exists(os.path.join(self.root, JOURNAL_DIR))
+
+    def test_journal_is_not_scanned(self):
+        Transaction(self.root, workers=1).run(Discovery(self.root))
+        results = Transaction(self.root, workers=1).run(Discovery(self.root))
+        assert results["files_checked"] == 6
+        assert results["files_patched"] == 0
+
+    def test_refuses_changed_files(self):
+        txn = Transaction(self.root, workers=1)
+        commit = txn.commit
+
+        def edit_then_commit(journal):
+            with open(self.paths[2], "a") as f:
+                f.write("y = 2\n")
+            commit(journal)
+
+        with mock.patch.object(txn, "commit", edit_then_commit):
+            with self.assertRaises(TransactionError):
+                txn.run(Discovery(self.root))
+        assert self.read(0) == SOURCE
+        assert self.read(2) == SOURCE + "y = 2\n"
+        assert self.read(4) == SOURCE
+        assert not os.path.exists(os.path.join(self.root, JOURNAL_DIR))
+
+    def test_rollback_after_interrupted_commit(self):
+        txn = Transaction(self.root, workers=1)
+        moves = []
+
+        def interrupted(src, dst):
+            if len(moves) == 1:
+                raise KeyboardInterrupt
+            moves.append(dst)
+            os.replace(src, dst)
+
+        with mock.patch.object(transaction, "move", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                txn.run(Discovery(self.root))
+        assert sorted(self.read(i) for i in (0, 2, 4)) == [PATCHED, SOURCE, SOURCE]
+        with self.assertRaises(TransactionError):
+            Transaction(self.root).run(Discovery(self.root))
+
+        assert rollback(self.root) == []
+        for i in (0, 2, 4):
+            assert self.read(i) == SOURCE
+
+    def test_rollback_keeps_modified_files(self):
+        Transaction(self.root, workers=1).run(Discovery(self.root))
+        with open(self.paths[0], "a") as f:
+            f.write("y = 2\n")
+        assert rollback(self.root) == [os.path.abspath(self.paths[0])]
+        assert self.read(0) == PATCHED + "y = 2\n"
+        assert self.read(2) == SOURCE
+        assert os.path.exists(os.path.join(self.root, JOURNAL_DIR))
+
+    def test_syntax_error_skips_the_file(self):
+        broken = os.path.join(self.root, "broken.py")
+        with open(broken, "w") as f:
+            f.write("def (\n")
+        txn = Transaction(self.root, workers=1)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()) as err:
+            results = txn.run(Discovery(self.root))
+        assert results == {"files_checked": 7, "files_patched": 3, "lines_patched": 3}
+        assert self.read(0) == PATCHED
+        assert [(path, stage) for path, stage, _ in txn.errors] == [(broken, "stage")]
+        assert f"Error stage {broken}" in err.getvalue()
+        with open(broken) as f:
+            assert f.read() == "def (\n"
@@ -0,0 +1,85 @@
+import ast
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from logfix import get_patch, patch_file
+from logfix.stream import get_large_file_patches
+from logfix.verify import gate, verify_call
+
+
+def verified(source: str) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        originals = {}
+        return gate(originals, get_patch(source, "test.py", originals), "test.py")
+
+
+def check(original: str, rewritten: str, style: str = "percent") -> str:
+    return verify_call(
+        ast.parse(original, mode="eval").body,
+        ast.parse(rewritten, mode="eval").body,
+        style,
+    )
+
+
+class VerifyTests(unittest.TestCase):
+    def test_accepts_simple_rewrites(self):
+        source = "\n".join(
+            [
+                "log.debug('hello %s' % world)",
+                "log.debug('hello {}'.format(world))",
+                "log.debug(f'hello {world} {pi:2.3f}')",
+                "log.debug('%d%%' % n, exc_info=True)",
+                "log.debug(template % (a, b))",
+            ]
+        )
+        assert sorted(verified(source)) == [1, 2, 3, 4, 5]
+
+    def test_rejects_changed_message(self):
+        source = "\n".join(
+            [
+                "log.debug(f'hello {world:20}')",
+                "log.debug('%s %d %f'.format(a, b, c))",
+                "log.debug(f'{x} is 100% done')",
+                "log.debug(f'hello {world!r}')",
+            ]
+        )
+        assert len(get_patch(source, "test.py")) == 4
+        assert verified(source) == {}
+
+    def test_compares_specifiers_on_samples(self):
+        assert check("log.debug(f'{pi:.2f}')", "log.debug('%.2f', pi)") is None
+        assert check("log.debug(f'{n:5}')", "log.debug('%5s', n)") is not None
+        assert check("log.debug(f'{n:x}')", "log.debug('%x', n)") is None
+
+    def test_values_percent_converts(self):
+        # None, objects without format specifiers and floats.
+        assert check("log.debug('%10s' % n)", "log.debug('{:>10}', n)", "brace") is not None
+        assert check("log.debug('%10s' % n)", "log.debug('{!s:>10}', n)", "brace") is None
+        assert check("log.debug('%d' % n)", "log.debug('{:d}', n)", "brace") is not None
+        assert check("log.debug('%.3s' % n)", "log.debug('{:.3}', n)", "brace") is not None
+        assert check("log.debug('%c' % n)", "log.debug('{:c}', n)", "brace") is not None
+
+    def test_detects_reordered_arguments(self):
+        assert check("log.debug(f'{a} {b}')", "log.debug('%s %s', b, a)") is not None
+        assert check("log.debug(f'{a}', extra=e)", "log.debug('%s', a)") is not None
+
+    def test_brace_and_kv_styles(self):
+        assert check("logger.info(f'hello {world}')", "logger.info('hello {}', world)", "brace") is None
+        assert check("logger.info(f'{{x}} {world}')", "logger.info('{x} {}', world)", "brace") is not None
+        # structlog logs the event as it is.
+        assert check("log.info(f'hello {world}')", "log.info('hello {world}', world=world)", "kv") is not None
+
+    def test_patch_file_skips_rejected(self):
+        source = "log.debug('%s %d'.format(a, b))\nlog.debug('x %s' % y)\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mod.py")
+            with open(path, "w") as f:
+                f.write(source)
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert patch_file(path) == 1
+                assert len(get_large_file_patches(path, verify=True)) == 0
+            with open(path) as f:
+                assert f.read() == "log.debug('%s %d'.format(a, b))\nlog.debug('x %s', y)\n"